@@ -0,0 +1,467 @@
+# benchmark_load.py
+"""
+Benchmark the warehouse load path on synthetic data in a throwaway database
+
+Creates a scratch database on the configured server (PGHOST/PGPORT/PGUSER),
+applies create_schema.sql, and times each load method on synthetic clients,
+positions, employees and shifts at several volumes:
+
+    upsert_dimension              DimClient/DimPosition/DimEmployee.upsert, first load and SCD reload
+    _insert_minimal_employees     ETLPipeline's minimal employee records
+    insert_fact_batch_partitioned the execute_batch fact insert
+    FactShift.insert_batch        the COPY fact load, first load and unchanged reload
+
+For each it reports rows/s, statements sent to the server (round-trips) and
+WAL bytes written. Throughput is compared with benchmark_load_baseline.json
+(written on the first run); the script exits 1 if a method falls more than
+TOLERANCE below its baseline. Baselines are per machine - don't commit them.
+"""
+import os
+import sys
+import time
+import json
+import random
+from datetime import datetime, timedelta
+
+import psycopg2
+import psycopg2.extensions
+
+# Add the parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracktik_etl.etl.config import config
+from tracktik_etl.etl.utils.connection_pool import HealthCheckedPool, PooledConnection
+
+
+class _CountingConnection(PooledConnection):
+    """Connection counting the statements, COPYs and commits it sends to the server"""
+
+    round_trips = 0
+    _cursor_classes = {}
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = _counting_cursor_class(factory)
+        return super().cursor(*args, **kwargs)
+
+    def commit(self):
+        _CountingConnection.round_trips += 1
+        return super().commit()
+
+    def rollback(self):
+        _CountingConnection.round_trips += 1
+        return super().rollback()
+
+
+def _counting_cursor_class(base):
+    """Subclass of a cursor class that counts round-trips on _CountingConnection"""
+    if base not in _CountingConnection._cursor_classes:
+        class CountingCursor(base):
+            def execute(self, query, vars=None):
+                _CountingConnection.round_trips += 1
+                return super().execute(query, vars)
+
+            def executemany(self, query, vars_list):
+                vars_list = list(vars_list)
+                _CountingConnection.round_trips += len(vars_list)
+                return super().executemany(query, vars_list)
+
+            def copy_expert(self, sql, file, size=8192):
+                _CountingConnection.round_trips += 1
+                return super().copy_expert(sql, file, size)
+
+        _CountingConnection._cursor_classes[base] = CountingCursor
+    return _CountingConnection._cursor_classes[base]
+
+
+def _connect(database: str):
+    """Autocommit connection to `database` on the configured server (not counted)"""
+    conn = psycopg2.connect(
+        host=config.POSTGRES_HOST, port=config.POSTGRES_PORT, database=database,
+        user=config.POSTGRES_USER, password=config.POSTGRES_PASSWORD
+    )
+    conn.autocommit = True
+    return conn
+
+
+def create_database(name: str, schema_file: str):
+    """Create the scratch database and apply the schema"""
+    with open(schema_file) as f:
+        schema_sql = f.read()
+
+    admin = _connect('postgres')
+    try:
+        admin.cursor().execute(f'DROP DATABASE IF EXISTS {name}')
+        admin.cursor().execute(f'CREATE DATABASE {name}')
+    finally:
+        admin.close()
+
+    conn = _connect(name)
+    try:
+        conn.cursor().execute(schema_sql)
+    finally:
+        conn.close()
+
+
+def drop_database(name: str):
+    """Drop the scratch database (after the pool has been closed)"""
+    admin = _connect('postgres')
+    try:
+        admin.cursor().execute(f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+    finally:
+        admin.close()
+
+
+class LoadMeter:
+    """Wall time, round-trips and WAL bytes of the load calls made through `call`
+
+    Only `call` is timed, so generating the synthetic batches in between costs
+    nothing; they don't touch the server, so they add no round-trips or WAL.
+    """
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+
+    def _wal_lsn(self) -> str:
+        cursor = self.monitor.cursor()
+        cursor.execute('SELECT pg_current_wal_lsn()')
+        return cursor.fetchone()[0]
+
+    def __enter__(self) -> 'LoadMeter':
+        self.seconds = 0.0
+        self.round_trips = _CountingConnection.round_trips
+        self.wal_start = self._wal_lsn()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.round_trips = _CountingConnection.round_trips - self.round_trips
+        cursor = self.monitor.cursor()
+        cursor.execute('SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s)', (self.wal_start,))
+        self.wal_bytes = int(cursor.fetchone()[0])
+
+    def call(self, func, *args):
+        """Run one load call, adding its wall time; returns its result"""
+        started = time.perf_counter()
+        result = _call_checked(func, *args)
+        self.seconds += time.perf_counter() - started
+        return result
+
+
+def _call_checked(func, *args):
+    """Run a load call, raising on the error dicts DimEmployee.upsert returns instead of raising"""
+    result = func(*args)
+    if isinstance(result, dict) and result.get('error'):
+        raise RuntimeError(result['error'])
+    return result
+
+
+def make_clients(count: int):
+    """Synthetic /rest/v1/clients records"""
+    return [{
+        'id': 1000 + i,
+        'customId': f'C{i:05d}',
+        'company': f'Client {i}',
+        'region': 100 + i % 8,
+        'timeZone': 'America/Los_Angeles',
+        'address': f'{i} Main St',
+        'city': 'Oakland',
+        'state': 'CA',
+        'zip': '94612'
+    } for i in range(count)]
+
+
+def make_positions(count: int, clients):
+    """Synthetic /rest/v1/positions records (account included)"""
+    return [{
+        'id': 50_000 + i,
+        'customId': f'P{i:06d}',
+        'name': f'Post {i}',
+        'status': 'ACTIVE',
+        'type': random.choice(['STANDING', 'PATROL', 'RECEPTION']),
+        'account': {'id': client['id'], 'name': client['company'], 'customId': client['customId']}
+    } for i, client in ((i, clients[i % len(clients)]) for i in range(count))]
+
+
+def make_employees(count: int, rename: float = 0.0):
+    """Synthetic /rest/v1/employees records; `rename` = share given a changed last name"""
+    return [{
+        'id': 200_000 + i,
+        'customId': f'E{i:06d}',
+        'firstName': f'First{i}',
+        'lastName': f'Last{i}' + ('-Changed' if random.random() < rename else ''),
+        'email': f'employee{i}@example.com',
+        'primaryPhone': f'555-{i % 10000:04d}',
+        'status': 'ACTIVE',
+        'region': 100 + i % 8
+    } for i in range(count)]
+
+
+def minimal_employee_records(employees, batch_id: str):
+    """Records shaped like the ones ETLPipeline builds for employees first seen in shifts"""
+    return [{
+        'employee_id': employee['id'],
+        'custom_id': None,
+        'first_name': None,
+        'last_name': None,
+        'email': None,
+        'phone': None,
+        'status': 'ACTIVE',
+        'region_id': employee['region'],
+        'valid_from': datetime.now(),
+        'is_current': True,
+        'etl_batch_id': batch_id
+    } for employee in employees]
+
+
+def iter_shift_batches(count: int, period_id: str, period_start, employees, positions,
+                       batch_id: str, batch_size: int, seed: int):
+    """
+    Synthetic transformed shifts, in batches of `batch_size` as the pipeline loads them
+
+    The same seed yields the same shifts, so a second pass is an unchanged reload.
+    """
+    rng = random.Random(seed)
+    base = datetime.combine(period_start, datetime.min.time())
+    for first in range(0, count, batch_size):
+        batch = []
+        for i in range(first, min(first + batch_size, count)):
+            employee = employees[rng.randrange(len(employees))]
+            position = positions[rng.randrange(len(positions))]
+            start = base + timedelta(minutes=rng.randrange(0, 14 * 24 * 60, 15))
+            hours = rng.choice([4, 6, 8, 8, 8, 10, 12])
+            end = start + timedelta(hours=hours)
+            status = rng.choice(['APPROVED', 'COMPLETED', 'PENDING'])
+            raw = {
+                'id': 10_000_000 + i,
+                'employee': employee['id'],
+                'position': position['id'],
+                'startDateTime': start.isoformat() + '-07:00',
+                'endDateTime': end.isoformat() + '-07:00',
+                'plannedDurationHours': hours,
+                'clockedHours': str(hours - 0.25),
+                'approvedHours': hours,
+                'billableHours': hours,
+                'status': status
+            }
+            batch.append({
+                'shift_id': raw['id'],
+                'billing_period_id': period_id,
+                'employee_id': employee['id'],
+                'position_id': position['id'],
+                'client_id': position['account']['id'],
+                'shift_date': start.date(),
+                'start_datetime': start,
+                'end_datetime': end,
+                'scheduled_hours': float(hours),
+                'clocked_hours': hours - 0.25,
+                'approved_hours': float(hours),
+                'billable_hours': float(hours),
+                'payable_hours': float(hours),
+                'bill_rate_regular': None,
+                'bill_rate_effective': None,
+                'bill_overtime_hours': None,
+                'bill_overtime_impact': None,
+                'bill_total': None,
+                'status': status,
+                'approved_by': None,
+                'approved_at': None,
+                'raw_data': json.dumps(raw),
+                'etl_batch_id': batch_id
+            })
+        yield batch
+
+
+def run_suite(sizes, schema_file: str, methods=None, baseline=None):
+    """
+    Run every load method at every size in a scratch database
+
+    Two-phase cases (SCD reload, unchanged fact reload) time only the second
+    phase. Results are printed as they finish, against `baseline` if given.
+
+    Returns:
+        List of result dicts (case, size, rows, seconds, rows_per_sec, round_trips, wal_bytes)
+    """
+    database = f'tracktik_etl_bench_{os.getpid()}'
+    create_database(database, schema_file)
+
+    # create_schema.sql builds the tracktik schema; the ETL modules connect on import
+    config.POSTGRES_DB = database
+    config.POSTGRES_SCHEMA = 'tracktik'
+    from tracktik_etl.etl.database import db
+    from tracktik_etl.etl.models import DimClient, DimPosition, DimEmployee, FactShift, ETLBatch
+    from tracktik_etl.etl.etl_pipeline import ETLPipeline
+
+    db.pool.closeall()
+    db.pool = HealthCheckedPool(
+        config.DB_POOL_SIZE, config.DB_POOL_MAX, connection_factory=_CountingConnection,
+        host=config.POSTGRES_HOST, port=config.POSTGRES_PORT, database=database,
+        user=config.POSTGRES_USER, password=config.POSTGRES_PASSWORD
+    )
+    monitor = _connect(database)
+    schema = config.POSTGRES_SCHEMA
+
+    def reset_tables():
+        with db.get_cursor() as cursor:
+            cursor.execute(f"""
+                TRUNCATE {schema}.dim_clients, {schema}.dim_positions, {schema}.dim_employees,
+                         {schema}.fact_shifts, {schema}.fact_shift_raw, {schema}.raw_shift_payloads
+                RESTART IDENTITY
+            """)
+        monitor.cursor().execute('CHECKPOINT')
+
+    baseline = baseline or {}
+    results = []
+    try:
+        period = db.execute_query(
+            f"SELECT period_id, start_date FROM {schema}.billing_periods ORDER BY start_date LIMIT 1"
+        )[0]
+        db.ensure_shift_partitions([period['period_id']])
+        batch_id = ETLBatch.create_batch('BENCHMARK', {'sizes': sizes})
+        pipeline = ETLPipeline()
+        pipeline.batch_id = batch_id
+
+        for size in sizes:
+            random.seed(size)
+            clients = make_clients(max(10, size // 1000))
+            positions = make_positions(max(50, size // 100), clients)
+            employees = make_employees(max(100, size // 20))
+            dimension_rows = len(clients) + len(positions) + len(employees)
+
+            def shift_batches():
+                return iter_shift_batches(size, period['period_id'], period['start_date'], employees,
+                                          positions, batch_id, config.BATCH_SIZE, seed=size)
+
+            def load_dimensions(call, employee_records):
+                call(DimClient.upsert, clients, batch_id)
+                call(DimPosition.upsert, positions, batch_id)
+                call(DimEmployee.upsert, employee_records, batch_id)
+
+            def load_facts(call):
+                for batch in shift_batches():
+                    call(FactShift.insert_batch, batch, period['period_id'], batch_id)
+
+            def load_facts_partitioned(call):
+                for batch in shift_batches():
+                    facts = [{k: v for k, v in shift.items() if k != 'raw_data'} for shift in batch]
+                    call(db.insert_fact_batch_partitioned, 'fact_shifts', facts, 'billing_period_id')
+
+            renamed = make_employees(len(employees), rename=0.1)
+            minimal = minimal_employee_records(employees, batch_id)
+
+            # (case, rows, untimed setup, timed load); both get a `call(func, *args)` runner
+            cases = [
+                ('upsert_dimension/insert', dimension_rows,
+                 None, lambda call: load_dimensions(call, employees)),
+                ('upsert_dimension/scd_10pct', dimension_rows,
+                 lambda call: load_dimensions(call, employees), lambda call: load_dimensions(call, renamed)),
+                ('_insert_minimal_employees', len(minimal),
+                 None, lambda call: call(pipeline._insert_minimal_employees, minimal)),
+                ('insert_fact_batch_partitioned', size,
+                 None, load_facts_partitioned),
+                ('FactShift.insert_batch/insert', size,
+                 None, load_facts),
+                ('FactShift.insert_batch/reload', size,
+                 load_facts, load_facts),
+            ]
+
+            for case, rows, setup, load in cases:
+                if methods and not any(case.startswith(method) for method in methods):
+                    continue
+                reset_tables()
+                if setup:
+                    setup(_call_checked)
+                with LoadMeter(monitor) as meter:
+                    load(meter.call)
+
+                key = f"{case}@{size}"
+                result = {
+                    'case': case,
+                    'size': size,
+                    'rows': rows,
+                    'seconds': round(meter.seconds, 3),
+                    'rows_per_sec': round(rows / meter.seconds) if meter.seconds else 0,
+                    'round_trips': meter.round_trips,
+                    'wal_bytes': meter.wal_bytes
+                }
+                results.append(result)
+                print_result(result, baseline.get(key, {}).get('rows_per_sec'))
+
+        ETLBatch.complete_batch(batch_id, len(results))
+    finally:
+        monitor.close()
+        db.pool.closeall()
+        drop_database(database)
+
+    return results
+
+
+def print_result(result, baseline_rate=None):
+    """One row of the results table"""
+    versus = f"{result['rows_per_sec'] / baseline_rate:>7.0%}" if baseline_rate else f"{'-':>7}"
+    print(f"{result['size']:>9,} {result['case']:<32} {result['rows']:>9,} {result['seconds']:>9.2f} "
+          f"{result['rows_per_sec']:>10,} {result['round_trips']:>8,} {result['wal_bytes'] / 1e6:>9.1f} {versus}")
+
+
+def load_baseline(baseline_file: str):
+    """Stored results keyed case@size, or {} before the first run"""
+    if not os.path.exists(baseline_file):
+        return {}
+    with open(baseline_file) as f:
+        return json.load(f)
+
+
+def check_baseline(results, baseline, baseline_file: str, tolerance: float, update: bool):
+    """
+    Compare throughput with the baseline, storing this run if asked (or if there is none)
+
+    Returns:
+        Keys (case@size) whose rows/s fell more than `tolerance` below the baseline
+    """
+    regressions = []
+    for result in results:
+        key = f"{result['case']}@{result['size']}"
+        expected = baseline.get(key, {}).get('rows_per_sec')
+        if expected and result['rows_per_sec'] < expected * (1 - tolerance):
+            regressions.append(key)
+
+    if update or not baseline:
+        baseline = {**baseline, **{
+            f"{result['case']}@{result['size']}": {
+                'rows_per_sec': result['rows_per_sec'],
+                'round_trips': result['round_trips'],
+                'wal_bytes': result['wal_bytes'],
+                'recorded_at': datetime.now().isoformat(timespec='seconds')
+            }
+            for result in results
+        }}
+        with open(baseline_file, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {baseline_file}")
+
+    return regressions
+
+
+def main():
+    """Benchmark every load method and check for throughput regressions"""
+
+    SIZES = [10_000, 100_000, 1_000_000]  # Shifts per run; dimensions scale with them
+    METHODS = None        # e.g. ['FactShift.insert_batch'] to run only matching cases
+    TOLERANCE = 0.25      # Fail when rows/s drops more than this below the baseline
+    UPDATE_BASELINE = False  # True = store this run as the new baseline
+    SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'create_schema.sql')
+    BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_load_baseline.json')
+
+    print(f"{'shifts':>9} {'case':<32} {'rows':>9} {'seconds':>9} {'rows/s':>10} "
+          f"{'trips':>8} {'WAL (MB)':>9} {'vs base':>7}")
+    baseline = load_baseline(BASELINE_FILE)
+    results = run_suite(SIZES, SCHEMA_FILE, METHODS, baseline)
+
+    regressions = check_baseline(results, baseline, BASELINE_FILE, TOLERANCE, UPDATE_BASELINE)
+    if regressions:
+        print(f"\n❌ Throughput regressed more than {TOLERANCE:.0%} below baseline: {', '.join(regressions)}")
+        sys.exit(1)
+    print("\n✅ No throughput regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# benchmark_transform.py
+"""
+Benchmark the per-dict shift transform against the columnar batch transform
+(transform + position -> client join + reference filtering, no database needed)
+
+If the database is reachable, the COPY CSV encoding of the staged rows is
+timed as well (written to a sink, nothing is loaded). The pipeline uses the
+batch transform only with TRACKTIK_COLUMNAR_TRANSFORM=true; rerun this after
+pandas upgrades before switching it on.
+"""
+import os
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+# Add the parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracktik_etl.etl.transformers import DataTransformer
+
+
+def make_shifts(count: int, positions: int = 500, employees: int = 2000):
+    """Synthetic API shift records shaped like /rest/v1/shifts responses"""
+    base = datetime(2025, 5, 30, 6, 0)
+    shifts = []
+    for i in range(count):
+        start = base + timedelta(minutes=random.randrange(0, 14 * 24 * 60, 15))
+        hours = random.choice([4, 6, 8, 8, 8, 10, 12])
+        end = start + timedelta(hours=hours)
+        shifts.append({
+            'id': 10_000_000 + i,
+            'employee': random.randrange(employees),
+            'position': random.randrange(positions),
+            'startDateTime': start.strftime('%Y-%m-%dT%H:%M:%S') + '-07:00',
+            'endDateTime': end.strftime('%Y-%m-%dT%H:%M:%S') + '-07:00',
+            'plannedDurationHours': hours,
+            'clockedHours': str(hours - 0.25),
+            'approvedHours': hours,
+            'billableHours': hours,
+            'plannedPayableHours': hours,
+            'status': random.choice(['APPROVED', 'COMPLETED', 'PENDING']),
+            'updatedOn': '2025-06-13T01:00:00-07:00',
+        })
+    return shifts
+
+
+def per_dict_path(shifts, period_id, position_client_map, existing_employee_ids):
+    """The original loop: transform_shift per record, then join and filter per record"""
+    transformed_shifts = []
+    for shift in shifts:
+        transformed = DataTransformer.transform_shift(shift, period_id)
+        transformed['etl_batch_id'] = 'benchmark'
+        transformed_shifts.append(transformed)
+
+    for shift in transformed_shifts:
+        shift['client_id'] = position_client_map.get(shift.get('position_id'))
+
+    return [
+        shift for shift in transformed_shifts
+        if shift.get('employee_id') in existing_employee_ids and shift.get('client_id') is not None
+    ]
+
+
+def batch_path(shifts, period_id, position_client_map, existing_employee_ids):
+    """transform_shifts_batch, then vectorized filtering"""
+    frame = DataTransformer.transform_shifts_batch(shifts, period_id, position_client_map)
+    frame['etl_batch_id'] = 'benchmark'
+    valid = frame['employee_id'].isin(list(existing_employee_ids)) & frame['client_id'].notna()
+    return frame[valid]
+
+
+class _CopySink:
+    """Stands in for a cursor: reads the COPY buffer and discards it"""
+
+    def copy_expert(self, sql, buffer):
+        buffer.read()
+
+
+def encode_rows(database, shifts):
+    """COPY encoding of list records, as DatabaseManager.copy_fact_shifts stages them"""
+    columns = [column for column in shifts[0] if column != 'raw_data']
+    database.copy_rows(
+        _CopySink(), 'stg_fact_shifts', columns + ['stg_row', 'raw_data'],
+        ([shift.get(column) for column in columns] + [i, shift.get('raw_data')]
+         for i, shift in enumerate(shifts))
+    )
+
+
+def encode_frame(database, frame):
+    """COPY encoding of a batch frame, as DatabaseManager.copy_fact_shifts stages it"""
+    columns = [column for column in frame.columns if column != 'raw_data']
+    database.copy_frame(
+        _CopySink(), 'stg_fact_shifts',
+        frame[columns].assign(stg_row=range(len(frame)), raw_data=frame['raw_data'])
+    )
+
+
+def best_time(func, repeats):
+    """Best wall time of `repeats` calls, and the last result"""
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    """Time both paths on a few page sizes"""
+
+    SIZES = [100, 1_000, 10_000, 100_000]  # 100 = one API page, what the pipeline transforms at a time
+    REPEATS = 3
+    PERIOD_ID = '2025_12'
+
+    random.seed(42)
+    position_client_map = {p: (None if p % 50 == 0 else 1000 + p // 10) for p in range(500)}
+    existing_employee_ids = set(range(0, 2000, 1)) - set(range(0, 2000, 97))
+
+    try:
+        # Importing the database module opens the connection pool
+        from tracktik_etl.etl.database import db
+    except Exception as e:
+        print(f"Database not available ({e}), skipping COPY encoding")
+        db = None
+
+    print(f"{'shifts':>8} {'stage':>10} {'per-dict (ms)':>14} {'batch (ms)':>11} {'speedup':>8} {'rows':>8}")
+    for size in SIZES:
+        shifts = make_shifts(size)
+
+        dict_time, dict_rows = best_time(
+            lambda: per_dict_path(shifts, PERIOD_ID, position_client_map, existing_employee_ids), REPEATS)
+        batch_time, batch_rows = best_time(
+            lambda: batch_path(shifts, PERIOD_ID, position_client_map, existing_employee_ids), REPEATS)
+        assert len(dict_rows) == len(batch_rows), (len(dict_rows), len(batch_rows))
+
+        stages = [('transform', dict_time, batch_time)]
+        if db is not None:
+            dict_encode, _ = best_time(lambda: encode_rows(db, dict_rows), REPEATS)
+            batch_encode, _ = best_time(lambda: encode_frame(db, batch_rows), REPEATS)
+            stages.append(('copy csv', dict_encode, batch_encode))
+            stages.append(('total', dict_time + dict_encode, batch_time + batch_encode))
+
+        for stage, dict_elapsed, batch_elapsed in stages:
+            print(f"{size:>8,} {stage:>10} {dict_elapsed * 1000:>14.1f} {batch_elapsed * 1000:>11.1f} "
+                  f"{dict_elapsed / batch_elapsed:>7.1f}x {len(batch_rows):>8,}")
+
+
+if __name__ == "__main__":
+    main()
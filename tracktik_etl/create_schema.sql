@@ -215,8 +215,9 @@ CREATE TABLE fact_shifts (
     approved_by INTEGER,
     approved_at TIMESTAMPTZ,
     
-    -- Store raw API response for validation
-    raw_data JSONB,
+    -- md5 of the business columns; reloads only rewrite rows whose hash changed
+    -- (existing databases: ALTER TABLE tracktik.fact_shifts ADD COLUMN row_hash CHAR(32);)
+    row_hash CHAR(32),
     
     -- Audit columns
     created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
@@ -227,21 +228,6 @@ CREATE TABLE fact_shifts (
     PRIMARY KEY (billing_period_id, shift_id)
 ) PARTITION BY LIST (billing_period_id);
 
--- Create partitions for each billing period
-CREATE TABLE fact_shifts_2025_01 PARTITION OF fact_shifts FOR VALUES IN ('2025_01');
-CREATE TABLE fact_shifts_2025_02 PARTITION OF fact_shifts FOR VALUES IN ('2025_02');
-CREATE TABLE fact_shifts_2025_03 PARTITION OF fact_shifts FOR VALUES IN ('2025_03');
-CREATE TABLE fact_shifts_2025_04 PARTITION OF fact_shifts FOR VALUES IN ('2025_04');
-CREATE TABLE fact_shifts_2025_05 PARTITION OF fact_shifts FOR VALUES IN ('2025_05');
-CREATE TABLE fact_shifts_2025_06 PARTITION OF fact_shifts FOR VALUES IN ('2025_06');
-CREATE TABLE fact_shifts_2025_07 PARTITION OF fact_shifts FOR VALUES IN ('2025_07');
-CREATE TABLE fact_shifts_2025_08 PARTITION OF fact_shifts FOR VALUES IN ('2025_08');
-CREATE TABLE fact_shifts_2025_09 PARTITION OF fact_shifts FOR VALUES IN ('2025_09');
-CREATE TABLE fact_shifts_2025_10 PARTITION OF fact_shifts FOR VALUES IN ('2025_10');
-CREATE TABLE fact_shifts_2025_11 PARTITION OF fact_shifts FOR VALUES IN ('2025_11');
-CREATE TABLE fact_shifts_2025_12 PARTITION OF fact_shifts FOR VALUES IN ('2025_12');
-CREATE TABLE fact_shifts_2025_13 PARTITION OF fact_shifts FOR VALUES IN ('2025_13');
-
 -- Function to automatically create partitions
 CREATE OR REPLACE FUNCTION create_shift_partition(period_id VARCHAR(10))
 RETURNS VOID AS $$
@@ -258,6 +244,35 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Create partitions for each generated billing period
+-- (manage_partitions.py keeps partitions created ahead and archives old ones)
+SELECT create_shift_partition(period_id) FROM billing_periods ORDER BY period_id;
+
+-- =====================================================
+-- Raw API Payloads (kept off the hot fact table)
+-- =====================================================
+
+-- Each distinct shift payload is stored once, keyed by the md5 of its jsonb text.
+-- A low toast_tuple_target makes PostgreSQL compress payloads of typical shift size.
+-- (existing databases: create both tables, then ALTER TABLE tracktik.fact_shifts DROP COLUMN raw_data;)
+CREATE TABLE raw_shift_payloads (
+    payload_hash CHAR(32) PRIMARY KEY,
+    payload JSONB NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+) WITH (toast_tuple_target = 128);
+
+-- Latest payload for each shift
+CREATE TABLE fact_shift_raw (
+    billing_period_id VARCHAR(10) NOT NULL,
+    shift_id BIGINT NOT NULL,
+    payload_hash CHAR(32) NOT NULL REFERENCES raw_shift_payloads(payload_hash),
+    etl_batch_id UUID,
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (billing_period_id, shift_id)
+);
+
+CREATE INDEX idx_fact_shift_raw_payload ON fact_shift_raw(payload_hash);
+
 -- =====================================================
 -- ETL Support Tables
 -- =====================================================
@@ -295,6 +310,76 @@ CREATE TABLE data_quality_issues (
     created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );
 
+-- =====================================================
+-- Period Aggregates (rebuilt per period by refresh_period_aggregates)
+-- =====================================================
+
+-- Hours and billing totals by region (contract / market)
+CREATE TABLE agg_period_region (
+    billing_period_id VARCHAR(10) NOT NULL,
+    parent_region_name VARCHAR(100) NOT NULL,
+    region_name VARCHAR(100) NOT NULL,
+    shift_count INTEGER NOT NULL,
+    scheduled_hours NUMERIC(14,2),
+    clocked_hours NUMERIC(14,2),
+    approved_hours NUMERIC(14,2),
+    billable_hours NUMERIC(14,2),
+    payable_hours NUMERIC(14,2),
+    bill_overtime_hours NUMERIC(14,2),
+    bill_total NUMERIC(14,2),
+    refreshed_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (billing_period_id, parent_region_name, region_name)
+);
+
+-- Hours and billing totals by client/site
+CREATE TABLE agg_period_client (
+    billing_period_id VARCHAR(10) NOT NULL,
+    client_id INTEGER NOT NULL,
+    shift_count INTEGER NOT NULL,
+    scheduled_hours NUMERIC(14,2),
+    clocked_hours NUMERIC(14,2),
+    approved_hours NUMERIC(14,2),
+    billable_hours NUMERIC(14,2),
+    payable_hours NUMERIC(14,2),
+    bill_overtime_hours NUMERIC(14,2),
+    bill_total NUMERIC(14,2),
+    refreshed_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (billing_period_id, client_id)
+);
+
+-- Hours and billing totals by position
+CREATE TABLE agg_period_position (
+    billing_period_id VARCHAR(10) NOT NULL,
+    position_id INTEGER NOT NULL,
+    client_id INTEGER NOT NULL,
+    shift_count INTEGER NOT NULL,
+    scheduled_hours NUMERIC(14,2),
+    clocked_hours NUMERIC(14,2),
+    approved_hours NUMERIC(14,2),
+    billable_hours NUMERIC(14,2),
+    payable_hours NUMERIC(14,2),
+    bill_overtime_hours NUMERIC(14,2),
+    bill_total NUMERIC(14,2),
+    refreshed_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (billing_period_id, position_id, client_id)
+);
+
+-- Hours and billing totals by employee
+CREATE TABLE agg_period_employee (
+    billing_period_id VARCHAR(10) NOT NULL,
+    employee_id INTEGER NOT NULL,
+    shift_count INTEGER NOT NULL,
+    scheduled_hours NUMERIC(14,2),
+    clocked_hours NUMERIC(14,2),
+    approved_hours NUMERIC(14,2),
+    billable_hours NUMERIC(14,2),
+    payable_hours NUMERIC(14,2),
+    bill_overtime_hours NUMERIC(14,2),
+    bill_total NUMERIC(14,2),
+    refreshed_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (billing_period_id, employee_id)
+);
+
 -- =====================================================
 -- Views for Reporting
 -- =====================================================
@@ -344,16 +429,92 @@ JOIN dim_positions p ON s.position_id = p.position_id AND p.is_current = TRUE
 JOIN dim_clients c ON s.client_id = c.client_id AND c.is_current = TRUE
 WHERE p.name ILIKE '%STAND%' OR p.name ILIKE '%WATCH%';
 
+-- Materialized v_standby_shifts, rebuilt per period by refresh_period_aggregates
+CREATE TABLE mat_standby_shifts AS SELECT * FROM v_standby_shifts WITH NO DATA;
+CREATE INDEX idx_mat_standby_shifts_period ON mat_standby_shifts(billing_period, shift_id);
+
+-- Shifts with their raw API payload, for audits
+CREATE VIEW v_fact_shifts_raw AS
+SELECT 
+    s.*,
+    p.payload AS raw_data
+FROM fact_shifts s
+LEFT JOIN fact_shift_raw r ON r.billing_period_id = s.billing_period_id AND r.shift_id = s.shift_id
+LEFT JOIN raw_shift_payloads p ON p.payload_hash = r.payload_hash;
+
 -- =====================================================
 -- Maintenance Functions
 -- =====================================================
 
 -- Function to refresh materialized data
+-- Rebuilds one billing period's aggregates and standby shifts; each statement
+-- reads a single fact_shifts partition, so cost scales with the period, not the table
 CREATE OR REPLACE FUNCTION refresh_period_aggregates(period_id VARCHAR(10))
 RETURNS VOID AS $$
 BEGIN
-    -- Add any period-end calculations here
     RAISE NOTICE 'Refreshing aggregates for period %', period_id;
+    
+    DELETE FROM agg_period_region a WHERE a.billing_period_id = refresh_period_aggregates.period_id;
+    INSERT INTO agg_period_region
+        (billing_period_id, parent_region_name, region_name,
+         shift_count, scheduled_hours, clocked_hours, approved_hours,
+         billable_hours, payable_hours, bill_overtime_hours, bill_total)
+    SELECT s.billing_period_id,
+        COALESCE(c.parent_region_name, 'Unknown'), COALESCE(c.region_name, 'Unknown'),
+        COUNT(*),
+        SUM(s.scheduled_hours), SUM(s.clocked_hours), SUM(s.approved_hours),
+        SUM(s.billable_hours), SUM(s.payable_hours),
+        SUM(s.bill_overtime_hours), SUM(s.bill_total)
+    FROM fact_shifts s
+    LEFT JOIN dim_clients c ON c.client_id = s.client_id AND c.is_current = TRUE
+    WHERE s.billing_period_id = refresh_period_aggregates.period_id
+    GROUP BY 1, 2, 3;
+    
+    DELETE FROM agg_period_client a WHERE a.billing_period_id = refresh_period_aggregates.period_id;
+    INSERT INTO agg_period_client
+        (billing_period_id, client_id,
+         shift_count, scheduled_hours, clocked_hours, approved_hours,
+         billable_hours, payable_hours, bill_overtime_hours, bill_total)
+    SELECT s.billing_period_id, s.client_id,
+        COUNT(*),
+        SUM(s.scheduled_hours), SUM(s.clocked_hours), SUM(s.approved_hours),
+        SUM(s.billable_hours), SUM(s.payable_hours),
+        SUM(s.bill_overtime_hours), SUM(s.bill_total)
+    FROM fact_shifts s
+    WHERE s.billing_period_id = refresh_period_aggregates.period_id
+    GROUP BY 1, 2;
+    
+    DELETE FROM agg_period_position a WHERE a.billing_period_id = refresh_period_aggregates.period_id;
+    INSERT INTO agg_period_position
+        (billing_period_id, position_id, client_id,
+         shift_count, scheduled_hours, clocked_hours, approved_hours,
+         billable_hours, payable_hours, bill_overtime_hours, bill_total)
+    SELECT s.billing_period_id, s.position_id, s.client_id,
+        COUNT(*),
+        SUM(s.scheduled_hours), SUM(s.clocked_hours), SUM(s.approved_hours),
+        SUM(s.billable_hours), SUM(s.payable_hours),
+        SUM(s.bill_overtime_hours), SUM(s.bill_total)
+    FROM fact_shifts s
+    WHERE s.billing_period_id = refresh_period_aggregates.period_id
+    GROUP BY 1, 2, 3;
+    
+    DELETE FROM agg_period_employee a WHERE a.billing_period_id = refresh_period_aggregates.period_id;
+    INSERT INTO agg_period_employee
+        (billing_period_id, employee_id,
+         shift_count, scheduled_hours, clocked_hours, approved_hours,
+         billable_hours, payable_hours, bill_overtime_hours, bill_total)
+    SELECT s.billing_period_id, s.employee_id,
+        COUNT(*),
+        SUM(s.scheduled_hours), SUM(s.clocked_hours), SUM(s.approved_hours),
+        SUM(s.billable_hours), SUM(s.payable_hours),
+        SUM(s.bill_overtime_hours), SUM(s.bill_total)
+    FROM fact_shifts s
+    WHERE s.billing_period_id = refresh_period_aggregates.period_id
+    GROUP BY 1, 2;
+    
+    DELETE FROM mat_standby_shifts m WHERE m.billing_period = refresh_period_aggregates.period_id;
+    INSERT INTO mat_standby_shifts
+    SELECT * FROM v_standby_shifts v WHERE v.billing_period = refresh_period_aggregates.period_id;
 END;
 $$ LANGUAGE plpgsql;
 
@@ -379,13 +540,25 @@ CREATE TRIGGER update_dim_positions_modtime BEFORE UPDATE ON dim_positions
 -- =====================================================
 
 -- Create read-only role for DOMO
-CREATE ROLE domo_reader;
+DO $$
+BEGIN
+    CREATE ROLE domo_reader;
+EXCEPTION WHEN duplicate_object THEN
+    NULL;  -- Roles are server-wide: another database on this server created it
+END
+$$;
 GRANT USAGE ON SCHEMA tracktik TO domo_reader;
 GRANT SELECT ON ALL TABLES IN SCHEMA tracktik TO domo_reader;
 ALTER DEFAULT PRIVILEGES IN SCHEMA tracktik GRANT SELECT ON TABLES TO domo_reader;
 
 -- Create ETL role
-CREATE ROLE etl_writer;
+DO $$
+BEGIN
+    CREATE ROLE etl_writer;
+EXCEPTION WHEN duplicate_object THEN
+    NULL;  -- Roles are server-wide: another database on this server created it
+END
+$$;
 GRANT USAGE ON SCHEMA tracktik TO etl_writer;
 GRANT ALL ON ALL TABLES IN SCHEMA tracktik TO etl_writer;
 GRANT ALL ON ALL SEQUENCES IN SCHEMA tracktik TO etl_writer;
\ No newline at end of file
@@ -0,0 +1,418 @@
+# etl/async_tracktik_client.py
+"""
+Async TrackTik API Client for high fan-out extraction
+Same surface as TrackTikClient, built on asyncio + aiohttp
+"""
+import asyncio
+import json
+import random
+import logging
+import threading
+from collections import deque
+from contextlib import nullcontext
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Any, Tuple
+from datetime import datetime, timedelta
+
+import aiohttp
+
+from .config import config
+from .utils.rate_limiter import TokenBucketRateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTrackTikClient:
+    """asyncio TrackTik API Client with OAuth2 authentication and pooled connections
+
+    Use as an async context manager so the connection pool is closed:
+
+        async with AsyncTrackTikClient() as client:
+            shifts = await client.get_shifts('2025-06-01', '2025-06-12')
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, max_connections: int = None, max_in_flight: int = None,
+                 rate_limiter: Optional[TokenBucketRateLimiter] = None):
+        self.base_url = config.TRACKTIK_BASE_URL
+        self.access_token = None
+        self.token_expires_at = None
+        self.max_connections = max_connections or config.ASYNC_MAX_CONNECTIONS
+        self.max_in_flight = max_in_flight or config.ASYNC_MAX_IN_FLIGHT
+        self.session: Optional[aiohttp.ClientSession] = None
+        # Optional budget shared with other tasks, threads or processes
+        self.rate_limiter = rate_limiter
+        self._auth_lock: Optional[asyncio.Lock] = None
+        self._in_flight: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> 'AsyncTrackTikClient':
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self) -> None:
+        """Create the pooled session (must run inside the event loop)"""
+        if self.session is not None:
+            return
+        connector = aiohttp.TCPConnector(limit=self.max_connections)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=config.ASYNC_REQUEST_TIMEOUT)
+        )
+        self._auth_lock = asyncio.Lock()
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+
+    async def close(self) -> None:
+        """Close the session and its connection pool"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def authenticate(self) -> None:
+        """Authenticate and get access token"""
+        auth_data = {
+            'client_id': config.TRACKTIK_CLIENT_ID,
+            'client_secret': config.TRACKTIK_CLIENT_SECRET,
+            'username': config.TRACKTIK_USERNAME,
+            'password': config.TRACKTIK_PASSWORD,
+            'grant_type': 'password'
+        }
+
+        async with self.session.post(
+            f"{self.base_url}/rest/oauth2/access_token",
+            data=auth_data
+        ) as response:
+            response.raise_for_status()
+            tokens = await response.json()
+
+        self.access_token = tokens['access_token']
+        # Set expiry with 5-minute buffer
+        self.token_expires_at = datetime.now() + timedelta(seconds=tokens.get('expires_in', 3600) - 300)
+        logger.info("Successfully authenticated with TrackTik API (async)")
+
+    async def _ensure_authenticated(self) -> None:
+        """Ensure we have a valid token; only one task refreshes it"""
+        if not self.access_token or datetime.now() >= self.token_expires_at:
+            async with self._auth_lock:
+                if not self.access_token or datetime.now() >= self.token_expires_at:
+                    await self.authenticate()
+
+    async def _get_headers(self) -> Dict[str, str]:
+        """Get headers with authentication"""
+        await self._ensure_authenticated()
+        return {
+            'Authorization': f'Bearer {self.access_token}',
+            'Accept': 'application/json'
+        }
+
+    @staticmethod
+    def _backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when the server sends it"""
+        if retry_after:
+            try:
+                return float(retry_after) + random.uniform(0, 1)
+            except ValueError:
+                pass
+        return random.uniform(0, min(60, config.RETRY_DELAY * (2 ** attempt)))
+
+    async def _get_json(self, endpoint: str, params: Dict[str, Any] = None) -> Tuple[Dict, Dict[str, str], int]:
+        """
+        GET an endpoint and return (json body, response headers, body size in bytes)
+
+        Retries 429 and 5xx responses and connection errors with jittered
+        backoff, and refreshes the token once on a 401.
+        """
+        if self.session is None:
+            await self.open()
+
+        # aiohttp only accepts str/int/float query values
+        query = {k: (str(v).lower() if isinstance(v, bool) else v) for k, v in (params or {}).items()}
+        refreshed = False
+        attempt = 0
+
+        while True:
+            retry_after = None
+            if self.rate_limiter:
+                await self.rate_limiter.acquire_async()
+
+            async with self._in_flight, \
+                    (self.rate_limiter.in_flight_async() if self.rate_limiter else nullcontext()):
+                try:
+                    async with self.session.get(
+                        f"{self.base_url}{endpoint}",
+                        headers=await self._get_headers(),
+                        params=query
+                    ) as response:
+                        if self.rate_limiter:
+                            self.rate_limiter.update_from_headers(response.headers)
+                            if response.status == 429:
+                                retry_after_header = response.headers.get('Retry-After')
+                                self.rate_limiter.record_error(
+                                    float(retry_after_header) if retry_after_header and retry_after_header.isdigit() else None
+                                )
+
+                        if response.status == 401 and not refreshed:
+                            self.access_token = None
+                            refreshed = True
+                            continue
+
+                        if response.status not in self.RETRY_STATUSES:
+                            response.raise_for_status()
+                            if self.rate_limiter:
+                                self.rate_limiter.record_success()
+                            body = await response.read()
+                            return json.loads(body), dict(response.headers), len(body)
+
+                        retry_after = response.headers.get('Retry-After')
+                        error = f"HTTP {response.status}"
+
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    error = str(e) or type(e).__name__
+
+            if attempt >= config.MAX_RETRIES:
+                raise aiohttp.ClientError(f"GET {endpoint} failed after {attempt + 1} attempts: {error}")
+
+            delay = self._backoff_delay(attempt, retry_after)
+            logger.warning(f"GET {endpoint} failed ({error}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _fetch_page(self, endpoint: str, params: Dict[str, Any], offset: int) -> Tuple[List[Dict], Dict, int]:
+        """Fetch a single page; returns (records, meta, response size in bytes)"""
+        current_params = params.copy()
+        current_params.update({
+            'limit': config.API_PAGE_SIZE,
+            'offset': offset
+        })
+
+        data, _, size = await self._get_json(endpoint, current_params)
+        return data.get('data', []), data.get('meta', {}), size
+
+    async def iter_paginated_pages(self, endpoint: str, params: Dict[str, Any] = None,
+                                   fan_out: int = None, start_offset: int = 0,
+                                   usage: Optional[Dict[str, int]] = None) -> AsyncIterator[Tuple[int, List[Dict]]]:
+        """
+        Yield (offset, records) for each page of an endpoint
+
+        Same contract as TrackTikClient.iter_paginated_pages: the first page
+        supplies meta.count, then up to `fan_out` of the remaining offsets are
+        kept in flight as tasks while earlier pages are consumed. Pages are
+        yielded in offset order and records de-duplicated by id.
+
+        Args:
+            endpoint: API endpoint (e.g., '/rest/v1/shifts')
+            params: Query parameters
+            fan_out: Pages requested ahead of the consumer (default the in-flight limit)
+            start_offset: Offset of the first page to fetch (to resume a partial read)
+            usage: Optional dict whose 'calls' and 'bytes' counters are increased
+                as each page arrives (for stage timing)
+        """
+        if params is None:
+            params = {}
+        fan_out = max(1, fan_out or self.max_in_flight)
+
+        seen_ids = set()
+        stats = {'records': 0, 'pages': 0}
+
+        def _new_records(records: List[Dict], size: int) -> List[Dict]:
+            stats['pages'] += 1
+            if usage is not None:
+                usage['calls'] = usage.get('calls', 0) + 1
+                usage['bytes'] = usage.get('bytes', 0) + size
+            fresh = []
+            for record in records:
+                record_id = record.get('id') if isinstance(record, dict) else None
+                if record_id is not None:
+                    if record_id in seen_ids:
+                        continue
+                    seen_ids.add(record_id)
+                fresh.append(record)
+            stats['records'] += len(fresh)
+            return fresh
+
+        offset = start_offset
+        records, meta, size = await self._fetch_page(endpoint, params, offset)
+        total_count = meta.get('count')
+        if total_count is not None:
+            logger.info(f"Fetching {endpoint}: {total_count} total records"
+                        + (f" (resuming at offset {offset})" if offset else ""))
+
+        yield offset, _new_records(records, size)
+        last_page_full = len(records) >= config.API_PAGE_SIZE
+
+        if last_page_full and total_count:
+            offsets = iter(range(offset + config.API_PAGE_SIZE, total_count, config.API_PAGE_SIZE))
+            pending = deque()
+            try:
+                while True:
+                    while len(pending) < fan_out:
+                        next_offset = next(offsets, None)
+                        if next_offset is None:
+                            break
+                        pending.append((next_offset, asyncio.ensure_future(
+                            self._fetch_page(endpoint, params, next_offset)
+                        )))
+
+                    if not pending:
+                        break
+
+                    offset, task = pending.popleft()
+                    records, _, size = await task
+                    last_page_full = len(records) >= config.API_PAGE_SIZE
+                    yield offset, _new_records(records, size)
+            finally:
+                for _, task in pending:
+                    task.cancel()
+
+        # Serial tail: no count, or rows appeared after meta.count was read
+        while last_page_full and not (total_count and start_offset + stats['records'] >= total_count):
+            offset += config.API_PAGE_SIZE
+            records, _, size = await self._fetch_page(endpoint, params, offset)
+            last_page_full = len(records) >= config.API_PAGE_SIZE
+            yield offset, _new_records(records, size)
+
+        logger.info(f"Retrieved {stats['records']} records from {endpoint} in {stats['pages']} pages")
+
+    async def get_paginated_data(self, endpoint: str, params: Dict[str, Any] = None) -> List[Dict]:
+        """
+        Get all pages of data from an endpoint
+
+        Every remaining offset may be in flight at once, bounded only by the
+        client's in-flight limit (see iter_paginated_pages).
+
+        Args:
+            endpoint: API endpoint (e.g., '/rest/v1/shifts')
+            params: Query parameters
+
+        Returns:
+            List of all records
+        """
+        all_records = []
+        async for _, page in self.iter_paginated_pages(endpoint, params):
+            all_records.extend(page)
+        return all_records
+
+    @staticmethod
+    def _shift_params(start_date: str, end_date: str, **kwargs) -> Dict[str, Any]:
+        """Build shift query parameters, enforcing the API's 31-day window"""
+        start = datetime.strptime(start_date, '%Y-%m-%d')
+        end = datetime.strptime(end_date, '%Y-%m-%d')
+
+        if (end - start).days > 31:
+            raise ValueError("Date range cannot exceed 31 days per TrackTik API requirements")
+
+        return {
+            'startDateTime:between': f'{start_date}|{end_date}',
+            **kwargs
+        }
+
+    def iter_shift_pages(self, start_date: str, end_date: str, start_offset: int = 0,
+                         usage: Optional[Dict[str, int]] = None, fan_out: int = None,
+                         **kwargs) -> AsyncIterator[Tuple[int, List[Dict]]]:
+        """Yield (offset, shifts) for a date range, resuming at `start_offset` (see iter_paginated_pages)"""
+        params = self._shift_params(start_date, end_date, **kwargs)
+        return self.iter_paginated_pages('/rest/v1/shifts', params, fan_out=fan_out,
+                                         start_offset=start_offset, usage=usage)
+
+    async def get_shifts(self, start_date: str, end_date: str, **kwargs) -> List[Dict]:
+        """
+        Get shifts for a date range
+
+        Args:
+            start_date: Start date in YYYY-MM-DD format
+            end_date: End date in YYYY-MM-DD format
+            **kwargs: Additional parameters (e.g., status='APPROVED')
+
+        Note: Date range cannot exceed 31 days per API requirements
+        """
+        params = self._shift_params(start_date, end_date, **kwargs)
+        return await self.get_paginated_data('/rest/v1/shifts', params)
+
+    async def get_employees(self, **kwargs) -> List[Dict]:
+        """Get all employees"""
+        params = {
+            'status': 'ACTIVE',
+            **kwargs
+        }
+        return await self.get_paginated_data('/rest/v1/employees', params)
+
+    async def get_clients(self, **kwargs) -> List[Dict]:
+        """Get all clients/sites"""
+        return await self.get_paginated_data('/rest/v1/clients', kwargs)
+
+    async def get_positions(self, account_id: int = None, **kwargs) -> List[Dict]:
+        """Get all positions, optionally filtered by account/client ID"""
+        params = {
+            'include': 'account',
+            **kwargs
+        }
+
+        if account_id:
+            params['account.id'] = account_id
+
+        return await self.get_paginated_data('/rest/v1/positions', params)
+
+    async def get_regions(self, **kwargs) -> List[Dict]:
+        """Get all regions from TrackTik API"""
+        params = {
+            'include': 'parentRegion',
+            **kwargs
+        }
+        return await self.get_paginated_data('/rest/v1/regions', params)
+
+
+class AsyncExtractor:
+    """Blocking front end running an AsyncTrackTikClient on a background event loop
+
+    Lets the synchronous pipeline (and its region worker threads) use the async
+    client: every request runs on one event loop thread, so all workers share
+    one connection pool, in-flight limit and rate limiter. Close it when done:
+
+        extractor = AsyncExtractor(rate_limiter=limiter)
+        try:
+            for offset, shifts in extractor.iter_shift_pages('2025-06-01', '2025-06-12'):
+                ...
+        finally:
+            extractor.close()
+    """
+
+    def __init__(self, max_connections: int = None, max_in_flight: int = None,
+                 rate_limiter: Optional[TokenBucketRateLimiter] = None):
+        self.client = AsyncTrackTikClient(max_connections, max_in_flight, rate_limiter)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='tracktik-async', daemon=True)
+        self._thread.start()
+        self._run(self.client.open())
+
+    def _run(self, coro):
+        """Run a coroutine on the loop thread and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def iter_shift_pages(self, start_date: str, end_date: str, start_offset: int = 0,
+                         usage: Optional[Dict[str, int]] = None, **kwargs) -> Iterator[Tuple[int, List[Dict]]]:
+        """
+        Like TrackTikClient.iter_shift_pages, with up to ASYNC_PAGE_FAN_OUT pages
+        in flight ahead of the caller (so it needs no prefetch thread)
+        """
+        pages = self.client.iter_shift_pages(start_date, end_date, start_offset=start_offset, usage=usage,
+                                             fan_out=config.ASYNC_PAGE_FAN_OUT, **kwargs)
+        try:
+            while True:
+                try:
+                    yield self._run(pages.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            # Cancels the pages still in flight if the caller stopped early
+            self._run(pages.aclose())
+
+    def close(self) -> None:
+        """Close the session and stop the event loop"""
+        if self._loop.is_closed():
+            return
+        self._run(self.client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
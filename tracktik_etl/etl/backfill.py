@@ -0,0 +1,174 @@
+# etl/backfill.py
+"""
+Multi-period backfill: load a range of billing periods in parallel processes
+"""
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Any
+
+from .config import config
+from .database import db
+from .models import BillingPeriod, ETLBatch
+
+logger = logging.getLogger(__name__)
+
+
+def _backfill_period(period_id: str, backfill_batch_id: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Load one billing period in a worker process
+
+    Runs ETLPipeline.process_kaiser_billing_period under the period's advisory
+    lock and reports progress to the backfill batch. A period whose lock is
+    held elsewhere is skipped rather than waited for.
+    """
+    # Imported here so the pipeline (and its API client) is only built in workers
+    from .etl_pipeline import ETLPipeline
+
+    # Every worker draws from the same API budget and the same request slots
+    config.RATE_LIMIT_STATE_FILE = options['rate_limit_state']
+    config.API_MAX_IN_FLIGHT = options['api_in_flight']
+
+    result = {'period_id': period_id, 'pid': os.getpid(), 'started_at': datetime.now()}
+
+    # ETLPipeline takes the same lock; holding it here lets a locked period be skipped up front
+    with db.advisory_lock(BillingPeriod.lock_name(period_id)) as acquired:
+        if not acquired:
+            logger.warning(f"Period {period_id} is locked by another run, skipping")
+            result.update({'status': 'skipped', 'total_shifts': 0, 'errors': ['locked by another run']})
+            ETLBatch.set_metadata_entry(backfill_batch_id, 'periods', period_id, result)
+            return result
+
+        ETLBatch.set_metadata_entry(backfill_batch_id, 'periods', period_id, {**result, 'status': 'running'})
+
+        try:
+            pipeline = ETLPipeline()
+            stats = pipeline.process_kaiser_billing_period(
+                period_id, max_workers=options['region_workers'], incremental=options['incremental']
+            )
+            result.update({
+                'status': 'failed' if stats['errors'] else 'completed',
+                'batch_id': pipeline.batch_id,
+                'total_shifts': stats['total_shifts'],
+                'errors': stats['errors']
+            })
+        except Exception as e:
+            logger.exception(f"Backfill of period {period_id} failed")
+            result.update({'status': 'failed', 'total_shifts': 0, 'errors': [str(e)]})
+
+        result['completed_at'] = datetime.now()
+        ETLBatch.set_metadata_entry(backfill_batch_id, 'periods', period_id, result)
+
+    return result
+
+
+class BackfillOrchestrator:
+    """Load a range of billing periods, one worker process per period at a time
+
+    Periods never share a partition, so they load independently; a Postgres
+    advisory lock per period stops two workers (or two backfills, or a
+    scheduled run) loading the same one. All workers share one TrackTik rate
+    budget through a state file, and at most `api_in_flight` requests are in
+    flight across every process: each request holds one of that many lock
+    files next to the state file (see TokenBucketRateLimiter.in_flight).
+    Region workers per process are sized so each process can use its share
+    of those slots.
+    """
+
+    def __init__(self, processes: int = None, api_in_flight: int = None, rate_limit_state: str = None):
+        self.processes = processes or config.BACKFILL_PROCESSES
+        self.api_in_flight = api_in_flight or config.BACKFILL_API_IN_FLIGHT
+        self.rate_limit_state = rate_limit_state or config.BACKFILL_RATE_LIMIT_STATE
+
+    def region_workers_per_process(self, processes: int) -> int:
+        """Region threads per process that fill (but don't oversubscribe) its share of the in-flight cap"""
+        per_process = self.api_in_flight // max(1, processes)
+        return max(1, min(config.MAX_REGION_WORKERS, per_process // max(1, config.API_PAGE_FAN_OUT)))
+
+    def run(self, first_period_id: str, last_period_id: str, incremental: bool = False) -> Dict[str, Any]:
+        """
+        Backfill every billing period from first to last (inclusive)
+
+        Progress is recorded per period in the KAISER_BACKFILL batch's metadata
+        in etl_batches; each period also gets its own KAISER_BILLING batch.
+
+        Returns:
+            Dict with the backfill batch_id and per-period results, oldest first
+        """
+        period_ids = BillingPeriod.get_period_range(first_period_id, last_period_id)
+        if not period_ids:
+            raise ValueError(f"No billing periods between {first_period_id} and {last_period_id}")
+
+        processes = max(1, min(self.processes, len(period_ids)))
+        options = {
+            'region_workers': self.region_workers_per_process(processes),
+            'incremental': incremental,
+            'rate_limit_state': self.rate_limit_state,
+            'api_in_flight': self.api_in_flight
+        }
+
+        # Create partitions up front so workers never run DDL on fact_shifts concurrently
+        db.ensure_shift_partitions(period_ids)
+
+        state_dir = os.path.dirname(self.rate_limit_state)
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+        batch_id = ETLBatch.create_batch(
+            'KAISER_BACKFILL',
+            {
+                'first_period_id': first_period_id,
+                'last_period_id': last_period_id,
+                'processes': processes,
+                'region_workers': options['region_workers'],
+                'api_in_flight': self.api_in_flight,
+                'mode': 'incremental' if incremental else 'full',
+                'periods': {period_id: {'status': 'pending'} for period_id in period_ids}
+            }
+        )
+
+        logger.info(f"Backfilling {len(period_ids)} periods ({period_ids[0]} to {period_ids[-1]}) "
+                    f"with {processes} processes x {options['region_workers']} region workers")
+
+        results = {}
+        # spawn: each worker opens its own connection pool instead of inheriting the parent's sockets
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+            futures = {
+                executor.submit(_backfill_period, period_id, batch_id, options): period_id
+                for period_id in period_ids
+            }
+            for future in as_completed(futures):
+                period_id = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker process itself died (e.g. killed or out of memory)
+                    result = {'period_id': period_id, 'status': 'failed', 'total_shifts': 0, 'errors': [str(e)]}
+                    ETLBatch.set_metadata_entry(batch_id, 'periods', period_id, result)
+
+                results[period_id] = result
+                logger.info(f"[{len(results)}/{len(period_ids)}] {period_id}: {result['status']} "
+                            f"({result.get('total_shifts', 0):,} shifts)")
+
+        ordered = [results[period_id] for period_id in period_ids]
+        failed = [result for result in ordered if result['status'] == 'failed']
+        skipped = [result for result in ordered if result['status'] == 'skipped']
+        total_shifts = sum(result.get('total_shifts', 0) for result in ordered)
+
+        error_message = None
+        if failed or skipped:
+            error_message = '; '.join(
+                f"{result['period_id']}: {result['status']}" for result in failed + skipped
+            )
+        ETLBatch.complete_batch(batch_id, total_shifts, len(failed) + len(skipped), error_message)
+
+        return {
+            'batch_id': batch_id,
+            'periods': ordered,
+            'total_shifts': total_shifts,
+            'failed': [result['period_id'] for result in failed],
+            'skipped': [result['period_id'] for result in skipped]
+        }
@@ -26,13 +26,69 @@ class Config:
     POSTGRES_USER = os.getenv('PGUSER')
     POSTGRES_PASSWORD = os.getenv('PGPASSWORD')
     POSTGRES_SCHEMA = os.getenv('POSTGRES_SCHEMA')
+    DB_POOL_SIZE = int(os.getenv('ETL_DB_POOL_SIZE', '5'))   # Connections kept open (and their prepared statements)
+    DB_POOL_MAX = int(os.getenv('ETL_DB_POOL_MAX', '20'))    # Hard cap; further checkouts wait for a free connection
+    DB_POOL_TIMEOUT = 60         # seconds a checkout waits before giving up
+    DB_HEALTH_CHECK_IDLE = 30    # seconds idle after which a connection is pinged before reuse
+    DB_PREPARE_STATEMENTS = os.getenv('ETL_DB_PREPARE_STATEMENTS', 'true').lower() == 'true'  # Turn off behind transaction-mode PgBouncer
+    STREAM_ITERSIZE = int(os.getenv('ETL_STREAM_ITERSIZE', '10000'))  # Rows per server-side cursor fetch (stream_* queries)
     
     # ETL Settings
     API_PAGE_SIZE = 100  # Max records per API call
+    API_PAGE_FAN_OUT = int(os.getenv('TRACKTIK_PAGE_FAN_OUT', '4'))  # Concurrent page requests once meta.count is known
+    ACCOUNT_FILTER_CHUNK_SIZE = 20  # Account IDs per account.id:in request
+    ACCOUNT_FILTER_WORKERS = int(os.getenv('TRACKTIK_ACCOUNT_FILTER_WORKERS', '4'))  # Concurrent account.id:in requests
     BATCH_SIZE = 1000    # Records to process at once
+    COLUMNAR_SHIFT_TRANSFORM = os.getenv('TRACKTIK_COLUMNAR_TRANSFORM', 'false').lower() == 'true'  # transform_shifts_batch per page (slower at page size, see benchmark_transform.py)
     MAX_RETRIES = 3
     RETRY_DELAY = 5      # seconds
     
+    # Reference data cache (clients, positions, regions)
+    REFERENCE_CACHE_DIR = "etl/cache"
+    REFERENCE_CACHE_TTL = int(os.getenv('REFERENCE_CACHE_TTL', '900'))                # seconds before a refresh
+    REFERENCE_CACHE_FULL_REFRESH = int(os.getenv('REFERENCE_CACHE_FULL_REFRESH', '86400'))  # seconds before a full reload
+    # Last-modified field used for :after filters - not confirmed by tracktik_api_findings.md;
+    # reads that show the filter was ignored log a warning (see utils/watermark.py)
+    TRACKTIK_MODIFIED_FIELD = os.getenv('TRACKTIK_MODIFIED_FIELD', 'updatedOn')
+    
+    # Incremental shift sync
+    INCREMENTAL_OVERLAP_MINUTES = int(os.getenv('ETL_INCREMENTAL_OVERLAP_MINUTES', '60'))  # Re-read window before the watermark
+    
+    # Billing periods
+    BILLING_PERIOD_INDEX_TTL = int(os.getenv('BILLING_PERIOD_INDEX_TTL', '3600'))  # seconds before the in-memory index reloads
+    
+    # fact_shifts partition lifecycle
+    PARTITION_PERIODS_AHEAD = int(os.getenv('ETL_PARTITION_PERIODS_AHEAD', '4'))      # Billing periods to pre-create
+    PARTITION_RETENTION_DAYS = int(os.getenv('ETL_PARTITION_RETENTION_DAYS', '730'))  # Keep partitions this long after period end
+    PARTITION_ARCHIVE_DIR = os.getenv('ETL_PARTITION_ARCHIVE_DIR', 'etl/archive')     # Parquet exports of detached partitions
+    
+    # Concurrency
+    MAX_REGION_WORKERS = int(os.getenv('ETL_MAX_REGION_WORKERS', '4'))
+    API_CALLS_PER_MINUTE = int(os.getenv('TRACKTIK_CALLS_PER_MINUTE', '300'))  # Shared across workers
+    RATE_LIMIT_WINDOW = 60   # seconds the X-RateLimit-Limit budget applies to
+    RATE_LIMIT_RESERVE = 10  # calls held back from the reported remaining budget
+    RATE_LIMIT_STATE_FILE = os.getenv('TRACKTIK_RATE_LIMIT_STATE')  # Set to share one budget across processes
+    API_MAX_IN_FLIGHT = int(os.getenv('TRACKTIK_API_MAX_IN_FLIGHT', '0'))  # Requests in flight per rate budget, across its processes (0 = no cap)
+    ASYNC_MAX_CONNECTIONS = int(os.getenv('TRACKTIK_ASYNC_MAX_CONNECTIONS', '200'))  # Async client connection pool
+    ASYNC_MAX_IN_FLIGHT = int(os.getenv('TRACKTIK_ASYNC_MAX_IN_FLIGHT', '200'))      # Async requests in flight
+    ASYNC_REQUEST_TIMEOUT = 60  # seconds
+    ASYNC_EXTRACT = os.getenv('TRACKTIK_ASYNC_EXTRACT', 'false').lower() == 'true'  # Fetch shift pages with the async client (needs aiohttp)
+    ASYNC_PAGE_FAN_OUT = int(os.getenv('TRACKTIK_ASYNC_PAGE_FAN_OUT', '16'))        # Shift pages in flight per region with ASYNC_EXTRACT
+    
+    # Stage timing metrics (see utils/stage_timer.py)
+    METRICS_TEXTFILE_DIR = os.getenv('ETL_METRICS_TEXTFILE_DIR')  # node_exporter textfile directory; unset = no export
+    
+    # Multi-period backfill (see etl/backfill.py)
+    BACKFILL_PROCESSES = int(os.getenv('ETL_BACKFILL_PROCESSES', '4'))          # Billing periods loaded at once, one process each
+    BACKFILL_API_IN_FLIGHT = int(os.getenv('ETL_BACKFILL_API_IN_FLIGHT', '16'))  # TrackTik requests in flight across all processes
+    BACKFILL_RATE_LIMIT_STATE = os.getenv('TRACKTIK_RATE_LIMIT_STATE', 'etl/cache/rate_limit_state.json')  # Budget shared by the processes
+    
+    # Data quality rules (see utils/data_quality.py)
+    DQ_RULES_FILE = os.getenv('ETL_DQ_RULES_FILE')  # JSON overriding the default rules per table; unset = defaults
+    
+    # Offline API stand-in (see etl/replay_server.py)
+    REPLAY_FIXTURE_DIR = os.getenv('TRACKTIK_REPLAY_FIXTURES', 'etl/fixtures/tracktik')  # Recorded <resource>.json files (tenant data, don't commit)
+    
     @property
     def postgres_url(self):
         return f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
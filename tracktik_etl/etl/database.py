@@ -3,31 +3,69 @@
 Database connection and utilities
 UPDATED FOR PROPER SCD TYPE 2 AND SCHEMA ALIGNMENT
 """
+import io
+import json
+import uuid
 import logging
+import threading
 from contextlib import contextmanager
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Sequence
+import numpy as np
+import pandas as pd
+import pyarrow as pa
 import psycopg2
 from psycopg2.extras import RealDictCursor, execute_batch
-from psycopg2.pool import SimpleConnectionPool
-from datetime import datetime
+from datetime import date, datetime
 
 from .config import config
+from .utils.connection_pool import HealthCheckedPool, PreparedStatement
+from .utils.data_quality import DataQualityValidator
+from .utils.period_index import BillingPeriodIndex
 
 logger = logging.getLogger(__name__)
 
+# Arrow types for PostgreSQL type OIDs (stream_arrow); anything else is streamed as text
+_ARROW_TYPES = {
+    16: pa.bool_(),                        # boolean
+    20: pa.int64(),                        # bigint
+    21: pa.int16(),                        # smallint
+    23: pa.int32(),                        # integer
+    700: pa.float32(),                     # real
+    701: pa.float64(),                     # double precision
+    1700: pa.float64(),                    # numeric (named cursors don't report precision/scale)
+    1082: pa.date32(),                     # date
+    1114: pa.timestamp('us'),              # timestamp
+    1184: pa.timestamp('us', tz='UTC'),    # timestamptz
+}
+
 
 class DatabaseManager:
     """Manage PostgreSQL connections and operations"""
     
     def __init__(self):
-        self.pool = SimpleConnectionPool(
-            1, 20,  # min and max connections
+        # Thread-safe pool shared by concurrent region workers
+        self.pool = HealthCheckedPool(
+            min(config.DB_POOL_SIZE, config.DB_POOL_MAX), config.DB_POOL_MAX,
+            timeout=config.DB_POOL_TIMEOUT,
+            check_idle_after=config.DB_HEALTH_CHECK_IDLE,
             host=config.POSTGRES_HOST,
             port=config.POSTGRES_PORT,
             database=config.POSTGRES_DB,
             user=config.POSTGRES_USER,
             password=config.POSTGRES_PASSWORD
         )
+        # Prepared statements by query text (prepared on each connection at first use)
+        self._statements: Dict[str, PreparedStatement] = {}
+        # fact_shifts partitions known to exist (see ensure_shift_partitions)
+        self._known_partitions = set()
+        # Process-wide date -> billing period lookups, loaded on first use
+        self.period_index = BillingPeriodIndex(
+            self._load_billing_periods, max_age_seconds=config.BILLING_PERIOD_INDEX_TTL
+        )
+        # Per-table rules checked by validate_data_quality
+        self.dq_validator = DataQualityValidator()
+        # Advisory lock names held by the current thread (see advisory_lock)
+        self._held_locks = threading.local()
         
     @contextmanager
     def get_connection(self):
@@ -52,11 +90,169 @@ class DatabaseManager:
             finally:
                 cursor.close()
                 
+    @contextmanager
+    def advisory_lock(self, name: str):
+        """
+        Hold a session-level advisory lock on `name` without waiting for it
+        
+        The lock lives on a pooled connection kept checked out until the block
+        exits, so it is released even if the caller's own transactions fail.
+        Re-entrant per thread: a nested block for a name the thread already
+        holds yields True, so a caller and the code it calls can both take it.
+        
+        Yields:
+            True if the lock was acquired, False if another session holds it
+        """
+        held = self._held_locks.__dict__.setdefault('names', set())
+        if name in held:
+            yield True
+            return
+        
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (name,))
+                acquired = cursor.fetchone()[0]
+            conn.commit()
+            
+            if acquired:
+                held.add(name)
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    held.discard(name)
+                    conn.rollback()
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", (name,))
+                    conn.commit()
+    
     def execute_query(self, query: str, params: Dict = None) -> List[Dict]:
         """Execute a SELECT query"""
         with self.get_cursor() as cursor:
             cursor.execute(query, params)
             return cursor.fetchall()
+    
+    def _prepared(self, query: str) -> PreparedStatement:
+        statement = self._statements.get(query)
+        if statement is None:
+            statement = self._statements.setdefault(query, PreparedStatement(query))
+        return statement
+    
+    def _prepare_on(self, cursor, query: str) -> Optional[PreparedStatement]:
+        """The query's PreparedStatement, prepared on the cursor's connection if it isn't yet
+        
+        Returns None when DB_PREPARE_STATEMENTS is off (or the connection is not pooled).
+        """
+        prepared_on_connection = getattr(cursor.connection, 'prepared_statements', None)
+        if not config.DB_PREPARE_STATEMENTS or prepared_on_connection is None:
+            return None
+        
+        statement = self._prepared(query)
+        if statement.name not in prepared_on_connection:
+            cursor.execute(statement.prepare_sql)
+            prepared_on_connection.add(statement.name)
+        return statement
+    
+    def execute_prepared(self, cursor, query: str, params: Dict = None):
+        """
+        cursor.execute for a hot query, planned once per connection
+        
+        The query (pyformat, %(name)s placeholders) is PREPAREd the first time
+        it runs on the cursor's connection and EXECUTEd from then on. Prepared
+        statements outlive rollbacks, so only a new connection prepares again.
+        Falls back to a plain execute when DB_PREPARE_STATEMENTS is off.
+        """
+        statement = self._prepare_on(cursor, query)
+        if statement is None:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(statement.execute_sql, statement.args(params or {}))
+    
+    def query_prepared(self, query: str, params: Dict = None) -> List[Dict]:
+        """execute_query through a per-connection prepared statement (see execute_prepared)"""
+        with self.get_cursor() as cursor:
+            self.execute_prepared(cursor, query, params)
+            return cursor.fetchall()
+            
+    @contextmanager
+    def server_cursor(self, query: str, params: Dict = None, itersize: int = None, cursor_factory=None):
+        """
+        Run a query on a named (server-side) cursor
+        
+        Rows stay on the server and are fetched `itersize` at a time (default
+        config.STREAM_ITERSIZE) as the cursor is iterated or fetchmany'd. The
+        pooled connection is held until the block exits; its read transaction
+        is then rolled back. Rows are plain tuples unless a cursor_factory is given.
+        """
+        with self.get_connection() as conn:
+            try:
+                with conn.cursor(name=f"stream_{uuid.uuid4().hex[:16]}", cursor_factory=cursor_factory) as cursor:
+                    cursor.itersize = itersize or config.STREAM_ITERSIZE
+                    cursor.execute(query, params)
+                    yield cursor
+            finally:
+                conn.rollback()
+    
+    def stream_rows(self, query: str, params: Dict = None, itersize: int = None) -> Iterator[tuple]:
+        """
+        Yield a query's rows as tuples, in bounded memory
+        
+        The connection stays checked out until the generator is exhausted or closed.
+        """
+        with self.server_cursor(query, params, itersize) as cursor:
+            yield from cursor
+    
+    def stream_batches(self, query: str, params: Dict = None, batch_size: int = None) -> Iterator[List[tuple]]:
+        """Yield a query's rows as lists of up to `batch_size` tuples (default config.STREAM_ITERSIZE)"""
+        batch_size = batch_size or config.STREAM_ITERSIZE
+        with self.server_cursor(query, params, batch_size) as cursor:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+    
+    @staticmethod
+    def _arrow_schema(description) -> pa.Schema:
+        """Arrow schema for a cursor description, by column type OID"""
+        return pa.schema([
+            pa.field(column.name, _ARROW_TYPES.get(column.type_code, pa.string()))
+            for column in description
+        ])
+    
+    def stream_arrow(self, query: str, params: Dict = None, batch_size: int = None,
+                     schema: Optional[pa.Schema] = None) -> Iterator[pa.RecordBatch]:
+        """
+        Yield a query's rows as Arrow record batches of up to `batch_size` rows
+        
+        Every batch has the same schema: `schema` if given (fields in SELECT
+        order), else one derived from the result's column types. Text columns
+        take json/jsonb, uuid and other values as text; numeric is float64
+        unless the schema says decimal.
+        """
+        batch_size = batch_size or config.STREAM_ITERSIZE
+        with self.server_cursor(query, params, batch_size) as cursor:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                
+                if schema is None:
+                    schema = self._arrow_schema(cursor.description)
+                
+                arrays = []
+                for i, field in enumerate(schema):
+                    values = [row[i] for row in rows]
+                    if pa.types.is_string(field.type):
+                        values = [
+                            value if value is None or isinstance(value, str) else json.dumps(value, default=str)
+                            for value in values
+                        ]
+                    elif pa.types.is_floating(field.type):
+                        values = [None if value is None else float(value) for value in values]
+                    arrays.append(pa.array(values, type=field.type))
+                
+                yield pa.RecordBatch.from_arrays(arrays, schema=schema)
             
     def execute_batch_insert(self, query: str, data: List[Dict], page_size: int = 100):
         """Execute batch insert with psycopg2 execute_batch"""
@@ -64,10 +260,113 @@ class DatabaseManager:
             execute_batch(cursor, query, data, page_size=page_size)
             return cursor.rowcount
             
+    def copy_rows(self, cursor, table: str, columns: List[str], rows: Iterable[Sequence]) -> int:
+        """
+        Stream rows into a table with COPY FROM STDIN
+        
+        Args:
+            cursor: Open cursor (the caller owns the transaction)
+            table: Target table (qualified or temp table name)
+            columns: Column names, in the same order as each row's values
+            rows: Sequences of values; None becomes NULL
+            
+        Returns:
+            Number of rows copied
+        """
+        buffer = io.StringIO()
+        count = 0
+        for row in rows:
+            buffer.write(','.join(self._copy_value(value) for value in row))
+            buffer.write('\n')
+            count += 1
+        
+        if count:
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+        return count
+    
+    def copy_frame(self, cursor, table: str, frame) -> int:
+        """
+        Stream a pandas DataFrame into a table with COPY FROM STDIN
+        
+        The frame is serialised column-wise by DataFrame.to_csv; missing values
+        (None, NaN, NaT, pd.NA) are written as unquoted empty fields, i.e. NULL.
+        Integer columns should use a nullable dtype (e.g. Int64) so they are
+        not written as floats.
+        
+        Returns:
+            Number of rows copied
+        """
+        if frame.empty:
+            return 0
+        
+        # to_csv formats tz-aware timestamps one by one; format them as UTC in numpy instead
+        timestamp_columns = [col for col in frame.columns if getattr(frame[col].dtype, 'tz', None) is not None]
+        if timestamp_columns:
+            frame = frame.assign(**{
+                col: pd.Series(
+                    np.char.add(np.datetime_as_string(
+                        frame[col].dt.tz_convert('UTC').dt.tz_localize(None).to_numpy('datetime64[us]'), unit='us'
+                    ), '+00:00'),
+                    index=frame.index
+                ).where(frame[col].notna())
+                for col in timestamp_columns
+            })
+        
+        buffer = io.StringIO()
+        frame.to_csv(buffer, header=False, index=False, na_rep='')
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(frame.columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+        return len(frame)
+    
+    @staticmethod
+    def _copy_value(value: Any) -> str:
+        """Encode one value as a CSV field - unquoted empty is NULL, everything else is quoted"""
+        if value is None:
+            return ''
+        if isinstance(value, bool):
+            value = 't' if value else 'f'
+        elif isinstance(value, (datetime, date)):
+            value = value.isoformat()
+        elif isinstance(value, (dict, list)):
+            value = json.dumps(value)
+        else:
+            value = str(value)
+        return '"' + value.replace('"', '""') + '"'
+    
+    @staticmethod
+    def _json_value(value: Any) -> str:
+        """json.dumps fallback: dates as ISO text, Decimals and UUIDs as strings (as _copy_value writes them)"""
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return str(value)
+    
+    @staticmethod
+    def _scd_hash_sql(alias: str, scd_fields: List[str]) -> str:
+        """SQL expression hashing the trimmed text of the SCD fields (NULL-aware)"""
+        parts = ', '.join(f"btrim({alias}.{field}::text)" for field in scd_fields)
+        return f"md5(ROW({parts})::text)"
+            
     def upsert_dimension(self, table: str, records: List[Dict], 
                         id_field: str, scd_fields: List[str]) -> Dict[str, int]:
         """
-        Proper SCD Type 2 upsert for dimension tables
+        Set-based SCD Type 2 merge for dimension tables
+        
+        The batch is COPYed into a temp staging table with the target's column
+        types, then classified in SQL by comparing hashes of the SCD fields
+        against the current rows. Changed rows are closed with one UPDATE and
+        all new versions are written with one INSERT ... SELECT, so the cost is
+        a handful of round-trips regardless of batch size. If a natural key
+        appears more than once in the batch, the last record wins; the counts
+        still cover every input record, as if the records had been applied one
+        after another (a repeat counts as updated if it differs from the
+        previous record for its key, else unchanged).
         
         Args:
             table: Target table name
@@ -80,103 +379,126 @@ class DatabaseManager:
         """
         if not records:
             return {'inserted': 0, 'updated': 0, 'unchanged': 0}
-            
-        inserted = 0
-        updated = 0
-        unchanged = 0
+        
+        target = f"{config.POSTGRES_SCHEMA}.{table}"
+        staging = f"stg_{table}"
+        
+        # Column list: union of record keys, plus the temporal fields we default
+        columns = []
+        for record in records:
+            for column in record:
+                if column not in columns:
+                    columns.append(column)
+        for column in ('valid_from', 'is_current'):
+            if column not in columns:
+                columns.append(column)
+        column_list = ', '.join(columns)
+        
+        # New versions of changed rows start exactly when the old version closes
+        select_list = ', '.join(
+            "CASE WHEN s.stg_action = 'U' THEN CURRENT_TIMESTAMP "
+            "ELSE COALESCE(s.valid_from, CURRENT_TIMESTAMP) END" if col == 'valid_from'
+            else "COALESCE(s.is_current, TRUE)" if col == 'is_current'
+            else f"s.{col}"
+            for col in columns
+        )
         
         with self.get_cursor() as cursor:
-            for record in records:
-                natural_key_value = record[id_field]
-                
-                # 1. Check if current record exists
-                check_query = f"""
-                    SELECT surrogate_key, {', '.join(scd_fields)}
-                    FROM {config.POSTGRES_SCHEMA}.{table}
-                    WHERE {id_field} = %s AND is_current = TRUE
-                """
-                cursor.execute(check_query, (natural_key_value,))
-                existing = cursor.fetchone()
-                
-                if not existing:
-                    # 2a. No current record exists - insert new
-                    self._insert_new_dimension_record(cursor, table, record)
-                    inserted += 1
-                    
-                else:
-                    # 2b. Current record exists - check for changes
-                    has_changed = self._has_scd_fields_changed(existing, record, scd_fields)
-                    
-                    if has_changed:
-                        # 3a. Fields changed - close current and insert new
-                        self._close_current_record(cursor, table, id_field, natural_key_value)
-                        self._insert_new_dimension_record(cursor, table, record)
-                        updated += 1
-                    else:
-                        # 3b. No changes - optionally update etl_batch_id
-                        if 'etl_batch_id' in record:
-                            update_query = f"""
-                                UPDATE {config.POSTGRES_SCHEMA}.{table}
-                                SET etl_batch_id = %s, updated_at = CURRENT_TIMESTAMP
-                                WHERE {id_field} = %s AND is_current = TRUE
-                            """
-                            cursor.execute(update_query, (record['etl_batch_id'], natural_key_value))
-                        unchanged += 1
+            # 1. Stage the batch with the target's column types
+            cursor.execute(f"""
+                CREATE TEMP TABLE {staging} ON COMMIT DROP AS
+                SELECT {column_list}, NULL::BIGINT AS stg_row, NULL::CHAR(1) AS stg_action
+                FROM {target}
+                WITH NO DATA
+            """)
+            self.copy_rows(
+                cursor, staging, columns + ['stg_row'],
+                ([record.get(col) for col in columns] + [i] for i, record in enumerate(records))
+            )
+            
+            cursor.execute(f"ANALYZE {staging}")
+            
+            # 2. Classify against current rows: N = unchanged, U = changed, NULL = new
+            cursor.execute(f"""
+                UPDATE {staging} s
+                SET stg_action = CASE
+                    WHEN {self._scd_hash_sql('d', scd_fields)} = {self._scd_hash_sql('s', scd_fields)}
+                    THEN 'N' ELSE 'U' END
+                FROM {target} d
+                WHERE d.{id_field} = s.{id_field} AND d.is_current = TRUE
+            """)
+            
+            # Count every input record: the first for a key against the current row,
+            # each repeat against the record before it
+            cursor.execute(f"""
+                SELECT action, COUNT(*) AS n
+                FROM (
+                    SELECT CASE
+                        WHEN LAG(stg_row) OVER w IS NULL THEN COALESCE(stg_action, 'I')
+                        WHEN LAG({self._scd_hash_sql('s', scd_fields)}) OVER w = {self._scd_hash_sql('s', scd_fields)} THEN 'N'
+                        ELSE 'U' END AS action
+                    FROM {staging} s
+                    WINDOW w AS (PARTITION BY {id_field} ORDER BY stg_row)
+                ) classified
+                GROUP BY action
+            """)
+            counts = {row['action']: row['n'] for row in cursor.fetchall()}
+            
+            # Keep only the last record for each natural key
+            cursor.execute(f"""
+                DELETE FROM {staging} a
+                USING {staging} b
+                WHERE a.{id_field} = b.{id_field} AND a.stg_row < b.stg_row
+            """)
+            
+            # 3. Close current versions of changed rows
+            cursor.execute(f"""
+                UPDATE {target} d
+                SET valid_to = CURRENT_TIMESTAMP, 
+                    is_current = FALSE,
+                    updated_at = CURRENT_TIMESTAMP
+                FROM {staging} s
+                WHERE s.stg_action = 'U'
+                AND d.{id_field} = s.{id_field} AND d.is_current = TRUE
+            """)
+            
+            # 4. Unchanged rows just pick up the new batch id
+            if 'etl_batch_id' in columns:
+                cursor.execute(f"""
+                    UPDATE {target} d
+                    SET etl_batch_id = s.etl_batch_id, updated_at = CURRENT_TIMESTAMP
+                    FROM {staging} s
+                    WHERE s.stg_action = 'N'
+                    AND d.{id_field} = s.{id_field} AND d.is_current = TRUE
+                """)
+            
+            # 5. Insert new records and new versions of changed ones
+            cursor.execute(f"""
+                INSERT INTO {target} ({column_list})
+                SELECT {select_list}
+                FROM {staging} s
+                WHERE s.stg_action IS DISTINCT FROM 'N'
+                ORDER BY s.stg_row
+            """)
                         
-        result = {'inserted': inserted, 'updated': updated, 'unchanged': unchanged}
+        result = {
+            'inserted': counts.get('I', 0),
+            'updated': counts.get('U', 0),
+            'unchanged': counts.get('N', 0)
+        }
         logger.info(f"Dimension {table}: {result}")
         return result
     
-    def _has_scd_fields_changed(self, existing: Dict, new_record: Dict, scd_fields: List[str]) -> bool:
-        """Check if any SCD fields have changed"""
-        for field in scd_fields:
-            existing_val = existing.get(field)
-            new_val = new_record.get(field)
-            
-            # Handle None values and type conversions
-            if existing_val is None and new_val is None:
-                continue
-            elif existing_val is None or new_val is None:
-                return True
-            elif str(existing_val).strip() != str(new_val).strip():
-                return True
-                
-        return False
-    
-    def _close_current_record(self, cursor, table: str, id_field: str, natural_key_value: Any):
-        """Close the current record by setting valid_to and is_current = FALSE"""
-        close_query = f"""
-            UPDATE {config.POSTGRES_SCHEMA}.{table}
-            SET valid_to = CURRENT_TIMESTAMP, 
-                is_current = FALSE,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE {id_field} = %s AND is_current = TRUE
-        """
-        cursor.execute(close_query, (natural_key_value,))
-    
-    def _insert_new_dimension_record(self, cursor, table: str, record: Dict):
-        """Insert a new dimension record"""
-        # Ensure temporal fields are set
-        if 'valid_from' not in record:
-            record['valid_from'] = datetime.now()
-        if 'is_current' not in record:
-            record['is_current'] = True
-            
-        # Build INSERT query
-        columns = list(record.keys())
-        placeholders = [f'%({col})s' for col in columns]
-        
-        insert_query = f"""
-            INSERT INTO {config.POSTGRES_SCHEMA}.{table} ({', '.join(columns)})
-            VALUES ({', '.join(placeholders)})
-        """
-        cursor.execute(insert_query, record)
-    
     def insert_fact_batch_partitioned(self, table: str, records: List[Dict], 
                                     partition_key: str) -> int:
         """
         Insert fact records into partitioned table with conflict handling
         
+        For fact_shifts, a record's raw_data (the API payload) is not a
+        fact_shifts column; it is stored in the raw payload side tables, as
+        copy_fact_shifts does. Rows get the same row_hash as copy_fact_shifts
+        computes, and a conflicting row is only rewritten if its hash differs.
+        
         Args:
             table: Target fact table name
             records: List of fact records
@@ -204,38 +526,287 @@ class DatabaseManager:
                 
                 # Build bulk insert query
                 if partition_records:
-                    columns = list(partition_records[0].keys())
-                    placeholders = [f'%({col})s' for col in columns]
+                    columns = [
+                        col for col in partition_records[0].keys()
+                        if not (table == 'fact_shifts' and col in ('raw_data', 'row_hash'))
+                    ]
                     
                     # For fact_shifts, use composite primary key conflict resolution
                     if table == 'fact_shifts':
+                        # Each record is sent as one JSON document and typed by the table's row
+                        # type, so row_hash is computed on the same values copy_fact_shifts hashes
+                        column_list = ', '.join(columns)
+                        hash_columns = sorted(col for col in columns if col not in self.FACT_SHIFT_NON_HASH_COLUMNS)
+                        update_columns = [col for col in columns if col not in ('shift_id', 'billing_period_id', 'created_at', 'updated_at')]
+                        update_list = ''.join(f"{col} = EXCLUDED.{col},\n                                " for col in update_columns)
                         insert_query = f"""
-                            INSERT INTO {config.POSTGRES_SCHEMA}.{table} ({', '.join(columns)})
-                            VALUES ({', '.join(placeholders)})
+                            INSERT INTO {config.POSTGRES_SCHEMA}.{table} ({column_list}, row_hash)
+                            SELECT {column_list}, {self._scd_hash_sql('s', hash_columns)}
+                            FROM jsonb_populate_record(NULL::{config.POSTGRES_SCHEMA}.{table}, %(record)s::jsonb) s
                             ON CONFLICT (billing_period_id, shift_id) 
                             DO UPDATE SET
-                                status = EXCLUDED.status,
-                                approved_by = EXCLUDED.approved_by,
-                                approved_at = EXCLUDED.approved_at,
-                                raw_data = EXCLUDED.raw_data,
-                                etl_batch_id = EXCLUDED.etl_batch_id,
+                                {update_list}row_hash = EXCLUDED.row_hash,
                                 updated_at = CURRENT_TIMESTAMP
+                            WHERE fact_shifts.row_hash IS DISTINCT FROM EXCLUDED.row_hash
                         """
+                        partition_records = [
+                            {'record': json.dumps({col: record.get(col) for col in columns}, default=self._json_value)}
+                            for record in partition_records
+                        ]
                     else:
                         # Generic fact table insert
+                        placeholders = [f'%({col})s' for col in columns]
                         insert_query = f"""
                             INSERT INTO {config.POSTGRES_SCHEMA}.{table} ({', '.join(columns)})
                             VALUES ({', '.join(placeholders)})
                             ON CONFLICT DO NOTHING
                         """
                     
-                    # Use execute_batch for performance
-                    execute_batch(cursor, insert_query, partition_records, page_size=config.BATCH_SIZE)
+                    # execute_batch of EXECUTEs: the upsert is planned once per connection
+                    statement = self._prepare_on(cursor, insert_query)
+                    if statement is None:
+                        execute_batch(cursor, insert_query, partition_records, page_size=config.BATCH_SIZE)
+                    else:
+                        execute_batch(cursor, statement.execute_sql,
+                                      [statement.args(record) for record in partition_records],
+                                      page_size=config.BATCH_SIZE)
                     total_inserted += len(partition_records)
+            
+            if table == 'fact_shifts':
+                self._stage_shift_payloads(cursor, records)
         
         logger.info(f"Inserted {total_inserted} total records into {table}")
         return total_inserted
     
+    def ensure_shift_partitions(self, period_ids: Iterable[str]) -> List[str]:
+        """
+        Make sure a fact_shifts partition exists for each billing period
+        
+        Partitions already seen by this process are skipped without a query;
+        missing ones are created with create_shift_partition in their own short
+        transaction, so the DDL lock is never held across a data load. A
+        partition table that exists but is detached (archived, not dropped) is
+        attached again, since the name alone doesn't make it part of fact_shifts.
+        
+        Returns:
+            Period IDs whose partitions were created or re-attached
+        """
+        unseen = sorted(set(period_ids) - self._known_partitions)
+        created = []
+        
+        if not unseen:
+            return created
+        
+        parent = f"{config.POSTGRES_SCHEMA}.fact_shifts"
+        with self.get_cursor() as cursor:
+            for period_id in unseen:
+                partition = f"{config.POSTGRES_SCHEMA}.fact_shifts_{period_id}"
+                cursor.execute("""
+                    SELECT to_regclass(%(partition)s) IS NOT NULL AS table_exists,
+                           EXISTS (
+                               SELECT 1 FROM pg_inherits
+                               WHERE inhrelid = to_regclass(%(partition)s)
+                               AND inhparent = to_regclass(%(parent)s)
+                           ) AS attached
+                """, {'partition': partition, 'parent': parent})
+                row = cursor.fetchone()
+                
+                if row['attached']:
+                    continue
+                
+                if row['table_exists']:
+                    logger.warning(f"fact_shifts partition for period {period_id} was detached, re-attaching it")
+                    cursor.execute(
+                        f"ALTER TABLE {parent} ATTACH PARTITION {partition} FOR VALUES IN (%s)", (period_id,)
+                    )
+                else:
+                    # create_shift_partition resolves fact_shifts via search_path
+                    cursor.execute(f"SET LOCAL search_path TO {config.POSTGRES_SCHEMA}")
+                    cursor.execute("SELECT create_shift_partition(%s)", (period_id,))
+                    logger.info(f"Created fact_shifts partition for period {period_id}")
+                created.append(period_id)
+        
+        self._known_partitions.update(unseen)
+        return created
+    
+    # fact_shifts columns that are not business data and stay out of row_hash
+    FACT_SHIFT_NON_HASH_COLUMNS = (
+        'shift_id', 'billing_period_id', 'raw_data', 'row_hash',
+        'created_at', 'updated_at', 'etl_batch_id'
+    )
+    
+    def copy_fact_shifts(self, records) -> Dict[str, int]:
+        """
+        Bulk load shift facts through a COPY-fed staging table
+        
+        Rows are streamed with COPY FROM STDIN into a temp staging table (temp
+        tables are not WAL-logged), missing partitions are provisioned, and each
+        billing period is merged with a single INSERT ... SELECT ... ON CONFLICT.
+        If a shift appears more than once in the batch, the last record wins.
+        
+        Each row carries a row_hash of its business columns, and the conflict
+        path only rewrites shifts whose hash differs, so reloading unchanged
+        data produces no row versions or WAL for the partition.
+        
+        A record's raw_data (the API payload) is not stored on fact_shifts; it
+        goes to the raw_shift_payloads side table, see _merge_shift_payloads.
+        
+        Args:
+            records: Transformed fact_shifts records - a list of dicts, or the
+                DataFrame returned by DataTransformer.transform_shifts_batch
+            
+        Returns:
+            Dict with counts of inserted, updated, and unchanged shifts
+        """
+        stats = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        is_frame = hasattr(records, 'to_csv')
+        if (records.empty if is_frame else not records):
+            return stats
+        
+        if is_frame:
+            period_ids = set(records['billing_period_id'].dropna().unique())
+            columns = [col for col in records.columns if col not in ('row_hash', 'raw_data')]
+            has_payloads = 'raw_data' in records.columns and bool(records['raw_data'].notna().any())
+        else:
+            period_ids = {record['billing_period_id'] for record in records}
+            columns = []
+            for record in records:
+                for column in record:
+                    if column not in columns and column not in ('row_hash', 'raw_data'):
+                        columns.append(column)
+            has_payloads = any(record.get('raw_data') is not None for record in records)
+        
+        self.ensure_shift_partitions(period_ids)
+        column_list = ', '.join(columns)
+        
+        # Sorted so the hash doesn't depend on record key / frame column order
+        hash_columns = sorted(col for col in columns if col not in self.FACT_SHIFT_NON_HASH_COLUMNS)
+        update_columns = [col for col in columns if col not in ('shift_id', 'billing_period_id', 'created_at', 'updated_at')]
+        update_list = ''.join(f"{col} = EXCLUDED.{col},\n                            " for col in update_columns)
+        
+        with self.get_cursor() as cursor:
+            cursor.execute(f"""
+                CREATE TEMP TABLE stg_fact_shifts ON COMMIT DROP AS
+                SELECT {column_list}, NULL::BIGINT AS stg_row, NULL::JSONB AS raw_data
+                FROM {config.POSTGRES_SCHEMA}.fact_shifts
+                WITH NO DATA
+            """)
+            if is_frame:
+                staged = records[columns].assign(
+                    stg_row=range(len(records)),
+                    raw_data=records['raw_data'] if has_payloads else None
+                )
+                self.copy_frame(cursor, 'stg_fact_shifts', staged)
+            else:
+                self.copy_rows(
+                    cursor, 'stg_fact_shifts', columns + ['stg_row', 'raw_data'],
+                    ([record.get(col) for col in columns] + [i, record.get('raw_data')]
+                     for i, record in enumerate(records))
+                )
+            
+            cursor.execute("""
+                SELECT billing_period_id, COUNT(DISTINCT shift_id) AS n
+                FROM stg_fact_shifts
+                GROUP BY billing_period_id
+            """)
+            staged_counts = {row['billing_period_id']: row['n'] for row in cursor.fetchall()}
+            
+            for period_id in sorted(period_ids):
+                cursor.execute(f"""
+                    WITH upserted AS (
+                        INSERT INTO {config.POSTGRES_SCHEMA}.fact_shifts ({column_list}, row_hash)
+                        SELECT DISTINCT ON (shift_id) {column_list}, {self._scd_hash_sql('s', hash_columns)}
+                        FROM stg_fact_shifts s
+                        WHERE billing_period_id = %(period_id)s
+                        ORDER BY shift_id, stg_row DESC
+                        ON CONFLICT (billing_period_id, shift_id) 
+                        DO UPDATE SET
+                            {update_list}row_hash = EXCLUDED.row_hash,
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE fact_shifts.row_hash IS DISTINCT FROM EXCLUDED.row_hash
+                        -- xmax is not available on partitioned tables; a fresh row still has
+                        -- created_at = updated_at, while the update path moves updated_at
+                        RETURNING (created_at = updated_at) AS is_insert
+                    )
+                    SELECT COUNT(*) FILTER (WHERE is_insert) AS inserted,
+                           COUNT(*) FILTER (WHERE NOT is_insert) AS updated
+                    FROM upserted
+                """, {'period_id': period_id})
+                result = cursor.fetchone()
+                unchanged = staged_counts.get(period_id, 0) - result['inserted'] - result['updated']
+                logger.info(f"fact_shifts partition {period_id}: {result['inserted']} inserted, "
+                           f"{result['updated']} updated, {unchanged} unchanged")
+                
+                stats['inserted'] += result['inserted']
+                stats['updated'] += result['updated']
+                stats['unchanged'] += unchanged
+            
+            if has_payloads:
+                self._merge_shift_payloads(cursor, has_batch_id='etl_batch_id' in columns)
+        
+        logger.info(f"Loaded {sum(stats.values())} total records into fact_shifts: {stats}")
+        return stats
+    
+    def _stage_shift_payloads(self, cursor, records: List[Dict]):
+        """Stage the raw_data of shift records and store it in the side tables"""
+        payloads = [record for record in records if record.get('raw_data') is not None]
+        if not payloads:
+            return
+        
+        cursor.execute(f"""
+            CREATE TEMP TABLE stg_fact_shifts ON COMMIT DROP AS
+            SELECT billing_period_id, shift_id, etl_batch_id, NULL::BIGINT AS stg_row, NULL::JSONB AS raw_data
+            FROM {config.POSTGRES_SCHEMA}.fact_shifts
+            WITH NO DATA
+        """)
+        self.copy_rows(
+            cursor, 'stg_fact_shifts', ['billing_period_id', 'shift_id', 'etl_batch_id', 'stg_row', 'raw_data'],
+            ([record['billing_period_id'], record['shift_id'], record.get('etl_batch_id'), i, record['raw_data']]
+             for i, record in enumerate(payloads))
+        )
+        self._merge_shift_payloads(cursor)
+    
+    def _merge_shift_payloads(self, cursor, has_batch_id: bool = True):
+        """
+        Store the staged raw payloads in the side tables
+        
+        Payloads are content-addressed by the md5 of their jsonb text (key order
+        normalised), so identical payloads are stored once and a reload of an
+        unchanged shift writes nothing.
+        """
+        batch_id_column = 'etl_batch_id' if has_batch_id else 'NULL::UUID AS etl_batch_id'
+        cursor.execute(f"""
+            CREATE TEMP TABLE stg_shift_payloads ON COMMIT DROP AS
+            SELECT DISTINCT ON (billing_period_id, shift_id)
+                billing_period_id, shift_id, {batch_id_column},
+                md5(raw_data::text) AS payload_hash, raw_data
+            FROM stg_fact_shifts
+            WHERE raw_data IS NOT NULL
+            ORDER BY billing_period_id, shift_id, stg_row DESC
+        """)
+        
+        cursor.execute(f"""
+            INSERT INTO {config.POSTGRES_SCHEMA}.raw_shift_payloads (payload_hash, payload)
+            SELECT DISTINCT ON (payload_hash) payload_hash, raw_data
+            FROM stg_shift_payloads
+            ON CONFLICT (payload_hash) DO NOTHING
+        """)
+        new_payloads = cursor.rowcount
+        
+        cursor.execute(f"""
+            INSERT INTO {config.POSTGRES_SCHEMA}.fact_shift_raw
+                (billing_period_id, shift_id, payload_hash, etl_batch_id)
+            SELECT billing_period_id, shift_id, payload_hash, etl_batch_id
+            FROM stg_shift_payloads
+            ON CONFLICT (billing_period_id, shift_id)
+            DO UPDATE SET
+                payload_hash = EXCLUDED.payload_hash,
+                etl_batch_id = EXCLUDED.etl_batch_id,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE fact_shift_raw.payload_hash IS DISTINCT FROM EXCLUDED.payload_hash
+        """)
+        logger.info(f"Stored {new_payloads} new raw payloads, repointed {cursor.rowcount} shifts")
+    
     def get_dimension_lookup(self, table: str, natural_key: str, 
                            lookup_fields: List[str] = None) -> Dict[Any, Dict]:
         """
@@ -258,94 +829,86 @@ class DatabaseManager:
             WHERE is_current = TRUE
         """
         
-        results = self.execute_query(query)
-        return {row[natural_key]: dict(row) for row in results}
+        # Streamed as tuples, so only the lookup itself is ever held in memory
+        lookup = {}
+        with self.server_cursor(query) as cursor:
+            columns = None
+            for row in cursor:
+                if columns is None:
+                    columns = [column.name for column in cursor.description]
+                lookup[row[0]] = dict(zip(columns, row))
+        return lookup
     
-    def validate_data_quality(self, table: str, records: List[Dict]) -> List[Dict]:
+    def validate_data_quality(self, table: str, records, batch_id: Optional[str] = None) -> List[Dict]:
         """
-        Basic data quality validation
+        Check a batch against the table's data quality rules (see utils/data_quality.py)
+        
+        The rules run column-wise over the whole batch; any issues found are
+        COPYed into data_quality_issues.
+        
+        Args:
+            table: Table the records are loaded into
+            records: List of record dicts, or a DataFrame (e.g. from transform_shifts_batch)
+            batch_id: ETL batch the issues are logged against
         
         Returns:
-            List of data quality issues found
+            List of data quality issues found (record_index, record_id, issue_type,
+            field, value, details)
         """
-        issues = []
+        frame = records if isinstance(records, pd.DataFrame) else pd.DataFrame.from_records(records)
+        issues = self.dq_validator.validate(table, frame)
         
-        for i, record in enumerate(records):
-            # Check for required fields based on table
-            if table == 'fact_shifts':
-                required_fields = ['shift_id', 'billing_period_id', 'employee_id', 'position_id', 'client_id']
-            elif table.startswith('dim_'):
-                # For dimensions, check that natural key exists
-                if table == 'dim_employees':
-                    required_fields = ['employee_id', 'first_name', 'last_name']
-                elif table == 'dim_clients':
-                    required_fields = ['client_id', 'name']
-                elif table == 'dim_positions':
-                    required_fields = ['position_id', 'name', 'client_id']
-                else:
-                    required_fields = []
-            else:
-                required_fields = []
-            
-            # Check for missing required fields
-            for field in required_fields:
-                if not record.get(field):
-                    issues.append({
-                        'record_index': i,
-                        'issue_type': 'missing_required_field',
-                        'field': field,
-                        'record_id': record.get('shift_id') or record.get('employee_id') or record.get('client_id'),
-                        'details': f"Required field '{field}' is missing or null"
-                    })
-        
-        if issues:
-            logger.warning(f"Found {len(issues)} data quality issues in {table}")
-            # Optionally log to data_quality_issues table
-            self._log_data_quality_issues(table, issues)
-        
-        return issues
+        if issues.empty:
+            return []
+        
+        logger.warning(f"Found {len(issues)} data quality issues in {table}: "
+                      f"{issues.groupby(['issue_type', 'field']).size().to_dict()}")
+        self._log_data_quality_issues(table, issues, batch_id)
+        
+        return issues.to_dict('records')
     
-    def _log_data_quality_issues(self, table: str, issues: List[Dict]):
-        """Log data quality issues to the database"""
+    def _log_data_quality_issues(self, table: str, issues: pd.DataFrame, batch_id: Optional[str] = None):
+        """COPY data quality issues (as returned by DataQualityValidator.validate) into data_quality_issues"""
         try:
-            issue_records = []
-            for issue in issues:
-                issue_records.append({
-                    'table_name': table,
-                    'issue_type': issue['issue_type'],
-                    'field_name': issue.get('field'),
-                    'record_identifier': str(issue.get('record_id', '')),
-                    'issue_description': issue['details'],
-                    'detected_at': datetime.now()
-                })
-            
-            if issue_records:
-                columns = list(issue_records[0].keys())
-                placeholders = [f'%({col})s' for col in columns]
-                
-                insert_query = f"""
-                    INSERT INTO {config.POSTGRES_SCHEMA}.data_quality_issues ({', '.join(columns)})
-                    VALUES ({', '.join(placeholders)})
-                """
-                
-                self.execute_batch_insert(insert_query, issue_records)
+            rows = pd.DataFrame({
+                'batch_id': batch_id,
+                'table_name': table,
+                'record_id': issues['record_id'],
+                'issue_type': issues['issue_type'],
+                'issue_description': issues['details'],
+                'issue_data': self.dq_validator.issue_data(issues)
+            })
+            with self.get_cursor() as cursor:
+                self.copy_frame(cursor, f"{config.POSTGRES_SCHEMA}.data_quality_issues", rows)
                 
         except Exception as e:
             logger.error(f"Failed to log data quality issues: {e}")
     
-    def get_billing_period_id(self, date_str: str) -> str:
-        """Get billing period ID for a given date using database function"""
+    def _load_billing_periods(self) -> List[Dict]:
+        """All billing periods, for the in-memory period index"""
         query = f"""
-            SELECT period_id 
+            SELECT period_id, start_date, end_date
             FROM {config.POSTGRES_SCHEMA}.billing_periods
-            WHERE %(date)s BETWEEN start_date AND end_date
+            ORDER BY start_date
         """
-        
-        result = self.execute_query(query, {'date': date_str})
-        if result:
-            return result[0]['period_id']
-        else:
+        return self.execute_query(query)
+    
+    def get_billing_period_id(self, date_str: str) -> str:
+        """Get billing period ID for a given date (served from the in-memory period index)"""
+        period_id = self.period_index.lookup(date_str)
+        if period_id is None:
             raise ValueError(f"No billing period found for date: {date_str}")
+        return period_id
+    
+    def generate_billing_periods(self, fiscal_year: int) -> None:
+        """Create a fiscal year's billing periods and refresh the period index"""
+        with self.get_cursor() as cursor:
+            # generate_billing_periods resolves billing_periods via search_path
+            cursor.execute(f"SET LOCAL search_path TO {config.POSTGRES_SCHEMA}")
+            cursor.execute("SELECT generate_billing_periods(%s)", (fiscal_year,))
+        
+        self.period_index.invalidate()
+        logger.info(f"Generated billing periods for fiscal year {fiscal_year}")
     
     def cleanup_old_batches(self, days_old: int = 30):
         """Clean up old ETL batch records"""
@@ -363,5 +926,32 @@ class DatabaseManager:
         return deleted_count
 
 
+    def refresh_period_aggregates(self, period_ids: Iterable[str]) -> None:
+        """Rebuild the aggregate tables and standby shifts for the given billing periods"""
+        with self.get_cursor() as cursor:
+            # refresh_period_aggregates resolves its tables via search_path
+            cursor.execute(f"SET LOCAL search_path TO {config.POSTGRES_SCHEMA}")
+            for period_id in sorted(set(period_ids)):
+                cursor.execute("SELECT refresh_period_aggregates(%s)", (period_id,))
+                logger.info(f"Refreshed aggregates for period {period_id}")
+    
+    def cleanup_orphan_payloads(self) -> int:
+        """Delete raw shift payloads no longer referenced by any shift"""
+        query = f"""
+            DELETE FROM {config.POSTGRES_SCHEMA}.raw_shift_payloads p
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {config.POSTGRES_SCHEMA}.fact_shift_raw r
+                WHERE r.payload_hash = p.payload_hash
+            )
+        """
+        
+        with self.get_cursor() as cursor:
+            cursor.execute(query)
+            deleted_count = cursor.rowcount
+            
+        logger.info(f"Cleaned up {deleted_count} orphaned raw shift payloads")
+        return deleted_count
+
+
 # Create singleton instance
 db = DatabaseManager()
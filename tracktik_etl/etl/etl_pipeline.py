@@ -2,9 +2,11 @@
 """
 Main ETL Pipeline - Updated for Schema Alignment and KAISER Processing
 """
+import os
 import logging
-from datetime import datetime
-from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Optional, Tuple
 import uuid
 import json
 
@@ -12,9 +14,14 @@ from .config import config
 from .tracktik_client import TrackTikClient
 from .database import db
 from .transformers import DataTransformer
+from .utils.rate_limiter import TokenBucketRateLimiter, CheckpointManager
+from .utils.prefetch import prefetch
+from .utils.stage_timer import StageTimer
+from .utils.reference_cache import reference_cache
+from .utils.watermark import after_filter_value, filter_ignored, to_utc
 from .models import (
     DimEmployee, DimClient, DimPosition, DimRegion,
-    FactShift, BillingPeriod, ETLBatch, ETLSyncStatus
+    BillingPeriod, ETLBatch, ETLSyncStatus
 )
 
 logging.basicConfig(
@@ -40,8 +47,17 @@ class ETLPipeline:
     ]
     
     def __init__(self):
-        self.client = TrackTikClient()
+        # One API budget shared by every region worker (and every process, if a state file is set)
+        self.rate_limiter = TokenBucketRateLimiter(
+            calls_per_minute=config.API_CALLS_PER_MINUTE,
+            state_path=config.RATE_LIMIT_STATE_FILE,
+            max_in_flight=config.API_MAX_IN_FLIGHT or None
+        )
+        self.client = TrackTikClient(rate_limiter=self.rate_limiter, cache=reference_cache)
+        self.checkpoint_manager = CheckpointManager()
         self.transformer = DataTransformer()
+        self.stage_timer = StageTimer()  # Per-run stage timings, reset by process_kaiser_billing_period
+        self.async_extractor = None  # Async shift page client, open during a run with ASYNC_EXTRACT
         self.batch_id = None
         self.kaiser_region_mapping = {}
         
@@ -158,29 +174,28 @@ class ETLPipeline:
         try:
             # Load clients
             if clients:
-                logger.info(f"  Loading {len(clients)} clients...")
-                results = DimClient.upsert(clients, self.batch_id)
-                stats['clients'] = results.get('inserted', 0) + results.get('updated', 0)
-                logger.info(f"  Clients: {results}")
+                with self.stage_timer.span('upsert_clients', region_name) as span:
+                    logger.info(f"  Loading {len(clients)} clients...")
+                    results = DimClient.upsert(clients, self.batch_id)
+                    stats['clients'] = results.get('inserted', 0) + results.get('updated', 0)
+                    logger.info(f"  Clients: {results}")
+                    span.add(rows=len(clients))
             
             # Load positions for these clients
-            all_positions = []
             client_ids = [c['id'] for c in clients if isinstance(c, dict) and 'id' in c]
             
             logger.info(f"  Loading positions for {len(client_ids)} clients...")
-            for client_id in client_ids:
-                try:
-                    positions = self.client.get_positions(account_id=client_id)
-                    if positions:
-                        all_positions.extend(positions)
-                except Exception as e:
-                    logger.warning(f"Error getting positions for client {client_id}: {e}")
+            with self.stage_timer.span('api_positions', region_name) as span:
+                all_positions = self.client.get_positions_for_accounts(client_ids)
+                span.add(rows=len(all_positions))
             
             if all_positions:
-                logger.info(f"  Loading {len(all_positions)} positions...")
-                results = DimPosition.upsert(all_positions, self.batch_id)
-                stats['positions'] = results.get('inserted', 0) + results.get('updated', 0)
-                logger.info(f"  Positions: {results}")
+                with self.stage_timer.span('upsert_positions', region_name) as span:
+                    logger.info(f"  Loading {len(all_positions)} positions...")
+                    results = DimPosition.upsert(all_positions, self.batch_id)
+                    stats['positions'] = results.get('inserted', 0) + results.get('updated', 0)
+                    logger.info(f"  Positions: {results}")
+                    span.add(rows=len(all_positions))
             
             return stats
             
@@ -189,26 +204,50 @@ class ETLPipeline:
             raise
     
     def load_shifts_for_region_period(self, region_name: str, period_id: str, 
-                                start_date: str, end_date: str) -> Dict[str, int]:
-        """Load shifts for a specific region and billing period"""
+                                start_date: str, end_date: str,
+                                modified_since: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Load shifts for a specific region and billing period
+        
+        Shifts are streamed page by page: each page is transformed and handed to
+        the fact loader while the next page is fetched in the background, so
+        memory use depends on the page size rather than the period size.
+        
+        If modified_since is given, only shifts TrackTik reports as modified
+        after that time are requested and upserted.
+        
+        After each committed page the next offset and the IDs loaded so far are
+        checkpointed, so a region that fails partway through resumes with the
+        missing tail instead of offset 0. Resumed reads start one page early to
+        absorb rows that shifted position, and already-loaded shifts are skipped.
+        """
         logger.info(f"Loading shifts for {region_name}, period {period_id} ({start_date} to {end_date})")
         
         stats = {
             'shifts_retrieved': 0,
-            'shifts_inserted': 0,
+            'shifts_inserted': 0,   # Loaded shifts: new + updated + unchanged
+            'shifts_new': 0,
+            'shifts_updated': 0,
+            'shifts_unchanged': 0,
             'employees_found': 0,
+            'clients': 0,
+            'positions': 0,
             'data_quality_issues': 0
         }
         
         try:
             # Get clients for this region (still needed for dimensions)
-            clients = self.get_clients_for_kaiser_region(region_name)
+            with self.stage_timer.span('api_clients', region_name) as span:
+                clients = self.get_clients_for_kaiser_region(region_name)
+                span.add(rows=len(clients))
             if not clients:
                 logger.warning(f"No clients found for region {region_name}")
                 return stats
             
             # Load dimensions first
             dim_stats = self.load_dimensions_for_region(region_name, clients)
+            stats['clients'] = dim_stats['clients']
+            stats['positions'] = dim_stats['positions']
             
             # Get the region ID for this region name
             region_id = self.kaiser_region_mapping.get(region_name)
@@ -218,187 +257,334 @@ class ETLPipeline:
             
             logger.info(f"Retrieving shifts for region {region_name} (ID: {region_id})")
             
+            # Lookups carried across pages so each ID is only queried once
+            lookups = {
+                'seen_employee_ids': set(),      # Every employee seen in this region's shifts
+                'existing_employee_ids': set(),  # Employees already in dim_employees before this run
+                'new_employee_count': 0,
+                'position_client_map': {}        # position_id -> client_id (None if unknown)
+            }
+            
             # Get shifts filtered by employee region
             # Note: We can't use include parameter as it causes 400 errors
+            params = {
+                'employee.region': region_id
+            }
+            if modified_since:
+                params[f'{config.TRACKTIK_MODIFIED_FIELD}:after'] = after_filter_value(modified_since)
+            
+            checkpoint = self._load_shift_checkpoint(period_id, region_name, params, start_date, end_date)
+            loaded_shift_ids = set(checkpoint.get('loaded_shift_ids', []))
+            resume_offset = max(0, checkpoint.get('next_offset', 0) - config.API_PAGE_SIZE)
+            if checkpoint.get('next_offset'):
+                logger.info(f"Resuming {region_name} at offset {resume_offset} "
+                           f"({len(loaded_shift_ids)} shifts already loaded)")
+            
             try:
-                params = {
-                    'employee.region': region_id
-                }
-                
-                all_shifts = self.client.get_shifts(start_date, end_date, **params)
-                logger.info(f"Retrieved {len(all_shifts)} shifts for {region_name}")
+                api_usage = {'calls': 0, 'bytes': 0}
+                if self.async_extractor is not None:
+                    # Pages already arrive ahead of the loader from the event loop thread
+                    pages = self.async_extractor.iter_shift_pages(
+                        start_date, end_date, start_offset=resume_offset, usage=api_usage, **params
+                    )
+                else:
+                    pages = prefetch(self.client.iter_shift_pages(
+                        start_date, end_date, start_offset=resume_offset, usage=api_usage, **params
+                    ))
+                # Time spent blocked on the API (fetches overlapping the load aren't counted)
+                pages = self.stage_timer.timed_iter('api_shifts', pages, region_name)
+                for offset, page in pages:
+                    if modified_since and offset == resume_offset:
+                        filter_ignored(page, config.TRACKTIK_MODIFIED_FIELD, modified_since,
+                                       f"Incremental shift read for {region_name}")
+                    
+                    pending = [shift for shift in page if shift.get('id') not in loaded_shift_ids]
+                    
+                    stats['shifts_retrieved'] += len(pending)
+                    written_ids = []
+                    if pending:
+                        written_ids = self._load_shift_page(pending, period_id, region_id, region_name, lookups, stats)
+                    
+                    # Only shifts that reached fact_shifts count as loaded; filtered
+                    # ones are offered again if a resumed run re-reads their page
+                    loaded_shift_ids.update(written_ids)
+                    with self.stage_timer.span('checkpoint', region_name):
+                        self.checkpoint_manager.save_page_checkpoint(
+                            period_id, region_name, checkpoint,
+                            next_offset=offset + config.API_PAGE_SIZE, shift_ids=written_ids
+                        )
                 
+                self.stage_timer.record('api_shifts', region_name, calls=api_usage['calls'],
+                                        rows=stats['shifts_retrieved'], bytes=api_usage['bytes'])
+                    
             except Exception as e:
+                # Keep the checkpoint so the retry only fetches the missing tail
                 logger.error(f"Error getting shifts for region {region_name}: {e}")
-                return stats
+                raise
             
-            stats['shifts_retrieved'] = len(all_shifts)
+            self.checkpoint_manager.clear_checkpoint(period_id, region_name)
+            logger.info(f"Retrieved {stats['shifts_retrieved']} shifts for {region_name}")
             
-            if all_shifts:
-                # Extract unique employee IDs and position IDs
-                employee_ids = set()
-                position_ids = set()
-                
-                for shift in all_shifts:
-                    if shift.get('employee'):
-                        employee_ids.add(shift['employee'])
-                    if shift.get('position'):
-                        position_ids.add(shift['position'])
-                
-                logger.info(f"Found {len(employee_ids)} unique employees and {len(position_ids)} unique positions")
+            employee_count = len(lookups['seen_employee_ids'])
+            if employee_count:
+                stats['employees_found'] = employee_count
+                logger.info(f"  Processed {employee_count} employees "
+                           f"({len(lookups['existing_employee_ids'])} existing, {lookups['new_employee_count']} new)")
+            
+            logger.info(f"Loaded {stats['shifts_inserted']} shifts for {region_name} "
+                       f"({stats['shifts_new']} new, {stats['shifts_updated']} updated, "
+                       f"{stats['shifts_unchanged']} unchanged)")
+            return stats
+            
+        except Exception as e:
+            logger.error(f"Error loading shifts for {region_name}: {str(e)}")
+            raise
+    
+    def _load_shift_checkpoint(self, period_id: str, region_name: str, params: Dict[str, Any],
+                               start_date: str, end_date: str) -> Dict[str, Any]:
+        """
+        Load the page checkpoint for a region, or start a fresh one
+        
+        A checkpoint written for a different query (date range, region filter or
+        incremental cut-off) describes different pages, so it is discarded.
+        """
+        query = {'start_date': start_date, 'end_date': end_date, **{k: str(v) for k, v in params.items()}}
+        checkpoint = self.checkpoint_manager.load_checkpoint(period_id, region_name)
+        
+        if checkpoint and checkpoint.get('query') != query:
+            logger.info(f"Ignoring checkpoint for {region_name}: it was written for a different query")
+            checkpoint = None
+        
+        return checkpoint or {'query': query, 'next_offset': 0, 'loaded_shift_ids': []}
+    
+    def _load_shift_page(self, shifts: List[Dict], period_id: str, region_id: int, region_name: str,
+                         lookups: Dict[str, Any], stats: Dict[str, int]) -> List[int]:
+        """
+        Transform, validate and insert one page of shifts for a region
+        
+        Returns:
+            IDs of the shifts written to fact_shifts (filtered shifts are left out)
+        
+        Raises:
+            Exception: If the load fails, so the region fails and keeps its checkpoint
+        """
+        # Extract unique employee IDs from this page
+        page_employee_ids = {shift['employee'] for shift in shifts if shift.get('employee')}
+        unseen_employee_ids = page_employee_ids - lookups['seen_employee_ids']
+        
+        with self.stage_timer.span('reference_lookups', region_name) as span:
+            # Check which employees exist and create minimal records for missing ones
+            if unseen_employee_ids:
+                existing_employees_query = f"""
+                    SELECT DISTINCT employee_id 
+                    FROM {config.POSTGRES_SCHEMA}.dim_employees 
+                    WHERE employee_id = ANY(%(employee_ids)s) AND is_current = TRUE
+                """
+                existing_employees = db.query_prepared(existing_employees_query, {'employee_ids': list(unseen_employee_ids)})
+                existing_emp_ids = {row['employee_id'] for row in existing_employees}
+                lookups['existing_employee_ids'] |= existing_emp_ids
+                lookups['seen_employee_ids'] |= unseen_employee_ids
                 
-                # Check which employees exist and create minimal records for missing ones
-                if employee_ids:
-                    existing_employees_query = f"""
-                        SELECT DISTINCT employee_id 
-                        FROM {config.POSTGRES_SCHEMA}.dim_employees 
-                        WHERE employee_id = ANY(%(employee_ids)s) AND is_current = TRUE
-                    """
-                    existing_employees = db.execute_query(existing_employees_query, {'employee_ids': list(employee_ids)})
-                    existing_emp_ids = {row['employee_id'] for row in existing_employees}
+                missing_employees = unseen_employee_ids - existing_emp_ids
+                if missing_employees:
+                    logger.info(f"  Found {len(missing_employees)} new employees not in dim_employees")
+                    logger.info(f"  Creating minimal employee records: {list(missing_employees)[:5]}...")
                     
-                    missing_employees = employee_ids - existing_emp_ids
-                    if missing_employees:
-                        logger.info(f"  Found {len(missing_employees)} new employees not in dim_employees")
-                        logger.info(f"  Creating minimal employee records: {list(missing_employees)[:5]}...")
-                        
-                        # Create minimal employee records for missing employees
-                        minimal_employee_records = []
-                        for emp_id in missing_employees:
-                            minimal_employee_records.append({
-                                'employee_id': emp_id,
-                                'custom_id': None,
-                                'first_name': None,
-                                'last_name': None,
-                                'email': None,
-                                'phone': None,
-                                'status': 'ACTIVE',  # Default assumption
-                                'region_id': region_id,  # We know they're in this region
-                                'valid_from': datetime.now(),
-                                'is_current': True,
-                                'etl_batch_id': self.batch_id
-                            })
-                        
-                        # Insert minimal records using direct insert (not SCD Type 2)
-                        if minimal_employee_records:
-                            self._insert_minimal_employees(minimal_employee_records)
-                            logger.info(f"  Created {len(minimal_employee_records)} minimal employee records")
+                    # Create minimal employee records for missing employees
+                    minimal_employee_records = []
+                    for emp_id in missing_employees:
+                        minimal_employee_records.append({
+                            'employee_id': emp_id,
+                            'custom_id': None,
+                            'first_name': None,
+                            'last_name': None,
+                            'email': None,
+                            'phone': None,
+                            'status': 'ACTIVE',  # Default assumption
+                            'region_id': region_id,  # We know they're in this region
+                            'valid_from': datetime.now(),
+                            'is_current': True,
+                            'etl_batch_id': self.batch_id
+                        })
                     
-                    stats['employees_found'] = len(employee_ids)
-                    logger.info(f"  Processed {len(employee_ids)} employees ({len(existing_emp_ids)} existing, {len(missing_employees)} new)")
+                    # Insert minimal records using direct insert (not SCD Type 2)
+                    self._insert_minimal_employees(minimal_employee_records)
+                    lookups['new_employee_count'] += len(minimal_employee_records)
+                    logger.info(f"  Created {len(minimal_employee_records)} minimal employee records")
+            
+            # Look up client_ids for positions we haven't seen yet
+            position_client_map = lookups['position_client_map']
+            page_position_ids = set()
+            for shift in shifts:
+                position = shift.get('position') if isinstance(shift, dict) else None
+                position_id = position.get('id') if isinstance(position, dict) else position
+                if isinstance(position_id, int):
+                    page_position_ids.add(position_id)
+            unseen_position_ids = page_position_ids - position_client_map.keys()
+            
+            if unseen_position_ids:
+                query = f"""
+                    SELECT position_id, client_id 
+                    FROM {config.POSTGRES_SCHEMA}.dim_positions 
+                    WHERE position_id = ANY(%(position_ids)s) 
+                    AND is_current = TRUE
+                """
                 
-                # Prepare employee records for upsert
-                employee_records = []
-                for emp_id in employee_ids:
-                    employee_records.append({
-                        'id': emp_id,
-                        'region': region_id  # We know they're in this region
-                    })
+                results = db.query_prepared(query, {'position_ids': list(unseen_position_ids)})
+                for row in results:
+                    position_client_map[row['position_id']] = row['client_id']
+                # Remember misses too so they aren't queried again on later pages
+                for position_id in unseen_position_ids:
+                    position_client_map.setdefault(position_id, None)
                 
-                # Transform and insert shifts
-                transformed_shifts = []
-                for shift in all_shifts:
-                    try:
-                        # Since account is None, we'll need to get client_id from position
-                        # For now, we'll handle this in the transformer
-                        transformed = self.transformer.transform_shift(shift, period_id)
-                        transformed['etl_batch_id'] = self.batch_id
-                        transformed_shifts.append(transformed)
-                    except Exception as e:
-                        logger.error(f"Error transforming shift {shift.get('id')}: {e}")
-                        stats['data_quality_issues'] += 1
+                logger.info(f"Loaded client mapping for {len(results)} positions")
+            
+            span.add(rows=len(unseen_employee_ids) + len(unseen_position_ids))
+        
+        if config.COLUMNAR_SHIFT_TRANSFORM:
+            return self._load_shift_frame(shifts, period_id, region_name, lookups, stats)
+        
+        with self.stage_timer.span('transform', region_name) as span:
+            transformed_shifts = []
+            for shift in shifts:
+                try:
+                    transformed = self.transformer.transform_shift(shift, period_id)
+                    transformed['etl_batch_id'] = self.batch_id
+                    # Shifts carry no account, so client_id comes from the position
+                    transformed['client_id'] = position_client_map.get(transformed.get('position_id'))
+                    transformed_shifts.append(transformed)
+                except Exception as e:
+                    logger.error(f"Error transforming shift {shift.get('id')}: {e}")
+                    stats['data_quality_issues'] += 1
+            span.add(rows=len(shifts), bytes=sum(len(shift.get('raw_data') or '') for shift in transformed_shifts))
+        
+        if not transformed_shifts:
+            return []
+        
+        with self.stage_timer.span('validate', region_name) as span:
+            # Rule checks on the whole page, before rows are dropped, so data_quality_issues records why
+            issues = db.validate_data_quality('fact_shifts', transformed_shifts, self.batch_id)
+            flagged_rows = {issue['record_index'] for issue in issues}
+            span.add(rows=len(transformed_shifts))
+            
+            # Filter out shifts that can't be stored (no id or unparseable timestamps),
+            # shifts without a valid client_id, and shifts for employees that weren't
+            # in dim_employees before this run
+            existing_emp_ids = lookups['existing_employee_ids']
+            valid_shifts = []
+            unparseable = 0
+            flagged_loaded = 0
+            for index, shift in enumerate(transformed_shifts):
+                employee_id = shift.get('employee_id')
+                client_id = shift.get('client_id')
                 
-                # After transforming shifts, look up client_ids from positions
-                if transformed_shifts:
-                    # Get unique position IDs
-                    position_ids = set()
-                    for shift in transformed_shifts:
-                        if shift.get('position_id'):
-                            position_ids.add(shift['position_id'])
-                    
-                    # Query dim_positions to get position->client mapping
-                    if position_ids:
-                        position_client_map = {}
-                        
-                        query = f"""
-                            SELECT position_id, client_id 
-                            FROM {config.POSTGRES_SCHEMA}.dim_positions 
-                            WHERE position_id = ANY(%(position_ids)s) 
-                            AND is_current = TRUE
-                        """
-                        
-                        results = db.execute_query(query, {'position_ids': list(position_ids)})
-                        for row in results:
-                            position_client_map[row['position_id']] = row['client_id']
-                        
-                        logger.info(f"Loaded client mapping for {len(position_client_map)} positions")
-                        
-                        # Update transformed shifts with client_ids
-                        for shift in transformed_shifts:
-                            position_id = shift.get('position_id')
-                            if position_id and position_id in position_client_map:
-                                shift['client_id'] = position_client_map[position_id]
-                            else:
-                                # If we can't find the client, we'll need to handle this
-                                logger.warning(f"No client found for position {position_id} in shift {shift.get('shift_id')}")
-                                # Set a default or skip this shift
-                                shift['client_id'] = None
-                        
-                        # ===== CRITICAL FILTERING CODE - THIS WAS MISSING! =====
-                        # Filter out shifts without valid client_id
-                        # Filter out shifts for employees that don't exist in dim_employees
-                        valid_shifts = []
-                        for shift in transformed_shifts:
-                            employee_id = shift.get('employee_id')
-                            client_id = shift.get('client_id')
-                            
-                            if employee_id in existing_emp_ids and client_id is not None:
-                                valid_shifts.append(shift)
-                            else:
-                                if employee_id not in existing_emp_ids:
-                                    logger.debug(f"Filtering shift - employee {employee_id} not in dim_employees")
-                                if client_id is None:
-                                    logger.debug(f"Filtering shift - no client_id for shift {shift.get('shift_id')}")
-                        
-                        if len(valid_shifts) < len(transformed_shifts):
-                            filtered_count = len(transformed_shifts) - len(valid_shifts)
-                            logger.warning(f"Filtered out {filtered_count} shifts due to missing employee or client references")
-                            stats['data_quality_issues'] += filtered_count
-                        
-                        transformed_shifts = valid_shifts
-                        # ===== END OF CRITICAL FILTERING CODE =====
-
-                # Insert shifts
-                if transformed_shifts:
-                    # First, let's check if the table exists and method is available
-                    try:
-                        # Check if we have the partitioned insert method
-                        if hasattr(db, 'insert_fact_batch_partitioned'):
-                            inserted_count = db.insert_fact_batch_partitioned(
-                                'fact_shifts', 
-                                transformed_shifts, 
-                                'billing_period_id'
-                            )
-                        else:
-                            # Fallback to regular batch insert
-                            logger.warning("Partitioned insert not available, using regular batch insert")
-                            inserted_count = len(transformed_shifts)
-                            # You'll need to implement a regular batch insert in your database.py
-                            # For now, we'll use the FactShift model
-                            inserted_count = FactShift.insert_batch(transformed_shifts, period_id, self.batch_id)
-                        
-                        stats['shifts_inserted'] = inserted_count
-                        logger.info(f"Inserted {inserted_count} shifts for {region_name}")
-                        
-                    except Exception as e:
-                        logger.error(f"Error inserting shifts: {e}")
-                        stats['data_quality_issues'] += len(transformed_shifts)
+                if shift.get('shift_id') is None or not shift.get('start_datetime') or not shift.get('end_datetime'):
+                    unparseable += 1
+                elif employee_id in existing_emp_ids and client_id is not None:
+                    valid_shifts.append(shift)
+                    flagged_loaded += index in flagged_rows
+                else:
+                    if employee_id not in existing_emp_ids:
+                        logger.debug(f"Filtering shift - employee {employee_id} not in dim_employees")
+                    if client_id is None:
+                        logger.warning(f"No client found for position {shift.get('position_id')} "
+                                      f"in shift {shift.get('shift_id')}")
             
-            return stats
+            if unparseable:
+                logger.error(f"Could not transform {unparseable} shifts (missing id or unparseable timestamps)")
             
-        except Exception as e:
-            logger.error(f"Error loading shifts for {region_name}: {str(e)}")
-            raise
+            filtered_count = len(transformed_shifts) - len(valid_shifts)
+            if filtered_count > unparseable:
+                logger.warning(f"Filtered out {filtered_count - unparseable} shifts due to missing employee or client references")
+            
+            # Dropped rows, plus loaded rows that failed a rule
+            stats['data_quality_issues'] += filtered_count + flagged_loaded
+        
+        # Insert shifts - a failed load fails the region, so its period
+        # watermark is held back and the next run reads these shifts again
+        if valid_shifts:
+            try:
+                with self.stage_timer.span('load_facts', region_name) as span:
+                    load_stats = db.copy_fact_shifts(valid_shifts)
+                    span.add(rows=len(valid_shifts), bytes=sum(len(shift['raw_data']) for shift in valid_shifts))
+            except Exception as e:
+                logger.error(f"Error inserting {len(valid_shifts)} shifts: {e}")
+                raise
+            
+            stats['shifts_new'] += load_stats['inserted']
+            stats['shifts_updated'] += load_stats['updated']
+            stats['shifts_unchanged'] += load_stats['unchanged']
+            stats['shifts_inserted'] += sum(load_stats.values())
+        
+        return [shift['shift_id'] for shift in valid_shifts]
+    
+    def _load_shift_frame(self, shifts: List[Dict], period_id: str, region_name: str,
+                          lookups: Dict[str, Any], stats: Dict[str, int]) -> List[int]:
+        """
+        Columnar counterpart of the transform/validate/load steps of _load_shift_page
+        
+        Used with COLUMNAR_SHIFT_TRANSFORM: the page goes through
+        transform_shifts_batch and reaches copy_fact_shifts as a DataFrame.
+        """
+        with self.stage_timer.span('transform', region_name) as span:
+            # Transform the whole page column-wise, joining client_id from the position map
+            frame = self.transformer.transform_shifts_batch(shifts, period_id, lookups['position_client_map'])
+            frame['etl_batch_id'] = self.batch_id
+            span.add(rows=len(shifts), bytes=int(frame['raw_data'].str.len().sum()) if len(frame) else 0)
+        
+        if frame.empty:
+            return []
+        
+        with self.stage_timer.span('validate', region_name) as span:
+            issues = db.validate_data_quality('fact_shifts', frame, self.batch_id)
+            flagged_rows = {issue['record_index'] for issue in issues}
+            span.add(rows=len(frame))
+            
+            unparseable = (
+                frame['shift_id'].isna() | frame['start_datetime'].isna() | frame['end_datetime'].isna()
+            )
+            if unparseable.any():
+                logger.error(f"Could not transform {int(unparseable.sum())} shifts "
+                            f"(missing id or unparseable timestamps)")
+                stats['data_quality_issues'] += int(unparseable.sum())
+                frame = frame[~unparseable]
+            
+            # Filter out shifts without a valid client_id, and shifts for
+            # employees that weren't in dim_employees before this run
+            missing_employee = ~frame['employee_id'].isin(list(lookups['existing_employee_ids']))
+            missing_client = frame['client_id'].isna()
+            
+            if missing_client.any():
+                logger.warning(f"No client found for {int(missing_client.sum())} shifts "
+                              f"(positions {sorted(frame.loc[missing_client, 'position_id'].dropna().unique().tolist())[:5]}...)")
+            
+            invalid = missing_employee | missing_client
+            if invalid.any():
+                filtered_count = int(invalid.sum())
+                logger.warning(f"Filtered out {filtered_count} shifts due to missing employee or client references")
+                stats['data_quality_issues'] += filtered_count
+            
+            valid_shifts = frame[~invalid]
+            
+            # Loaded rows that failed a rule (dropped rows are counted above)
+            stats['data_quality_issues'] += int(valid_shifts.index.isin(list(flagged_rows)).sum())
+        
+        # A failed load fails the region, as in _load_shift_page
+        if not valid_shifts.empty:
+            try:
+                with self.stage_timer.span('load_facts', region_name) as span:
+                    load_stats = db.copy_fact_shifts(valid_shifts)
+                    span.add(rows=len(valid_shifts), bytes=int(valid_shifts['raw_data'].str.len().sum()))
+            except Exception as e:
+                logger.error(f"Error inserting {len(valid_shifts)} shifts: {e}")
+                raise
+            
+            stats['shifts_new'] += load_stats['inserted']
+            stats['shifts_updated'] += load_stats['updated']
+            stats['shifts_unchanged'] += load_stats['unchanged']
+            stats['shifts_inserted'] += sum(load_stats.values())
+        
+        return valid_shifts['shift_id'].tolist()
     
 
     def _insert_minimal_employees(self, employee_records: List[Dict]):
@@ -434,12 +620,93 @@ class ETLPipeline:
             raise
 
     
-    def process_kaiser_billing_period(self, period_id: str) -> Dict[str, Any]:
+    def _process_region(self, region_name: str, period_id: str, start_date: str, end_date: str,
+                        modified_since: Optional[datetime] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Process one KAISER sub-region in isolation
+        
+        Returns:
+            Tuple of (region_stats, error_message) - exactly one of them is set
+        """
+        logger.info(f"\n{'='*50}")
+        logger.info(f"Processing region: {region_name}")
+        logger.info(f"{'='*50}")
+        
+        try:
+            region_stats = self.load_shifts_for_region_period(
+                region_name, period_id, start_date, end_date, modified_since
+            )
+            
+            # Add region name to stats
+            region_stats['region_name'] = region_name
+            
+            logger.info(f"✅ {region_name} complete: {region_stats['shifts_inserted']} shifts")
+            return region_stats, None
+            
+        except Exception as e:
+            error_msg = f"Failed to process region {region_name}: {str(e)}"
+            logger.error(error_msg)
+            return None, error_msg
+    
+    @staticmethod
+    def _period_sync_key(period_id: str) -> str:
+        """etl_sync_status key holding the shift watermark for one billing period"""
+        return f'fact_shifts_{period_id}'
+    
+    def _get_incremental_start(self, period_id: str) -> Optional[datetime]:
+        """
+        Work out where an incremental run should start reading changes
+        
+        Returns:
+            Last successful watermark minus the safety overlap (UTC), or None if
+            the period has never been fully synced (so a full load is needed)
+        """
+        watermark = ETLSyncStatus.get_last_sync_timestamp(self._period_sync_key(period_id))
+        if watermark is None:
+            return None
+        
+        return to_utc(watermark) - timedelta(minutes=config.INCREMENTAL_OVERLAP_MINUTES)
+    
+    def process_kaiser_billing_period(self, period_id: str, max_workers: int = 1,
+                                      incremental: bool = False) -> Dict[str, Any]:
         """
         Process all KAISER sub-regions for a billing period
         This is the main method you'll call
+        
+        Args:
+            period_id: Billing period ID (e.g., '2025_12')
+            max_workers: Number of regions to process at once. 1 (default) keeps the
+                serial behaviour; higher values run regions on a bounded thread pool
+                that shares this pipeline's API rate limiter and connection pool.
+            incremental: Only pull shifts modified since the period's last successful
+                run (minus INCREMENTAL_OVERLAP_MINUTES). Falls back to a full load if
+                the period has no watermark yet. Use full mode for period close.
+        
+        Raises:
+            RuntimeError: If another run (a backfill worker, another process)
+                holds the period's advisory lock
         """
+        # One loader per period at a time, whoever started it
+        with db.advisory_lock(BillingPeriod.lock_name(period_id)) as acquired:
+            if not acquired:
+                raise RuntimeError(f"Billing period {period_id} is already being loaded by another run")
+            return self._process_billing_period(period_id, max_workers, incremental)
+    
+    def _process_billing_period(self, period_id: str, max_workers: int, incremental: bool) -> Dict[str, Any]:
+        """process_kaiser_billing_period, under the period's advisory lock"""
         logger.info(f"Starting KAISER billing period processing: {period_id}")
+        self.stage_timer = StageTimer()
+        
+        # Captured before extraction so changes made during the run are re-read next time
+        run_started_at = datetime.now(timezone.utc)
+        
+        modified_since = None
+        if incremental:
+            modified_since = self._get_incremental_start(period_id)
+            if modified_since:
+                logger.info(f"Incremental mode: loading shifts modified since {modified_since:%Y-%m-%d %H:%M} UTC")
+            else:
+                logger.warning(f"No watermark for period {period_id} yet - running a full load")
         
         # Get period dates
         try:
@@ -450,6 +717,8 @@ class ETLPipeline:
             logger.error(f"Invalid billing period: {e}")
             raise
         
+        max_workers = max(1, min(max_workers, config.MAX_REGION_WORKERS, len(self.KAISER_SUBREGIONS)))
+        
         # Create ETL batch
         self.batch_id = ETLBatch.create_batch(
             f'KAISER_BILLING_{period_id}',
@@ -457,7 +726,10 @@ class ETLPipeline:
                 'period_id': period_id,
                 'start_date': start_date,
                 'end_date': end_date,
-                'regions': self.KAISER_SUBREGIONS
+                'regions': self.KAISER_SUBREGIONS,
+                'max_workers': max_workers,
+                'mode': 'incremental' if modified_since else 'full',
+                'modified_since': modified_since.isoformat() if modified_since else None
             }
         )
         
@@ -465,8 +737,10 @@ class ETLPipeline:
             'period_id': period_id,
             'start_date': start_date,
             'end_date': end_date,
+            'mode': 'incremental' if modified_since else 'full',
             'regions_processed': [],
             'total_shifts': 0,
+            'total_unchanged_shifts': 0,
             'total_employees': 0,
             'total_clients': 0,
             'total_positions': 0,
@@ -474,36 +748,59 @@ class ETLPipeline:
         }
         
         try:
-            # Ensure region mapping is loaded
+            # Ensure region mapping is loaded before any worker starts
             self.load_kaiser_region_mapping()
             
+            if config.ASYNC_EXTRACT:
+                # Imported here so aiohttp is only needed when the async client is switched on
+                from .async_tracktik_client import AsyncExtractor
+                self.async_extractor = AsyncExtractor(rate_limiter=self.rate_limiter)
+            
             # Process each KAISER sub-region
-            for region_name in self.KAISER_SUBREGIONS:
-                logger.info(f"\n{'='*50}")
-                logger.info(f"Processing region: {region_name}")
-                logger.info(f"{'='*50}")
-                
-                try:
-                    region_stats = self.load_shifts_for_region_period(
-                        region_name, period_id, start_date, end_date
-                    )
-                    
-                    # Add region name to stats
-                    region_stats['region_name'] = region_name
-                    overall_stats['regions_processed'].append(region_stats)
-                    
-                    # Aggregate totals
-                    overall_stats['total_shifts'] += region_stats['shifts_inserted']
-                    overall_stats['total_employees'] += region_stats['employees_found']
-                    overall_stats['total_clients'] += region_stats.get('clients', 0)
-                    overall_stats['total_positions'] += region_stats.get('positions', 0)
-                    
-                    logger.info(f"✅ {region_name} complete: {region_stats['shifts_inserted']} shifts")
-                    
-                except Exception as e:
-                    error_msg = f"Failed to process region {region_name}: {str(e)}"
-                    logger.error(error_msg)
+            if max_workers == 1:
+                results = [
+                    self._process_region(region_name, period_id, start_date, end_date, modified_since)
+                    for region_name in self.KAISER_SUBREGIONS
+                ]
+            else:
+                logger.info(f"Processing {len(self.KAISER_SUBREGIONS)} regions with {max_workers} workers")
+                with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='kaiser-region') as executor:
+                    futures = [
+                        executor.submit(self._process_region, region_name, period_id,
+                                        start_date, end_date, modified_since)
+                        for region_name in self.KAISER_SUBREGIONS
+                    ]
+                    # Collect in region order so the summary matches the serial path
+                    results = [future.result() for future in futures]
+            
+            for region_stats, error_msg in results:
+                if error_msg:
                     overall_stats['errors'].append(error_msg)
+                    continue
+                
+                overall_stats['regions_processed'].append(region_stats)
+                
+                # Aggregate totals
+                overall_stats['total_shifts'] += region_stats['shifts_inserted']
+                overall_stats['total_unchanged_shifts'] += region_stats['shifts_unchanged']
+                overall_stats['total_employees'] += region_stats['employees_found']
+                overall_stats['total_clients'] += region_stats.get('clients', 0)
+                overall_stats['total_positions'] += region_stats.get('positions', 0)
+            
+            # Rebuild the period's aggregates, unless the run changed nothing
+            # (failed regions may have committed pages before failing, so refresh then too)
+            changed_shifts = sum(
+                region_stats['shifts_new'] + region_stats['shifts_updated']
+                for region_stats in overall_stats['regions_processed']
+            )
+            if changed_shifts or overall_stats['errors']:
+                with self.stage_timer.span('refresh_aggregates'):
+                    db.refresh_period_aggregates([period_id])
+            else:
+                logger.info(f"No shifts changed in {period_id}, aggregates left as they are")
+            
+            # Keep the stage timings with the batch (and export them) so slow stages show up per region
+            overall_stats['timings'] = self._save_stage_timings(period_id, overall_stats['mode'])
             
             # Complete batch
             if overall_stats['errors']:
@@ -519,11 +816,23 @@ class ETLPipeline:
             # Update sync status
             ETLSyncStatus.update_sync_status(
                 'fact_shifts',
-                datetime.now(),
+                datetime.now(timezone.utc),
                 self.batch_id,
                 overall_stats
             )
             
+            # Only advance the period watermark when every region succeeded (a failed
+            # shift load fails its region), otherwise the next incremental run would
+            # skip the changes that never reached fact_shifts
+            if not overall_stats['errors']:
+                ETLSyncStatus.update_sync_status(
+                    self._period_sync_key(period_id),
+                    run_started_at,
+                    self.batch_id,
+                    {'period_id': period_id, 'mode': overall_stats['mode'],
+                     'total_shifts': overall_stats['total_shifts']}
+                )
+            
             # Print summary
             self._print_processing_summary(overall_stats)
             
@@ -533,34 +842,73 @@ class ETLPipeline:
             logger.error(f"KAISER billing period processing failed: {str(e)}")
             ETLBatch.complete_batch(self.batch_id, 0, 0, str(e))
             raise
+        
+        finally:
+            if self.async_extractor is not None:
+                self.async_extractor.close()
+                self.async_extractor = None
+    
+    def _save_stage_timings(self, period_id: str, mode: str) -> Dict[str, Any]:
+        """
+        Store this run's stage timings in the batch's metadata and, if
+        METRICS_TEXTFILE_DIR is set, write them as a Prometheus textfile
+        
+        Returns:
+            {region: {stage: {calls, rows, bytes, seconds}}}, with a 'total' region
+        """
+        timings = self.stage_timer.summary()
+        
+        try:
+            for region_name, region_timings in timings.items():
+                ETLBatch.set_metadata_entry(self.batch_id, 'timings', region_name, region_timings)
+            
+            if config.METRICS_TEXTFILE_DIR:
+                self.stage_timer.write_prometheus(
+                    os.path.join(config.METRICS_TEXTFILE_DIR, f'tracktik_etl_{period_id}.prom'),
+                    {'job': 'kaiser_billing', 'period_id': period_id, 'mode': mode}
+                )
+        except Exception as e:
+            # Timings are diagnostics - never fail the run over them
+            logger.warning(f"Could not save stage timings: {e}")
+        
+        return timings
     
     def _print_processing_summary(self, stats: Dict[str, Any]):
         """Print a nice summary of the processing results"""
         logger.info(f"\n{'='*60}")
         logger.info("KAISER BILLING PERIOD PROCESSING SUMMARY")
         logger.info(f"{'='*60}")
-        logger.info(f"Period: {stats['period_id']} ({stats['start_date']} to {stats['end_date']})")
+        logger.info(f"Period: {stats['period_id']} ({stats['start_date']} to {stats['end_date']}), {stats['mode']} load")
         logger.info(f"Batch ID: {self.batch_id}")
-        logger.info(f"")
-        logger.info(f"📊 TOTALS:")
-        logger.info(f"  Shifts Loaded: {stats['total_shifts']:,}")
+        logger.info("")
+        logger.info("📊 TOTALS:")
+        logger.info(f"  Shifts Loaded: {stats['total_shifts']:,} ({stats['total_unchanged_shifts']:,} unchanged)")
         logger.info(f"  Employees: {stats['total_employees']:,}")
         logger.info(f"  Clients: {stats['total_clients']:,}")
         logger.info(f"  Positions: {stats['total_positions']:,}")
-        logger.info(f"")
-        logger.info(f"🏢 BY REGION:")
+        logger.info("")
+        logger.info("🏢 BY REGION:")
         
         for region_stats in stats['regions_processed']:
             logger.info(f"  {region_stats['region_name']:<15}: "
                        f"{region_stats['shifts_inserted']:>6,} shifts, "
                        f"{region_stats['employees_found']:>4} employees")
         
+        stage_totals = stats.get('timings', {}).get('total', {})
+        if stage_totals:
+            logger.info("")
+            logger.info("⏱️  STAGES (all regions):")
+            for stage, stage_stats in sorted(stage_totals.items(), key=lambda item: -item[1]['seconds']):
+                logger.info(f"  {stage:<18}: {stage_stats['seconds']:>8.1f}s, "
+                           f"{stage_stats['calls']:>6,} calls, {stage_stats['rows']:>8,} rows, "
+                           f"{stage_stats['bytes'] / 1_000_000:>8.1f} MB")
+        
         if stats['errors']:
             logger.info(f"\n❌ ERRORS ({len(stats['errors'])}):")
             for error in stats['errors']:
                 logger.info(f"  - {error}")
         else:
-            logger.info(f"\n✅ No errors - processing completed successfully!")
+            logger.info("\n✅ No errors - processing completed successfully!")
         
         logger.info(f"{'='*60}")
 
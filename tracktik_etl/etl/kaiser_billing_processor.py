@@ -2,17 +2,20 @@
 """
 KAISER billing period processor with sub-region support
 """
+import os
 from datetime import datetime
 from .config import config
 from typing import List, Dict, Any, Optional, Tuple
 import logging
 
 from etl.tracktik_client import TrackTikClient
-from etl.utils.rate_limiter import RateLimiter, CheckpointManager
+from etl.utils.rate_limiter import TokenBucketRateLimiter, CheckpointManager
+from etl.utils.reference_cache import reference_cache
+from etl.utils.stage_timer import StageTimer
 from etl.database import db
 from .models import (
     DimEmployee, DimClient, DimPosition, DimRegion,
-    FactShift, BillingPeriod, ETLRunLog
+    FactShift, BillingPeriod, ETLBatch, ETLRunLog
 )
 
 logger = logging.getLogger(__name__)
@@ -34,24 +37,28 @@ class KaiserBillingProcessor:
     ]
     
     def __init__(self):
-        self.client = TrackTikClient()
-        self.rate_limiter = RateLimiter(calls_per_minute=30)  # Conservative rate
+        self.rate_limiter = TokenBucketRateLimiter(
+            calls_per_minute=30,  # Conservative rate until headers say otherwise
+            state_path=config.RATE_LIMIT_STATE_FILE,
+            max_in_flight=config.API_MAX_IN_FLIGHT or None
+        )
+        # The client paces (and backs off) every request itself
+        self.client = TrackTikClient(rate_limiter=self.rate_limiter, cache=reference_cache)
         self.checkpoint_manager = CheckpointManager()
+        self.stage_timer = StageTimer()  # Per-run stage timings, reset by process_billing_period
         self.db = db
         self.region_map = {}
         self.kaiser_region_ids = set()
+        self.batch_id = None  # etl_batches row of the current process_billing_period run
         self._regions_loaded = False
 
     def _load_region_mapping(self) -> Dict[int, Dict]:
         """Load and cache region mapping for KAISER"""
         logger.info("Loading region mapping from TrackTik...")
         
-        self.rate_limiter.wait_if_needed()
-        
         try:
             # Get all regions
             regions = self.client.get_regions()  # You'll need to add this method to tracktik_client.py
-            self.rate_limiter.record_success()
             
             # Build mapping and identify KAISER regions
             region_map = {}
@@ -85,7 +92,6 @@ class KaiserBillingProcessor:
             
         except Exception as e:
             logger.error(f"Failed to load region mapping: {e}")
-            self.rate_limiter.record_error()
             raise
 
     def process_billing_period(self, start_date: str, end_date: str) -> Dict[str, Any]:
@@ -104,6 +110,12 @@ class KaiserBillingProcessor:
         }
         
         logger.info(f"Starting KAISER billing period processing: {billing_period_id}")
+        self.stage_timer = StageTimer()
+        self.batch_id = ETLBatch.create_batch(
+            'KAISER_BILLING_PROCESSOR',
+            {'billing_period': billing_period_id, 'start_date': start_date, 'end_date': end_date,
+             'regions': self.KAISER_SUBREGIONS}
+        )
         
         # Process each sub-region
         for region in self.KAISER_SUBREGIONS:
@@ -122,6 +134,22 @@ class KaiserBillingProcessor:
                 logger.error(error_msg)
                 overall_stats['errors'].append(error_msg)
         
+        # Stage timings per region, kept with the batch (and exported for Prometheus, if configured)
+        overall_stats['timings'] = self.stage_timer.summary()
+        ETLBatch.complete_batch(
+            self.batch_id, overall_stats['total_shifts'], len(overall_stats['errors']),
+            '; '.join(overall_stats['errors']) or None,
+            metadata={'timings': overall_stats['timings']}
+        )
+        if config.METRICS_TEXTFILE_DIR:
+            try:
+                self.stage_timer.write_prometheus(
+                    os.path.join(config.METRICS_TEXTFILE_DIR, 'tracktik_etl_kaiser_billing_processor.prom'),
+                    {'job': 'kaiser_billing_processor', 'billing_period': billing_period_id}
+                )
+            except OSError as e:
+                logger.warning(f"Could not write stage metrics: {e}")
+        
         # Log ETL run
         self._log_etl_run(overall_stats)
         
@@ -132,12 +160,9 @@ class KaiserBillingProcessor:
         """Sync region data from TrackTik to the mapping table"""
         logger.info("Syncing region mapping to database...")
         
-        self.rate_limiter.wait_if_needed()
-        
         try:
             # Get all regions from API
             regions = self.client.get_regions()
-            self.rate_limiter.record_success()
             
             # Prepare data for insertion
             region_records = []
@@ -233,24 +258,16 @@ class KaiserBillingProcessor:
         logger.info(f"Found region '{region_name}' with ID: {region_id}")
         
         # Now get clients for this region
-        self.rate_limiter.wait_if_needed()
+        all_clients = self.client.get_clients()
         
-        try:
-            all_clients = self.client.get_clients()
-            self.rate_limiter.record_success()
-            
-            # Filter clients by region ID
-            region_clients = [
-                client for client in all_clients 
-                if client.get('region') == region_id
-            ]
-            
-            logger.info(f"Found {len(region_clients)} clients in region {region_name}")
-            return region_clients
-            
-        except Exception as e:
-            self.rate_limiter.record_error()
-            raise
+        # Filter clients by region ID
+        region_clients = [
+            client for client in all_clients 
+            if client.get('region') == region_id
+        ]
+        
+        logger.info(f"Found {len(region_clients)} clients in region {region_name}")
+        return region_clients
 
     def _load_kaiser_regions_from_db(self):
         """Load KAISER regions from database (no API sync)"""
@@ -284,7 +301,9 @@ class KaiserBillingProcessor:
         }
         
         # Get region's clients
-        region_clients = self._get_region_clients_from_db(region)
+        with self.stage_timer.span('db_clients', region) as span:
+            region_clients = self._get_region_clients_from_db(region)
+            span.add(rows=len(region_clients))
         stats['clients_found'] = len(region_clients)
         
         if not region_clients:
@@ -296,15 +315,20 @@ class KaiserBillingProcessor:
         
         # Load dimensions first
         if not checkpoint or checkpoint.get('dimensions_complete') != True:
-            self._load_region_dimensions(region, region_clients)
+            with self.stage_timer.span('dimensions', region) as span:
+                self._load_region_dimensions(region, region_clients)
+                span.add(rows=len(region_clients))
             # Update checkpoint
-            self.checkpoint_manager.save_checkpoint(
-                billing_period_id, region,
-                {'dimensions_complete': True, 'client_ids': client_ids}
-            )
+            with self.stage_timer.span('checkpoint', region):
+                self.checkpoint_manager.save_checkpoint(
+                    billing_period_id, region,
+                    {'dimensions_complete': True, 'client_ids': client_ids}
+                )
         
         # Get all shifts for the region
-        all_shifts = self._get_region_shifts(client_ids, start_date, end_date)
+        with self.stage_timer.span('api_shifts', region) as span:
+            all_shifts = self._get_region_shifts(client_ids, start_date, end_date)
+            span.add(rows=len(all_shifts))
         
         # Insert shifts in batches
         if all_shifts:
@@ -318,17 +342,23 @@ class KaiserBillingProcessor:
             
             # Load employee dimensions
             if unique_employees:
-                employee_stats = DimEmployee.upsert(list(unique_employees.values()))
+                with self.stage_timer.span('upsert_employees', region) as span:
+                    employee_stats = DimEmployee.upsert(list(unique_employees.values()))
+                    span.add(rows=len(unique_employees))
                 stats['employees_found'] = employee_stats['inserted'] + employee_stats['updated']
                 logger.info(f"  Employees: {employee_stats}")
             
             # Insert shifts
-            inserted = FactShift.insert_batch(all_shifts)
-            stats['shifts_processed'] = inserted
+            with self.stage_timer.span('load_facts', region) as span:
+                shift_stats = FactShift.insert_batch(all_shifts)
+                span.add(rows=len(all_shifts))
+            stats['shifts_processed'] = sum(shift_stats.values())
+            stats['shifts_unchanged'] = shift_stats['unchanged']
             stats['total_hours'] = sum(shift.get('actualHours', 0) for shift in all_shifts)
         
         # Clear checkpoint on completion
         self.checkpoint_manager.clear_checkpoint(billing_period_id, region)
+        stats['timings'] = self.stage_timer.region_summary(region)
         
         logger.info(f"Region {region} complete: {stats['shifts_processed']} shifts, "
                 f"{stats['total_hours']:.2f} hours")
@@ -355,26 +385,18 @@ class KaiserBillingProcessor:
         
         logger.info(f"Found region '{region_name}' with ID: {region_id}")
         
-        self.rate_limiter.wait_if_needed()
+        # Get all clients and filter by region ID
+        all_clients = self.client.get_clients()
         
-        try:
-            # Get all clients and filter by region ID
-            all_clients = self.client.get_clients()
-            self.rate_limiter.record_success()
-            
-            region_clients = []
-            for client in all_clients:
-                # Check if client's region matches our target region ID
-                client_region = client.get('region')
-                if client_region == region_id:  # Direct ID comparison
-                    region_clients.append(client)
-            
-            logger.info(f"Found {len(region_clients)} clients in region {region_name}")
-            return region_clients
-            
-        except Exception as e:
-            self.rate_limiter.record_error()
-            raise
+        region_clients = []
+        for client in all_clients:
+            # Check if client's region matches our target region ID
+            client_region = client.get('region')
+            if client_region == region_id:  # Direct ID comparison
+                region_clients.append(client)
+        
+        logger.info(f"Found {len(region_clients)} clients in region {region_name}")
+        return region_clients
     
     def _get_region_shifts(self, client_ids: List[int], start_date: str, 
                           end_date: str, start_from: int = 0) -> List[Dict]:
@@ -385,8 +407,6 @@ class KaiserBillingProcessor:
         for i in range(0, len(client_ids), 20):
             batch_ids = client_ids[i:i+20]
             
-            self.rate_limiter.wait_if_needed()
-            
             try:
                 params = {
                     'account.id:in': ','.join(map(str, batch_ids)),
@@ -395,12 +415,10 @@ class KaiserBillingProcessor:
                 
                 shifts = self.client.get_shifts(start_date, end_date, **params)
                 all_shifts.extend(shifts)
-                self.rate_limiter.record_success()
                 
                 logger.debug(f"Retrieved {len(shifts)} shifts for batch {i//20 + 1}")
                 
             except Exception as e:
-                self.rate_limiter.record_error()
                 logger.error(f"Error getting shifts for batch: {e}")
                 # Continue with next batch instead of failing entirely
                 
@@ -424,17 +442,8 @@ class KaiserBillingProcessor:
         client_stats = DimClient.upsert(clients)
         logger.info(f"  Clients: {client_stats}")
         
-        # Get and load positions for these clients
-        all_positions = []
-        for client in clients:
-            self.rate_limiter.wait_if_needed()
-            try:
-                positions = self.client.get_positions(account_id=client['id'])
-                all_positions.extend(positions)
-                self.rate_limiter.record_success()
-            except Exception as e:
-                logger.error(f"Error getting positions for client {client['id']}: {e}")
-                self.rate_limiter.record_error()
+        # Get and load positions for these clients (the client paces itself on the shared limiter)
+        all_positions = self.client.get_positions_for_accounts([client['id'] for client in clients])
         
         if all_positions:
             position_stats = DimPosition.upsert(all_positions)
@@ -107,22 +107,7 @@ class DimEmployee:
             WHERE employee_id = ANY(%(employee_ids)s) AND is_current = TRUE
         """
         
-        results = db.execute_query(query, {'employee_ids': employee_ids})
-        return {row['employee_id']: dict(row) for row in results}
-    
-    @staticmethod
-    def get_existing_employees(employee_ids: List[int]) -> Dict[int, Dict]:
-        """Get existing employee records for reference (no updates)"""
-        if not employee_ids:
-            return {}
-            
-        query = f"""
-            SELECT employee_id, custom_id, first_name, last_name, region_id
-            FROM {config.POSTGRES_SCHEMA}.dim_employees
-            WHERE employee_id = ANY(%(employee_ids)s) AND is_current = TRUE
-        """
-        
-        results = db.execute_query(query, {'employee_ids': employee_ids})
+        results = db.query_prepared(query, {'employee_ids': employee_ids})
         return {row['employee_id']: dict(row) for row in results}
 
 
@@ -270,8 +255,8 @@ class FactShift:
     """Shift fact table operations"""
     
     @staticmethod
-    def insert_batch(shifts: List[Dict], billing_period_id: str, batch_id: str) -> int:
-        """Insert shift records with proper fact table structure"""
+    def insert_batch(shifts: List[Dict], billing_period_id: str, batch_id: str) -> Dict[str, int]:
+        """Insert shift records with proper fact table structure; returns inserted/updated/unchanged counts"""
         
         records = []
         for shift in shifts:
@@ -334,7 +319,7 @@ class FactShift:
                 'approved_by': shift.get('approved_by'),
                 'approved_at': shift.get('approved_at'),
                 
-                # Store complete API response
+                # Complete API response (loaded into the raw payload side table)
                 'raw_data': shift.get('raw_data') or json.dumps(shift),
                 'etl_batch_id': batch_id
             }
@@ -348,24 +333,10 @@ class FactShift:
                 logger.warning(f"Skipping shift {record['shift_id']} due to missing required fields")
         
         if not records:
-            return 0
-        
-        # Use partition-aware insert
-        columns = list(records[0].keys())
-        placeholders = [f"%({col})s" for col in columns]
-        
-        # Insert into partitioned table
-        query = f"""
-            INSERT INTO {config.POSTGRES_SCHEMA}.fact_shifts ({', '.join(columns)})
-            VALUES ({', '.join(placeholders)})
-            ON CONFLICT (billing_period_id, shift_id) DO UPDATE SET
-                status = EXCLUDED.status,
-                raw_data = EXCLUDED.raw_data,
-                etl_batch_id = EXCLUDED.etl_batch_id,
-                updated_at = CURRENT_TIMESTAMP
-        """
+            return {'inserted': 0, 'updated': 0, 'unchanged': 0}
         
-        return db.execute_batch_insert(query, records)
+        # COPY-based load; provisions any missing partitions and skips unchanged shifts
+        return db.copy_fact_shifts(records)
 
 
 class BillingPeriod:
@@ -374,37 +345,47 @@ class BillingPeriod:
     @staticmethod
     def get_period_id(date_str: str) -> str:
         """Get billing period ID for a given date"""
-        query = f"""
-            SELECT period_id 
-            FROM {config.POSTGRES_SCHEMA}.billing_periods
-            WHERE %(date)s BETWEEN start_date AND end_date
-        """
-        result = db.execute_query(query, {'date': date_str})
-        
-        if result:
-            return result[0]['period_id']
-        else:
-            raise ValueError(f"No billing period found for date: {date_str}")
+        return db.get_billing_period_id(date_str)
     
     @staticmethod
     def get_period_dates(period_id: str) -> Dict[str, str]:
         """Get start and end dates for a billing period"""
-        query = f"""
-            SELECT start_date, end_date
-            FROM {config.POSTGRES_SCHEMA}.billing_periods
-            WHERE period_id = %(period_id)s
-        """
-        result = db.execute_query(query, {'period_id': period_id})
+        dates = db.period_index.get_dates(period_id)
         
-        if result:
+        if dates:
             return {
-                'start_date': result[0]['start_date'].strftime('%Y-%m-%d'),
-                'end_date': result[0]['end_date'].strftime('%Y-%m-%d')
+                'start_date': dates[0].strftime('%Y-%m-%d'),
+                'end_date': dates[1].strftime('%Y-%m-%d')
             }
         else:
             raise ValueError(f"Billing period not found: {period_id}")
 
 
+    @staticmethod
+    def lock_name(period_id: str) -> str:
+        """Advisory lock name guarding one billing period (and its partition) against concurrent loads"""
+        return f'fact_shifts_{period_id}'
+    
+    @staticmethod
+    def get_period_range(first_period_id: str, last_period_id: str) -> List[str]:
+        """Billing period IDs from first to last (inclusive), oldest first"""
+        first = db.period_index.get_dates(first_period_id)
+        last = db.period_index.get_dates(last_period_id)
+        if not first:
+            raise ValueError(f"Billing period not found: {first_period_id}")
+        if not last:
+            raise ValueError(f"Billing period not found: {last_period_id}")
+        
+        query = f"""
+            SELECT period_id
+            FROM {config.POSTGRES_SCHEMA}.billing_periods
+            WHERE start_date BETWEEN %(first_start)s AND %(last_start)s
+            ORDER BY start_date
+        """
+        results = db.execute_query(query, {'first_start': first[0], 'last_start': last[0]})
+        return [row['period_id'] for row in results]
+
+
 class ETLBatch:
     """ETL batch tracking operations"""
     
@@ -430,8 +411,9 @@ class ETLBatch:
         return batch_id
     
     @staticmethod
-    def complete_batch(batch_id: str, records_processed: int, records_failed: int = 0, error_message: str = None):
-        """Complete ETL batch with results"""
+    def complete_batch(batch_id: str, records_processed: int, records_failed: int = 0, error_message: str = None,
+                       metadata: Dict = None):
+        """Complete ETL batch with results; `metadata` keys are merged into the batch's metadata"""
         status = 'FAILED' if error_message else 'COMPLETED'
         
         query = f"""
@@ -440,7 +422,8 @@ class ETLBatch:
                 completed_at = CURRENT_TIMESTAMP,
                 records_processed = %(records_processed)s,
                 records_failed = %(records_failed)s,
-                error_message = %(error_message)s
+                error_message = %(error_message)s,
+                metadata = COALESCE(metadata, '{{}}'::jsonb) || COALESCE(%(metadata)s::jsonb, '{{}}'::jsonb)
             WHERE batch_id = %(batch_id)s
         """
         
@@ -450,12 +433,42 @@ class ETLBatch:
                 'status': status,
                 'records_processed': records_processed,
                 'records_failed': records_failed,
-                'error_message': error_message
+                'error_message': error_message,
+                'metadata': json.dumps(metadata, default=str) if metadata else None
             })
         
         logger.info(f"Completed batch {batch_id}: {status}, {records_processed} records")
 
 
+    @staticmethod
+    def set_metadata_entry(batch_id: str, key: str, entry_id: str, value: Dict):
+        """
+        Set metadata[key][entry_id] on a batch
+        
+        Only that entry is replaced, so concurrent writers updating different
+        entries (e.g. backfill workers reporting their periods) don't clobber
+        each other.
+        """
+        query = f"""
+            UPDATE {config.POSTGRES_SCHEMA}.etl_batches
+            SET metadata = jsonb_set(
+                jsonb_set(COALESCE(metadata, '{{}}'::jsonb), %(key_path)s,
+                          COALESCE(metadata -> %(key)s, '{{}}'::jsonb)),
+                %(entry_path)s, %(value)s::jsonb
+            )
+            WHERE batch_id = %(batch_id)s
+        """
+        
+        with db.get_cursor() as cursor:
+            cursor.execute(query, {
+                'batch_id': batch_id,
+                'key': key,
+                'key_path': [key],
+                'entry_path': [key, entry_id],
+                'value': json.dumps(value, default=str)
+            })
+
+
 class ETLSyncStatus:
     """ETL sync status tracking"""
     
@@ -481,3 +494,17 @@ class ETLSyncStatus:
                 'last_successful_batch_id': last_successful_batch_id,
                 'sync_metadata': json.dumps(sync_metadata) if sync_metadata else None
             })
+    
+    @staticmethod
+    def get_last_sync_timestamp(table_name: str) -> Optional[datetime]:
+        """Get the last successful sync watermark for a table, if any"""
+        query = f"""
+            SELECT last_sync_timestamp
+            FROM {config.POSTGRES_SCHEMA}.etl_sync_status
+            WHERE table_name = %(table_name)s
+        """
+        result = db.execute_query(query, {'table_name': table_name})
+        
+        if result:
+            return result[0]['last_sync_timestamp']
+        return None
@@ -0,0 +1,277 @@
+# etl/partition_manager.py
+"""
+fact_shifts partition lifecycle: pre-create upcoming billing periods,
+index each partition, and archive expired partitions to Parquet
+"""
+import os
+import logging
+from datetime import date, timedelta
+from typing import Dict, List, Any, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .config import config
+from .database import db
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionManager:
+    """Keep fact_shifts partitions ahead of the calendar and archive old ones"""
+
+    # Index name suffix -> columns, created on every partition
+    PARTITION_INDEXES = {
+        'shift_date': ['shift_date'],
+        'employee': ['employee_id', 'shift_date'],
+        'client': ['client_id', 'shift_date'],
+        'position': ['position_id'],
+    }
+
+    EXPORT_FETCH_SIZE = 10000  # Rows per server-side cursor fetch / Parquet row group
+
+    # Per-period aggregate tables rebuilt by refresh_period_aggregates -> period column
+    PERIOD_AGGREGATE_TABLES = {
+        'agg_period_region': 'billing_period_id',
+        'agg_period_client': 'billing_period_id',
+        'agg_period_position': 'billing_period_id',
+        'agg_period_employee': 'billing_period_id',
+        'mat_standby_shifts': 'billing_period',
+    }
+
+    def __init__(self, database=None):
+        self.db = database or db
+        self.schema = config.POSTGRES_SCHEMA
+
+    def ensure_billing_periods(self, periods_ahead: int) -> List[Dict[str, Any]]:
+        """
+        Make sure billing_periods covers the current period and `periods_ahead` more
+
+        Missing fiscal years are filled in with generate_billing_periods.
+
+        Returns:
+            The current and upcoming billing periods, oldest first
+        """
+        query = f"""
+            SELECT period_id, start_date, end_date
+            FROM {self.schema}.billing_periods
+            WHERE end_date >= CURRENT_DATE
+            ORDER BY start_date
+            LIMIT %(limit)s
+        """
+        limit = periods_ahead + 1
+
+        periods = self.db.execute_query(query, {'limit': limit})
+        while len(periods) < limit:
+            result = self.db.execute_query(
+                f"SELECT MAX(fiscal_year) AS fiscal_year FROM {self.schema}.billing_periods"
+            )
+            last_year = result[0]['fiscal_year'] if result else None
+            next_year = last_year + 1 if last_year else date.today().year
+
+            self.db.generate_billing_periods(next_year)
+
+            periods = self.db.execute_query(query, {'limit': limit})
+
+        return periods
+
+    def create_partition_indexes(self, period_id: str) -> None:
+        """Create the standard indexes on one partition (no-op if they exist)"""
+        partition = f"fact_shifts_{period_id}"
+        with self.db.get_cursor() as cursor:
+            for suffix, columns in self.PARTITION_INDEXES.items():
+                cursor.execute(f"""
+                    CREATE INDEX IF NOT EXISTS idx_{partition}_{suffix}
+                    ON {self.schema}.{partition} ({', '.join(columns)})
+                """)
+
+    def precreate_partitions(self, periods_ahead: int = None) -> List[str]:
+        """
+        Create (and index) partitions for the current and next billing periods
+
+        Returns:
+            Period IDs that were prepared
+        """
+        if periods_ahead is None:
+            periods_ahead = config.PARTITION_PERIODS_AHEAD
+
+        periods = self.ensure_billing_periods(periods_ahead)
+        period_ids = [period['period_id'] for period in periods]
+
+        created = self.db.ensure_shift_partitions(period_ids)
+        for period_id in period_ids:
+            self.create_partition_indexes(period_id)
+
+        logger.info(f"Partitions ready for {', '.join(period_ids)} ({len(created)} created)")
+        return period_ids
+
+    def get_partitions(self) -> List[Dict[str, Any]]:
+        """List attached fact_shifts partitions with their billing period dates"""
+        query = f"""
+            SELECT c.relname AS partition_name,
+                   substring(c.relname FROM 'fact_shifts_(.*)$') AS period_id,
+                   bp.start_date, bp.end_date
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            JOIN pg_namespace n ON n.oid = p.relnamespace
+            LEFT JOIN {self.schema}.billing_periods bp
+              ON bp.period_id = substring(c.relname FROM 'fact_shifts_(.*)$')
+            WHERE p.relname = 'fact_shifts' AND n.nspname = %(schema)s
+            ORDER BY c.relname
+        """
+        return self.db.execute_query(query, {'schema': self.schema})
+
+    def get_expired_partitions(self, retention_days: int = None) -> List[Dict[str, Any]]:
+        """Partitions whose billing period ended more than `retention_days` ago"""
+        if retention_days is None:
+            retention_days = config.PARTITION_RETENTION_DAYS
+
+        cutoff = date.today() - timedelta(days=retention_days)
+        return [
+            partition for partition in self.get_partitions()
+            if partition['end_date'] is not None and partition['end_date'] < cutoff
+        ]
+
+    def _arrow_schema(self, partition: str) -> pa.Schema:
+        """Map the partition's column types to an Arrow schema"""
+        query = """
+            SELECT column_name, data_type, numeric_precision, numeric_scale
+            FROM information_schema.columns
+            WHERE table_schema = %(schema)s AND table_name = %(table)s
+            ORDER BY ordinal_position
+        """
+        columns = self.db.execute_query(query, {'schema': self.schema, 'table': partition})
+
+        fields = []
+        for column in columns:
+            data_type = column['data_type']
+            if data_type == 'bigint':
+                arrow_type = pa.int64()
+            elif data_type in ('integer', 'smallint'):
+                arrow_type = pa.int32()
+            elif data_type == 'numeric':
+                arrow_type = pa.decimal128(column['numeric_precision'] or 38, column['numeric_scale'] or 0)
+            elif data_type == 'date':
+                arrow_type = pa.date32()
+            elif data_type == 'timestamp with time zone':
+                arrow_type = pa.timestamp('us', tz='UTC')
+            elif data_type == 'timestamp without time zone':
+                arrow_type = pa.timestamp('us')
+            elif data_type == 'boolean':
+                arrow_type = pa.bool_()
+            else:
+                # varchar, char, uuid, json(b) and anything else are kept as text
+                arrow_type = pa.string()
+            fields.append(pa.field(column['column_name'], arrow_type))
+
+        return pa.schema(fields)
+
+    def export_partition(self, period_id: str, archive_dir: str = None) -> Optional[str]:
+        """
+        Export one partition to a zstd-compressed Parquet file
+
+        Each shift's raw API payload (from fact_shift_raw / raw_shift_payloads)
+        is exported with it as a raw_data text column. Rows are streamed through
+        a server-side cursor, one row group per fetch, and the file is written
+        under a temporary name and renamed when complete.
+
+        Returns:
+            Path of the Parquet file, or None if the partition is empty
+        """
+        archive_dir = archive_dir or config.PARTITION_ARCHIVE_DIR
+        partition = f"fact_shifts_{period_id}"
+        schema = self._arrow_schema(partition)
+        columns = [f"s.{name}" for name in schema.names]
+        if 'raw_data' not in schema.names:
+            schema = schema.append(pa.field('raw_data', pa.string()))
+            columns.append('p.payload::text AS raw_data')
+
+        os.makedirs(archive_dir, exist_ok=True)
+        path = os.path.join(archive_dir, f"{partition}.parquet")
+        tmp_path = f"{path}.tmp"
+
+        row_count = 0
+        writer = None
+        try:
+            for batch in self.db.stream_arrow(
+                f"""
+                    SELECT {', '.join(columns)}
+                    FROM {self.schema}.{partition} s
+                    LEFT JOIN {self.schema}.fact_shift_raw r
+                      ON r.billing_period_id = s.billing_period_id AND r.shift_id = s.shift_id
+                    LEFT JOIN {self.schema}.raw_shift_payloads p ON p.payload_hash = r.payload_hash
+                """,
+                batch_size=self.EXPORT_FETCH_SIZE, schema=schema
+            ):
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, schema, compression='zstd')
+                writer.write_batch(batch)
+                row_count += batch.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if writer is None:
+            logger.info(f"Partition {partition} is empty, nothing to export")
+            return None
+
+        os.replace(tmp_path, path)
+        logger.info(f"Exported {row_count} rows from {partition} to {path}")
+        return path
+
+    def detach_partition(self, period_id: str, drop: bool = False) -> None:
+        """
+        Detach a partition from fact_shifts, optionally dropping the table
+
+        The period's rows in fact_shift_raw and the aggregate tables go with it
+        (in the same transaction), and payloads no longer referenced by any
+        shift are then deleted. export_partition keeps the payloads in the archive.
+        """
+        partition = f"fact_shifts_{period_id}"
+        with self.db.get_cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {self.schema}.fact_shifts DETACH PARTITION {self.schema}.{partition}")
+            cursor.execute(
+                f"DELETE FROM {self.schema}.fact_shift_raw WHERE billing_period_id = %(period_id)s",
+                {'period_id': period_id}
+            )
+            for table, period_column in self.PERIOD_AGGREGATE_TABLES.items():
+                cursor.execute(
+                    f"DELETE FROM {self.schema}.{table} WHERE {period_column} = %(period_id)s",
+                    {'period_id': period_id}
+                )
+            if drop:
+                cursor.execute(f"DROP TABLE {self.schema}.{partition}")
+
+        self.db._known_partitions.discard(period_id)
+        logger.info(f"{'Dropped' if drop else 'Detached'} partition {partition} and its side-table rows")
+        self.db.cleanup_orphan_payloads()
+
+    def archive_expired_partitions(self, retention_days: int = None, archive_dir: str = None,
+                                   drop: bool = False, dry_run: bool = False) -> List[str]:
+        """
+        Export and detach every partition older than the retention window
+
+        A partition is only detached after its export has been written.
+
+        Returns:
+            Period IDs that were archived (or would be, on a dry run)
+        """
+        archived = []
+        for partition in self.get_expired_partitions(retention_days):
+            period_id = partition['period_id']
+            if dry_run:
+                logger.info(f"Would archive {partition['partition_name']} (ended {partition['end_date']})")
+            else:
+                self.export_partition(period_id, archive_dir)
+                self.detach_partition(period_id, drop=drop)
+            archived.append(period_id)
+
+        return archived
+
+    def run(self, periods_ahead: int = None, retention_days: int = None,
+            archive_dir: str = None, drop: bool = False, dry_run: bool = False) -> Dict[str, List[str]]:
+        """Pre-create upcoming partitions, then archive expired ones"""
+        prepared = [] if dry_run else self.precreate_partitions(periods_ahead)
+        archived = self.archive_expired_partitions(retention_days, archive_dir, drop=drop, dry_run=dry_run)
+        return {'prepared': prepared, 'archived': archived}
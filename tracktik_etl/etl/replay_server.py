@@ -0,0 +1,498 @@
+# etl/replay_server.py
+"""
+Local TrackTik API stand-in that replays recorded fixtures
+
+Lets ETLPipeline and KaiserBillingProcessor run (and be timed) without
+credentials or network: record the tenant's data once with record_fixtures(),
+then point TRACKTIK_BASE_URL at a TrackTikReplayServer.
+"""
+import os
+import json
+import time
+import random
+import secrets
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl
+
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+# Resources served under /rest/v1/<resource>
+RESOURCES = ('shifts', 'clients', 'positions', 'regions', 'employees')
+
+# Reference fields that hold an ID (or an included object) of another resource
+RELATIONS = {
+    'employee': 'employees',
+    'position': 'positions',
+    'account': 'clients',
+    'region': 'regions',
+    'parentRegion': 'regions'
+}
+
+# Fields the API derives through another relation when the record doesn't carry them
+DERIVED_FIELDS = {
+    'shifts': {'account': 'position.account'}
+}
+
+# Query parameters that shape the response rather than filter it
+NON_FILTER_PARAMS = {'limit', 'offset', 'include', 'includeInactive', 'sort', 'fields'}
+
+
+def record_fixtures(client, fixture_dir: str, start_date: str, end_date: str,
+                    **shift_params) -> Dict[str, int]:
+    """
+    Record the replay server's fixtures from the live API
+
+    Saves regions, clients, positions, employees and the shifts between
+    `start_date` and `end_date` (at most 31 days, as for get_shifts) to one
+    JSON file per resource. The files hold tenant data - keep them out of git.
+
+    Args:
+        client: TrackTikClient (without a reference cache, so nothing is stale)
+        fixture_dir: Directory to write <resource>.json files to
+        start_date: First shift date, YYYY-MM-DD
+        end_date: Last shift date, YYYY-MM-DD
+        **shift_params: Extra shift filters (e.g. status='APPROVED')
+
+    Returns:
+        Records saved per resource
+    """
+    fetchers = {
+        'regions': lambda: client.get_regions(),
+        'clients': lambda: client.get_clients(),
+        'positions': lambda: client.get_positions(),
+        'employees': lambda: client.get_employees(),
+        'shifts': lambda: client.get_shifts(start_date, end_date, **shift_params)
+    }
+
+    os.makedirs(fixture_dir, exist_ok=True)
+    counts = {}
+    for resource, fetch in fetchers.items():
+        records = fetch()
+        fixture = {
+            'resource': resource,
+            'recorded_at': datetime.now().isoformat(),
+            'params': {'start_date': start_date, 'end_date': end_date, **shift_params} if resource == 'shifts' else {},
+            'data': records
+        }
+        path = os.path.join(fixture_dir, f'{resource}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(fixture, f)
+        counts[resource] = len(records)
+        logger.info(f"Recorded {len(records)} {resource} to {path}")
+
+    return counts
+
+
+class FixtureStore:
+    """Recorded records per resource, indexed by ID, with TrackTik-style filtering"""
+
+    def __init__(self, fixture_dir: str, scale: int = 1, cache_size: int = 256):
+        self.fixture_dir = fixture_dir
+        self.scale = max(1, int(scale))
+        self.records: Dict[str, List[Dict]] = {}
+        self.by_id: Dict[str, Dict[str, Dict]] = {}
+        self._cache_size = cache_size
+        self._query_cache: 'OrderedDict[Tuple, List[Dict]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        for resource in RESOURCES + ('account',):
+            path = os.path.join(fixture_dir, f'{resource}.json')
+            records = []
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    fixture = json.load(f)
+                # Either a recorded fixture or a bare list of records
+                records = fixture.get('data', []) if isinstance(fixture, dict) else fixture
+            self.records[resource] = records
+            self.by_id[resource] = {str(r['id']): r for r in records if isinstance(r, dict) and 'id' in r}
+
+        # Scaled copies of a shift get IDs offset by multiples of a power of ten above the largest ID
+        max_shift_id = max((int(r['id']) for r in self.records['shifts'] if str(r.get('id', '')).isdigit()), default=0)
+        self.id_stride = 10 ** len(str(max_shift_id))
+
+        logger.info(f"Loaded fixtures from {fixture_dir}: " + ', '.join(
+            f"{len(self.records[resource])} {resource}" for resource in RESOURCES
+        ) + (f" (shifts x{self.scale})" if self.scale > 1 else ''))
+
+    def _related(self, resource: str, value: Any) -> Optional[Dict]:
+        """Expand a reference (ID or included object) into the related record"""
+        if isinstance(value, dict):
+            return self.by_id[resource].get(str(value.get('id'))) or value
+        if value is None:
+            return None
+        return self.by_id[resource].get(str(value))
+
+    def resolve(self, resource: str, record: Dict, path: str) -> Any:
+        """
+        Value of a dotted filter path, following references across resources
+
+        e.g. 'employee.region' on a shift looks the employee up in the
+        employees fixture; a trailing object is reduced to its ID.
+        """
+        parts = path.split('.')
+        if parts[0] not in record and parts[0] in DERIVED_FIELDS.get(resource, {}):
+            parts = DERIVED_FIELDS[resource][parts[0]].split('.') + parts[1:]
+
+        value: Any = record
+        for i, part in enumerate(parts):
+            if isinstance(value, dict):
+                value = value.get(part)
+            else:
+                return None
+
+            remaining = parts[i + 1:]
+            if not remaining or part not in RELATIONS:
+                continue
+            if remaining == ['id'] and not isinstance(value, dict):
+                return value
+            value = self._related(RELATIONS[part], value)
+
+        if isinstance(value, dict):
+            return value.get('id')
+        return value
+
+    @staticmethod
+    def _compare_key(value: Any, bound: str) -> Tuple[Any, Any]:
+        """Comparable (value, bound): numbers numerically, timestamps on the bound's precision"""
+        try:
+            return float(value), float(bound)
+        except (TypeError, ValueError):
+            # '2025-06-01 08:00' and '2025-06-01T08:00:00-07:00' compare on local wall time
+            text = str(value).replace(' ', 'T')
+            bound = bound.replace(' ', 'T')
+            return text[:len(bound)], bound
+
+    def _matches(self, resource: str, record: Dict, field: str, operator: Optional[str], expected: str) -> bool:
+        value = self.resolve(resource, record, field)
+        if value is None:
+            return False
+
+        if operator is None or operator == 'eq':
+            return str(value).lower() == expected.lower()
+        if operator == 'in':
+            return str(value) in expected.split(',')
+        if operator == 'between':
+            low, _, high = expected.partition('|')
+            value_low, low = self._compare_key(value, low)
+            value_high, high = self._compare_key(value, high)
+            return low <= value_low and value_high <= high
+
+        value, bound = self._compare_key(value, expected)
+        if operator in ('after', 'gt'):
+            return value > bound
+        if operator in ('before', 'lt'):
+            return value < bound
+        if operator == 'gte':
+            return value >= bound
+        if operator == 'lte':
+            return value <= bound
+        raise ValueError(f"Unsupported filter operator ':{operator}'")
+
+    def query(self, resource: str, params: Dict[str, str]) -> List[Dict]:
+        """
+        Records of `resource` matching the filter params (before scaling)
+
+        Results are cached per query, so paging through one costs a single scan.
+        """
+        filters = sorted((key, value) for key, value in params.items() if key not in NON_FILTER_PARAMS)
+        cache_key = (resource, tuple(filters))
+        with self._lock:
+            if cache_key in self._query_cache:
+                self._query_cache.move_to_end(cache_key)
+                return self._query_cache[cache_key]
+
+        parsed = []
+        for key, value in filters:
+            field, _, operator = key.partition(':')
+            parsed.append((field, operator or None, value))
+
+        matched = [
+            record for record in self.records[resource]
+            if all(self._matches(resource, record, field, operator, value) for field, operator, value in parsed)
+        ]
+
+        with self._lock:
+            self._query_cache[cache_key] = matched
+            while len(self._query_cache) > self._cache_size:
+                self._query_cache.popitem(last=False)
+        return matched
+
+    def count(self, resource: str, matched: List[Dict]) -> int:
+        """Total records served for a query, after volume scaling"""
+        return len(matched) * (self.scale if resource == 'shifts' else 1)
+
+    def page(self, resource: str, matched: List[Dict], offset: int, limit: int) -> List[Dict]:
+        """One page of a query's (scaled) results"""
+        total = self.count(resource, matched)
+        if resource != 'shifts' or self.scale == 1:
+            return matched[offset:offset + limit]
+
+        # Copy k of the n matched shifts sits at positions k*n .. k*n + n - 1
+        n = len(matched)
+        page = []
+        for position in range(offset, min(offset + limit, total)):
+            copy, index = divmod(position, n)
+            record = matched[index]
+            if copy:
+                record = {**record, 'id': int(record['id']) + copy * self.id_stride}
+            page.append(record)
+        return page
+
+    def get(self, resource: str, record_id: str) -> Optional[Dict]:
+        """One record by ID, including scaled shift copies"""
+        record = self.by_id[resource].get(record_id)
+        if record is not None or resource != 'shifts' or self.scale == 1 or not record_id.isdigit():
+            return record
+
+        copy, base_id = divmod(int(record_id), self.id_stride)
+        record = self.by_id[resource].get(str(base_id))
+        if record is None or copy >= self.scale:
+            return None
+        return {**record, 'id': int(record_id)}
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    """Request handler; the TrackTikReplayServer is `self.server`"""
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive, as a pooled requests.Session expects
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status: int, body: Any, headers: Dict[str, str] = None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        length = int(self.headers.get('Content-Length') or 0)
+        form = dict(parse_qsl(self.rfile.read(length).decode('utf-8')))
+
+        if path != '/rest/oauth2/access_token':
+            self._send_json(404, {'message': f'No route for POST {path}'})
+            return
+        if form.get('grant_type') not in ('password', 'refresh_token', 'client_credentials'):
+            self._send_json(400, {'error': 'unsupported_grant_type'})
+            return
+
+        self.server.record_request('oauth')
+        self._send_json(200, self.server.issue_token())
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+        parts = [part for part in url.path.split('/') if part]
+
+        if not self.server.check_token(self.headers.get('Authorization', '')):
+            self._send_json(401, {'message': 'Invalid or expired access token'})
+            return
+
+        allowed, rate_headers = self.server.take_rate_limit()
+        if not allowed:
+            rate_headers['Retry-After'] = rate_headers['X-RateLimit-Reset']
+            self._send_json(429, {'message': 'Too Many Requests'}, rate_headers)
+            return
+
+        self.server.simulate_latency()
+
+        if parts[:2] != ['rest', 'v1'] or len(parts) not in (3, 4):
+            self._send_json(404, {'message': f'No route for GET {url.path}'}, rate_headers)
+            return
+
+        resource = parts[2]
+        store = self.server.store
+        self.server.record_request(resource)
+
+        if resource == 'account' and len(parts) == 3:
+            account = store.records['account']
+            self._send_json(200, {'data': account[0] if account else {}}, rate_headers)
+            return
+        if resource not in RESOURCES:
+            self._send_json(404, {'message': f'Unknown resource {resource}'}, rate_headers)
+            return
+
+        if len(parts) == 4:
+            record = store.get(resource, parts[3])
+            if record is None:
+                self._send_json(404, {'message': f'{resource} {parts[3]} not found'}, rate_headers)
+            else:
+                self._send_json(200, {'data': record}, rate_headers)
+            return
+
+        try:
+            limit = min(int(params.get('limit', 100)), self.server.max_page_size)
+            offset = int(params.get('offset', 0))
+            matched = store.query(resource, params)
+        except ValueError as e:
+            self._send_json(400, {'message': str(e)}, rate_headers)
+            return
+
+        page = store.page(resource, matched, offset, limit)
+        self._send_json(200, {
+            'meta': {
+                'count': store.count(resource, matched),
+                'itemCount': len(page),
+                'limit': limit,
+                'offset': offset,
+                'resource': resource,
+                'request': url.path
+            },
+            'data': page
+        }, rate_headers)
+
+
+class TrackTikReplayServer(ThreadingHTTPServer):
+    """TrackTik API stand-in serving recorded fixtures
+
+    Serves the OAuth endpoint and /rest/v1/{shifts,clients,positions,regions,
+    employees} with meta.count and limit/offset pagination, the filters the
+    ETL sends (startDateTime:between, employee.region, account.id:in,
+    updatedOn:after, region, ...) and single-record GETs. Timestamps are
+    compared on local wall time; `include` is ignored (records are served as
+    recorded). Optional per-request latency, an X-RateLimit-* budget (429 with
+    Retry-After once spent) and shift volume scaling make it usable for load
+    tests:
+
+        with TrackTikReplayServer('etl/fixtures/tracktik', latency=0.05, scale=20) as server:
+            config.TRACKTIK_BASE_URL = server.base_url
+            ETLPipeline().process_kaiser_billing_period('2025_12')
+    """
+
+    daemon_threads = True
+
+    def __init__(self, fixture_dir: str = None, host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, latency_jitter: float = 0.0,
+                 rate_limit: Optional[int] = None, rate_limit_window: int = 60,
+                 scale: int = 1, max_page_size: int = 1000, token_ttl: int = 3600):
+        """
+        Args:
+            fixture_dir: Directory of <resource>.json fixtures (default config.REPLAY_FIXTURE_DIR)
+            host: Interface to bind
+            port: Port to bind (0 = any free port; see base_url)
+            latency: Seconds added to every API response
+            latency_jitter: Extra random seconds (uniform 0..jitter) per response
+            rate_limit: Requests allowed per window (None = unlimited, no headers)
+            rate_limit_window: Rate limit window in seconds
+            scale: Serve each recorded shift this many times, with distinct IDs
+            max_page_size: Largest `limit` honoured
+            token_ttl: expires_in of issued access tokens, in seconds
+        """
+        super().__init__((host, port), _ReplayHandler)
+        self.store = FixtureStore(fixture_dir or config.REPLAY_FIXTURE_DIR, scale=scale)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.max_page_size = max_page_size
+        self.token_ttl = token_ttl
+
+        self._lock = threading.Lock()
+        self._tokens: Dict[str, float] = {}
+        self._window_started = time.time()
+        self._window_requests = 0
+        self._thread: Optional[threading.Thread] = None
+        self.request_counts: Dict[str, int] = {}
+        self.throttled_requests = 0
+
+    @property
+    def base_url(self) -> str:
+        """URL to use as TRACKTIK_BASE_URL"""
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'TrackTikReplayServer':
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, name='tracktik-replay', daemon=True)
+        self._thread.start()
+        logger.info(f"TrackTik replay server listening on {self.base_url}")
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket"""
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+    def __enter__(self) -> 'TrackTikReplayServer':
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def issue_token(self) -> Dict[str, Any]:
+        """New OAuth token response"""
+        token = secrets.token_hex(16)
+        with self._lock:
+            self._tokens[token] = time.time() + self.token_ttl
+        return {
+            'token_type': 'Bearer',
+            'access_token': token,
+            'refresh_token': secrets.token_hex(16),
+            'expires_in': self.token_ttl
+        }
+
+    def check_token(self, authorization: str) -> bool:
+        """Whether an Authorization header carries a live token"""
+        scheme, _, token = authorization.partition(' ')
+        with self._lock:
+            expires_at = self._tokens.get(token)
+        return scheme.lower() == 'bearer' and expires_at is not None and time.time() < expires_at
+
+    def take_rate_limit(self) -> Tuple[bool, Dict[str, str]]:
+        """Count a request against the fixed-window budget; returns (allowed, X-RateLimit-* headers)"""
+        if not self.rate_limit:
+            return True, {}
+
+        with self._lock:
+            now = time.time()
+            if now - self._window_started >= self.rate_limit_window:
+                self._window_started = now
+                self._window_requests = 0
+
+            allowed = self._window_requests < self.rate_limit
+            if allowed:
+                self._window_requests += 1
+            else:
+                self.throttled_requests += 1
+
+            reset = max(1, int(round(self._window_started + self.rate_limit_window - now)))
+            headers = {
+                'X-RateLimit-Limit': str(self.rate_limit),
+                'X-RateLimit-Remaining': str(self.rate_limit - self._window_requests),
+                'X-RateLimit-Reset': str(reset)  # Seconds until the window resets
+            }
+        return allowed, headers
+
+    def simulate_latency(self):
+        """Sleep for the configured response latency"""
+        delay = self.latency + (random.uniform(0, self.latency_jitter) if self.latency_jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def record_request(self, resource: str):
+        with self._lock:
+            self.request_counts[resource] = self.request_counts.get(resource, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Requests served per resource and requests refused by the rate limit"""
+        with self._lock:
+            return {
+                'requests': dict(self.request_counts),
+                'total_requests': sum(self.request_counts.values()),
+                'throttled_requests': self.throttled_requests
+            }
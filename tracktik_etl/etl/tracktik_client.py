@@ -5,13 +5,19 @@ UPDATED WITH get_regions() method and improved error handling
 """
 import time
 import logging
-from typing import Dict, List, Optional, Any
+import threading
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Any, Tuple, Union
 from datetime import datetime, timedelta
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
 from .config import config
+from .utils.rate_limiter import RateLimiter, TokenBucketRateLimiter
+from .utils.reference_cache import ReferenceDataCache
 
 logger = logging.getLogger(__name__)
 
@@ -19,21 +25,32 @@ logger = logging.getLogger(__name__)
 class TrackTikClient:
     """TrackTik API Client with OAuth2 authentication"""
     
-    def __init__(self):
+    def __init__(self, rate_limiter: Optional[Union[RateLimiter, TokenBucketRateLimiter]] = None,
+                 cache: Optional[ReferenceDataCache] = None):
         self.base_url = config.TRACKTIK_BASE_URL
         self.access_token = None
         self.token_expires_at = None
         self.session = self._create_session()
+        # Optional shared budget - every API request waits on it first, and a
+        # TokenBucketRateLimiter also learns the real budget from response headers
+        self.rate_limiter = rate_limiter
+        # Optional reference data cache for clients, positions and regions
+        self.cache = cache
+        self._auth_lock = threading.Lock()
         
     def _create_session(self) -> requests.Session:
         """Create session with retry logic"""
         session = requests.Session()
+        # 429s are not retried here: _get hands them to the rate limiter so it backs off
         retry_strategy = Retry(
             total=config.MAX_RETRIES,
             backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
+            status_forcelist=[500, 502, 503, 504],
+        )
+        adapter = HTTPAdapter(
+            max_retries=retry_strategy,
+            pool_maxsize=max(10, config.MAX_REGION_WORKERS * 2)
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
         session.mount("http://", adapter)
         session.mount("https://", adapter)
         return session
@@ -63,7 +80,60 @@ class TrackTikClient:
     def _ensure_authenticated(self) -> None:
         """Ensure we have a valid token"""
         if not self.access_token or datetime.now() >= self.token_expires_at:
-            self.authenticate()
+            # Only one worker refreshes; the others reuse the new token
+            with self._auth_lock:
+                if not self.access_token or datetime.now() >= self.token_expires_at:
+                    self.authenticate()
+            
+    def _get(self, endpoint: str, params: Dict[str, Any] = None) -> requests.Response:
+        """
+        Issue a GET against the API, respecting the shared rate limiter
+        (and its cap on requests in flight)
+        
+        A 429 is reported to the limiter (with its Retry-After, if any), which
+        holds back every caller sharing it; the request is then retried up to
+        MAX_RETRIES times before the error is raised.
+        """
+        for attempt in range(config.MAX_RETRIES + 1):
+            if self.rate_limiter:
+                self.rate_limiter.wait_if_needed()
+            
+            # Holds one of the limiter's request slots, if it caps concurrency
+            with self.rate_limiter.in_flight() if self.rate_limiter else nullcontext():
+                response = self.session.get(
+                    f"{self.base_url}{endpoint}",
+                    headers=self._get_headers(),
+                    params=params
+                )
+            
+            if self.rate_limiter:
+                self.rate_limiter.update_from_headers(response.headers)
+            
+            if response.status_code != 429:
+                if self.rate_limiter:
+                    self.rate_limiter.record_success()
+                break
+            
+            retry_after = self._retry_after(response.headers)
+            if self.rate_limiter:
+                self.rate_limiter.record_error(retry_after)
+            if attempt == config.MAX_RETRIES:
+                break
+            
+            logger.warning(f"Rate limited on {endpoint} (attempt {attempt + 1}), backing off")
+            if not self.rate_limiter:
+                time.sleep(retry_after if retry_after is not None else config.RETRY_DELAY * (2 ** attempt))
+        
+        response.raise_for_status()
+        return response
+    
+    @staticmethod
+    def _retry_after(headers) -> Optional[float]:
+        """Read Retry-After (in seconds) from response headers, if present"""
+        try:
+            return float(headers['Retry-After'])
+        except (KeyError, TypeError, ValueError):
+            return None
             
     def _get_headers(self) -> Dict[str, str]:
         """Get headers with authentication"""
@@ -73,86 +143,181 @@ class TrackTikClient:
             'Accept': 'application/json'
         }
 
-    def get_paginated_data(self, endpoint: str, params: Dict[str, Any] = None) -> List[Dict]:
+    def _fetch_page(self, endpoint: str, params: Dict[str, Any], offset: int) -> Tuple[List[Dict], Dict, Any, int]:
+        """Fetch a single page; returns (records, meta, response headers, response size in bytes)"""
+        # Add pagination params
+        current_params = params.copy()
+        current_params.update({
+            'limit': config.API_PAGE_SIZE,
+            'offset': offset
+        })
+        
+        # Make request
+        response = self._get(endpoint, current_params)
+        
+        data = response.json()
+        return data.get('data', []), data.get('meta', {}), response.headers, len(response.content)
+    
+    @staticmethod
+    def _rate_limit_remaining(headers) -> Optional[int]:
+        """Read X-RateLimit-Remaining from response headers, if present"""
+        if 'X-RateLimit-Remaining' in headers:
+            try:
+                return int(headers['X-RateLimit-Remaining'])
+            except (TypeError, ValueError):
+                return None
+        return None
+
+    def iter_paginated_data(self, endpoint: str, params: Dict[str, Any] = None,
+                            fan_out: int = None) -> Iterator[List[Dict]]:
         """
-        Get all pages of data from an endpoint
+        Yield an endpoint's records one page at a time
+        
+        See iter_paginated_pages; pages left empty by de-duplication are skipped.
+        """
+        for _, page in self.iter_paginated_pages(endpoint, params, fan_out=fan_out):
+            if page:
+                yield page
+    
+    def iter_paginated_pages(self, endpoint: str, params: Dict[str, Any] = None,
+                             fan_out: int = None, start_offset: int = 0,
+                             usage: Optional[Dict[str, int]] = None) -> Iterator[Tuple[int, List[Dict]]]:
+        """
+        Yield (offset, records) for each page of an endpoint
+        
+        Only the current page(s) are held in memory, so callers can transform and
+        load each page while the next one is being fetched. Once the first response
+        reports meta.count, the remaining offsets are requested concurrently (up to
+        `fan_out` at a time) and still yielded in offset order. Records are
+        de-duplicated by id in case rows shift between pages mid-read.
         
         Args:
             endpoint: API endpoint (e.g., '/rest/v1/shifts')
             params: Query parameters
+            fan_out: Max concurrent page requests (default config.API_PAGE_FAN_OUT,
+                1 fetches strictly one page after another)
+            start_offset: Offset of the first page to fetch (to resume a partial read)
+            usage: Optional dict whose 'calls' and 'bytes' counters are increased
+                as each page arrives (for stage timing)
             
-        Returns:
-            List of all records
+        Yields:
+            Tuples of (page offset, list of up to API_PAGE_SIZE records). Every
+            fetched page is yielded, even if de-duplication left it empty.
         """
         if params is None:
             params = {}
+        if fan_out is None:
+            fan_out = config.API_PAGE_FAN_OUT
             
-        all_records = []
-        offset = 0
-        total_count = None
-        
-        while True:
-            # Add pagination params
-            current_params = params.copy()
-            current_params.update({
-                'limit': config.API_PAGE_SIZE,
-                'offset': offset
-            })
-            
-            # Make request
-            response = self.session.get(
-                f"{self.base_url}{endpoint}",
-                headers=self._get_headers(),
-                params=current_params
-            )
-            response.raise_for_status()
-            
-            data = response.json()
-            records = data.get('data', [])
-            all_records.extend(records)
-            
-            # Get total count from meta
-            meta = data.get('meta', {})
-            if total_count is None and 'count' in meta:
-                total_count = meta['count']
-                logger.info(f"Fetching {endpoint}: {total_count} total records")
+        seen_ids = set()
+        stats = {'records': 0, 'pages': 0}
+        
+        def _new_records(records: List[Dict], size: int) -> List[Dict]:
+            stats['pages'] += 1
+            if usage is not None:
+                usage['calls'] = usage.get('calls', 0) + 1
+                usage['bytes'] = usage.get('bytes', 0) + size
+            fresh = []
+            for record in records:
+                record_id = record.get('id') if isinstance(record, dict) else None
+                if record_id is not None:
+                    if record_id in seen_ids:
+                        continue
+                    seen_ids.add(record_id)
+                fresh.append(record)
+            stats['records'] += len(fresh)
+            return fresh
+        
+        offset = start_offset
+        records, meta, headers, size = self._fetch_page(endpoint, params, offset)
+        total_count = meta.get('count')
+        if total_count is not None:
+            logger.info(f"Fetching {endpoint}: {total_count} total records"
+                        + (f" (resuming at offset {offset})" if offset else ""))
+        
+        yield offset, _new_records(records, size)
+        
+        last_page_full = len(records) >= config.API_PAGE_SIZE
+        
+        if last_page_full and fan_out > 1 and total_count:
+            # Every remaining offset is known - fetch them in overlapping waves
+            offsets = iter(range(offset + config.API_PAGE_SIZE, total_count, config.API_PAGE_SIZE))
+            pending = deque()
+            window = fan_out
             
-            # Stop conditions
-            if not records:  # No records returned
-                break
-                
-            if total_count and len(all_records) >= total_count:  # Retrieved all
-                break
-                
-            if len(records) < config.API_PAGE_SIZE:  # Last page
-                break
-                
+            with ThreadPoolExecutor(max_workers=fan_out, thread_name_prefix='tracktik-page') as executor:
+                try:
+                    while True:
+                        while len(pending) < window:
+                            next_offset = next(offsets, None)
+                            if next_offset is None:
+                                break
+                            pending.append((next_offset, executor.submit(
+                                self._fetch_page, endpoint, params, next_offset
+                            )))
+                        
+                        if not pending:
+                            break
+                        
+                        offset, future = pending.popleft()
+                        records, _, headers, size = future.result()
+                        last_page_full = len(records) >= config.API_PAGE_SIZE
+                        
+                        yield offset, _new_records(records, size)
+                        
+                        # Respect rate limits: narrow the window as the budget runs down
+                        remaining = self._rate_limit_remaining(headers)
+                        if remaining is not None:
+                            if remaining < 10:
+                                # A shared limiter already paused us until the window resets
+                                if self.rate_limiter is None:
+                                    logger.warning(f"Rate limit low ({remaining} remaining), sleeping...")
+                                    time.sleep(5)
+                                window = 1
+                            else:
+                                window = max(1, min(fan_out, remaining - 10))
+                finally:
+                    for _, future in pending:
+                        future.cancel()
+        
+        # Serial pagination - also picks up any tail that appeared after meta.count was read
+        while last_page_full and not (total_count and start_offset + stats['records'] >= total_count):
             offset += config.API_PAGE_SIZE
             
             # Respect rate limits
-            if 'X-RateLimit-Remaining' in response.headers:
-                remaining = int(response.headers['X-RateLimit-Remaining'])
-                if remaining < 10:
-                    logger.warning(f"Rate limit low ({remaining} remaining), sleeping...")
-                    time.sleep(5)
+            remaining = self._rate_limit_remaining(headers)
+            if self.rate_limiter is None and remaining is not None and remaining < 10:
+                logger.warning(f"Rate limit low ({remaining} remaining), sleeping...")
+                time.sleep(5)
+            
+            records, _, headers, size = self._fetch_page(endpoint, params, offset)
+            last_page_full = len(records) >= config.API_PAGE_SIZE
+            
+            yield offset, _new_records(records, size)
                     
-        logger.info(f"Retrieved {len(all_records)} records from {endpoint}")
-        return all_records
+        logger.info(f"Retrieved {stats['records']} records from {endpoint} in {stats['pages']} pages")
 
-    def get_shifts(self, start_date: str, end_date: str, **kwargs) -> List[Dict]:
+    def get_paginated_data(self, endpoint: str, params: Dict[str, Any] = None,
+                           fan_out: int = None) -> List[Dict]:
         """
-        Get shifts for a date range
+        Get all pages of data from an endpoint
         
         Args:
-            start_date: Start date in YYYY-MM-DD format
-            end_date: End date in YYYY-MM-DD format
-            **kwargs: Additional parameters (e.g., status='APPROVED', include='employee,position')
+            endpoint: API endpoint (e.g., '/rest/v1/shifts')
+            params: Query parameters
+            fan_out: Max concurrent page requests (see iter_paginated_data)
             
         Returns:
-            List of shift records
-            
-        Note: Date range cannot exceed 31 days per API requirements
+            List of all records
         """
+        all_records = []
+        for page in self.iter_paginated_data(endpoint, params, fan_out=fan_out):
+            all_records.extend(page)
+        return all_records
+
+    @staticmethod
+    def _shift_params(start_date: str, end_date: str, **kwargs) -> Dict[str, Any]:
+        """Build shift query parameters, enforcing the API's 31-day window"""
         # Validate date range
         start = datetime.strptime(start_date, '%Y-%m-%d')
         end = datetime.strptime(end_date, '%Y-%m-%d')
@@ -161,12 +326,38 @@ class TrackTikClient:
             raise ValueError("Date range cannot exceed 31 days per TrackTik API requirements")
         
         # Use :between filter which actually works!
-        params = {
+        return {
             'startDateTime:between': f'{start_date}|{end_date}',
             **kwargs
         }
+
+    def get_shifts(self, start_date: str, end_date: str, **kwargs) -> List[Dict]:
+        """
+        Get shifts for a date range
         
+        Args:
+            start_date: Start date in YYYY-MM-DD format
+            end_date: End date in YYYY-MM-DD format
+            **kwargs: Additional parameters (e.g., status='APPROVED', include='employee,position')
+            
+        Returns:
+            List of shift records
+            
+        Note: Date range cannot exceed 31 days per API requirements
+        """
+        params = self._shift_params(start_date, end_date, **kwargs)
         return self.get_paginated_data('/rest/v1/shifts', params)
+    
+    def iter_shifts(self, start_date: str, end_date: str, **kwargs) -> Iterator[List[Dict]]:
+        """Like get_shifts, but yields the shifts one page at a time"""
+        params = self._shift_params(start_date, end_date, **kwargs)
+        return self.iter_paginated_data('/rest/v1/shifts', params)
+    
+    def iter_shift_pages(self, start_date: str, end_date: str, start_offset: int = 0,
+                         usage: Optional[Dict[str, int]] = None, **kwargs) -> Iterator[Tuple[int, List[Dict]]]:
+        """Like iter_shifts, but yields (offset, shifts) and can resume at `start_offset`"""
+        params = self._shift_params(start_date, end_date, **kwargs)
+        return self.iter_paginated_pages('/rest/v1/shifts', params, start_offset=start_offset, usage=usage)
         
     def get_employees(self, **kwargs) -> List[Dict]:
         """Get all employees"""
@@ -176,9 +367,20 @@ class TrackTikClient:
         }
         return self.get_paginated_data('/rest/v1/employees', params)
         
+    def _get_reference_data(self, endpoint: str, params: Dict[str, Any]) -> List[Dict]:
+        """Get slowly changing reference data, through the cache when one is attached"""
+        if self.cache is None:
+            return self.get_paginated_data(endpoint, params)
+        
+        return self.cache.get(
+            endpoint, params,
+            fetch=lambda query: self.get_paginated_data(endpoint, query),
+            modified_field=config.TRACKTIK_MODIFIED_FIELD
+        )
+        
     def get_clients(self, **kwargs) -> List[Dict]:
         """Get all clients/sites"""
-        return self.get_paginated_data('/rest/v1/clients', kwargs)
+        return self._get_reference_data('/rest/v1/clients', kwargs)
         
     def get_positions(self, account_id: int = None, **kwargs) -> List[Dict]:
         """Get all positions, optionally filtered by account/client ID"""
@@ -191,7 +393,65 @@ class TrackTikClient:
         if account_id:
             params['account.id'] = account_id
             
-        return self.get_paginated_data('/rest/v1/positions', params)
+        return self._get_reference_data('/rest/v1/positions', params)
+    
+    def get_positions_for_accounts(self, account_ids: List[int], chunk_size: int = None,
+                                   max_workers: int = None, **kwargs) -> List[Dict]:
+        """
+        Get the positions of many accounts/clients with batched account.id:in filters
+        
+        Chunks are requested concurrently and merged into one list, de-duplicated
+        by position id. A chunk that fails is retried once on its own; if it
+        fails again the error is raised rather than returning a partial list.
+        
+        Args:
+            account_ids: Account/client IDs
+            chunk_size: IDs per request (default config.ACCOUNT_FILTER_CHUNK_SIZE)
+            max_workers: Concurrent chunk requests (default config.ACCOUNT_FILTER_WORKERS)
+            **kwargs: Additional parameters
+            
+        Returns:
+            List of position records
+        """
+        chunk_size = chunk_size or config.ACCOUNT_FILTER_CHUNK_SIZE
+        max_workers = max_workers or config.ACCOUNT_FILTER_WORKERS
+        
+        unique_ids = sorted(set(account_ids))
+        chunks = [unique_ids[i:i + chunk_size] for i in range(0, len(unique_ids), chunk_size)]
+        if not chunks:
+            return []
+        
+        def _fetch_chunk(chunk: List[int]) -> List[Dict]:
+            params = {
+                'include': 'account',
+                'account.id:in': ','.join(map(str, chunk)),
+                **kwargs
+            }
+            return self._get_reference_data('/rest/v1/positions', params)
+        
+        all_positions = []
+        seen_ids = set()
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks)),
+                                thread_name_prefix='tracktik-positions') as executor:
+            futures = [executor.submit(_fetch_chunk, chunk) for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                try:
+                    positions = future.result()
+                except Exception as e:
+                    logger.warning(f"Error getting positions for accounts {chunk[0]}..{chunk[-1]}: {e}, retrying")
+                    positions = _fetch_chunk(chunk)
+                
+                for position in positions:
+                    position_id = position.get('id')
+                    if position_id is not None:
+                        if position_id in seen_ids:
+                            continue
+                        seen_ids.add(position_id)
+                    all_positions.append(position)
+        
+        logger.info(f"Retrieved {len(all_positions)} positions for {len(unique_ids)} accounts "
+                   f"in {len(chunks)} requests")
+        return all_positions
     
     def get_regions(self, **kwargs) -> List[Dict]:
         """Get all regions from TrackTik API"""
@@ -199,7 +459,7 @@ class TrackTikClient:
             'include': 'parentRegion',  # Include parent region data
             **kwargs
         }
-        return self.get_paginated_data('/rest/v1/regions', params)
+        return self._get_reference_data('/rest/v1/regions', params)
     
     def get_specific_shift(self, shift_id: int) -> Dict:
         """Get a specific shift by ID with full details"""
@@ -208,12 +468,7 @@ class TrackTikClient:
             'include': 'employee,position,account,summary'
         }
         
-        response = self.session.get(
-            f"{self.base_url}{endpoint}",
-            headers=self._get_headers(),
-            params=params
-        )
-        response.raise_for_status()
+        response = self._get(endpoint, params)
         
         data = response.json()
         return data.get('data', {})
@@ -3,13 +3,19 @@
 Data transformation logic - Updated for Schema Alignment
 """
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 import pytz
 import json
 
+import numpy as np
+import pandas as pd
+
 logger = logging.getLogger(__name__)
 
+# Shared encoder for raw payloads (skips json.dumps' per-call setup)
+_json_encoder = json.JSONEncoder(check_circular=False)
+
 
 class DataTransformer:
     """Transform TrackTik API data to warehouse schema"""
@@ -205,12 +211,145 @@ class DataTransformer:
             # Status
             'status': api_data.get('status'),
             
-            # Store complete API response as JSONB
+            # Complete API response (stored in raw_shift_payloads, not on fact_shifts)
             'raw_data': json.dumps(api_data),
         }
         
         return transformed_shift
     
+    # (output column, API field) pairs for the hours columns of fact_shifts
+    SHIFT_HOURS_FIELDS = [
+        ('scheduled_hours', 'plannedDurationHours'),
+        ('clocked_hours', 'clockedHours'),
+        ('approved_hours', 'approvedHours'),
+        ('billable_hours', 'billableHours'),
+    ]
+    
+    @staticmethod
+    def transform_shifts_batch(shifts: List[Dict], billing_period_id: str,
+                               position_client_map: Optional[Dict[int, Optional[int]]] = None,
+                               include_raw: bool = True) -> pd.DataFrame:
+        """
+        Transform a page (or any list) of shifts from API to fact format in one pass
+        
+        Columnar counterpart of transform_shift: timestamps are parsed, numbers
+        coerced and client IDs joined from `position_client_map` per column
+        rather than per shift. Values that can't be parsed become nulls.
+        start/end datetimes are UTC instants, and shift_date is the local
+        (wall-clock) date of the start, as in transform_shift. The frame can
+        be passed straight to DatabaseManager.copy_fact_shifts.
+        
+        Args:
+            shifts: Raw shift records from the API
+            billing_period_id: Billing period the shifts belong to
+            position_client_map: position_id -> client_id; client_id is null
+                when omitted or when a position is not in the map
+            include_raw: Add the raw_data (JSON payload) column
+            
+        Returns:
+            DataFrame with one row per shift and nullable typed columns
+        """
+        records = [shift for shift in shifts if isinstance(shift, dict)]
+        if len(records) < len(shifts):
+            logger.error(f"Skipped {len(shifts) - len(records)} shift records that are not dicts")
+        
+        def field(name: str) -> List[Any]:
+            return [record.get(name) for record in records]
+        
+        def id_column(name: str) -> pd.Series:
+            # Expanded (include=...) references arrive as objects with an id
+            values = [value.get('id') if isinstance(value, dict) else value for value in field(name)]
+            return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').astype('Int64')
+        
+        def number_column(name: str) -> pd.Series:
+            return pd.to_numeric(pd.Series(field(name), dtype=object), errors='coerce').astype('float64')
+        
+        frame = pd.DataFrame(index=pd.RangeIndex(len(records)))
+        frame['shift_id'] = id_column('id')
+        frame['billing_period_id'] = billing_period_id
+        frame['employee_id'] = id_column('employee')
+        frame['position_id'] = id_column('position')
+        frame['client_id'] = (
+            frame['position_id'].map(position_client_map).astype('Int64')
+            if position_client_map else pd.Series(pd.NA, index=frame.index, dtype='Int64')
+        )
+        
+        local_start, frame['start_datetime'] = DataTransformer._parse_iso_timestamps(field('startDateTime'))
+        _, frame['end_datetime'] = DataTransformer._parse_iso_timestamps(field('endDateTime'))
+        frame['shift_date'] = local_start.dt.normalize()
+        
+        for output_column, api_field in DataTransformer.SHIFT_HOURS_FIELDS:
+            frame[output_column] = number_column(api_field)
+        frame['payable_hours'] = number_column('payableHours').fillna(number_column('plannedPayableHours'))
+        
+        frame['status'] = pd.Series(field('status'), dtype=object)
+        
+        if include_raw:
+            frame['raw_data'] = [_json_encoder.encode(record) for record in records]
+        
+        return frame
+    
+    @staticmethod
+    def _parse_iso_timestamps(values: List[Any]) -> Tuple[pd.Series, pd.Series]:
+        """
+        Parse ISO 8601 timestamps column-wise
+        
+        The first 19 characters (local wall-clock time) are parsed by numpy in
+        one call; the fractional seconds and UTC offset that follow are parsed
+        once per distinct suffix. Unparseable values become NaT.
+        
+        Returns:
+            (local wall-clock times, UTC instants)
+        """
+        text = [value if isinstance(value, str) else '' for value in values]
+        try:
+            local = np.array([value[:19] for value in text], dtype='datetime64[s]')
+        except ValueError:
+            # Fall back to per-value parsing when some value isn't plain ISO
+            local = np.array([DataTransformer._parse_local(value) for value in text], dtype='datetime64[s]')
+        
+        suffixes = {}
+        parsed = []
+        for value in text:
+            suffix = value[19:]
+            if suffix not in suffixes:
+                suffixes[suffix] = DataTransformer._parse_timestamp_suffix(suffix)
+            parsed.append(suffixes[suffix])
+        
+        fraction_us, offset_minutes = (np.array(column, dtype='float64') for column in zip(*parsed)) \
+            if parsed else (np.array([], dtype='float64'),) * 2
+        
+        local_series = pd.Series(local.astype('datetime64[us]')) + pd.to_timedelta(fraction_us, unit='us')
+        utc = local_series - pd.to_timedelta(offset_minutes, unit='m')
+        return local_series, utc.dt.tz_localize('UTC')
+    
+    @staticmethod
+    def _parse_local(value: str) -> Optional[datetime]:
+        """Wall-clock part of one ISO timestamp, or None"""
+        try:
+            return datetime.fromisoformat(value).replace(tzinfo=None)
+        except (ValueError, TypeError):
+            return None
+    
+    @staticmethod
+    def _parse_timestamp_suffix(suffix: str) -> Tuple[float, Optional[float]]:
+        """
+        (microseconds, minutes east of UTC) from what follows the seconds of
+        an ISO timestamp, e.g. '.123-07:00' or 'Z'; the offset is None if unreadable
+        """
+        fraction = suffix[1:len(suffix) - len(suffix[1:].lstrip('0123456789'))] if suffix.startswith('.') else ''
+        microseconds = float(fraction[:6].ljust(6, '0')) if fraction else 0.0
+        offset = suffix[len(fraction) + 1:] if fraction else suffix
+        
+        if offset in ('', 'Z'):
+            return microseconds, 0.0
+        try:
+            sign = -1 if offset[0] == '-' else 1
+            hours, _, minutes = offset[1:].partition(':')
+            return microseconds, float(sign * (int(hours[:2]) * 60 + int(minutes or hours[2:4] or 0)))
+        except (ValueError, IndexError):
+            return microseconds, None
+    
     @staticmethod
     def _safe_float(value: Any) -> Optional[float]:
         """Safely convert value to float, return None if not possible"""
@@ -0,0 +1,109 @@
+"""
+Thread-safe PostgreSQL connection pool with health checks and prepared statements
+"""
+import re
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """Pool connection that remembers its prepared statements and when it was last used"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+        self.idle_since = time.monotonic()
+
+
+class HealthCheckedPool(ThreadedConnectionPool):
+    """ThreadedConnectionPool that waits for a free connection and checks it first
+    
+    Keeps `minconn` connections open between uses (ThreadedConnectionPool closes
+    any connection returned beyond that). A checkout beyond `maxconn` waits up to
+    `timeout` seconds instead of raising PoolError. Connections that are closed,
+    lost, or fail a `SELECT 1` after `check_idle_after` idle seconds are
+    discarded and replaced.
+    """
+    
+    def __init__(self, minconn: int, maxconn: int, *args, timeout: float = 60,
+                 check_idle_after: float = 30, **kwargs):
+        kwargs.setdefault('connection_factory', PooledConnection)
+        self.timeout = timeout
+        self.check_idle_after = check_idle_after
+        self._slots = threading.BoundedSemaphore(maxconn)
+        super().__init__(minconn, maxconn, *args, **kwargs)
+    
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed or conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - getattr(conn, 'idle_since', 0) < self.check_idle_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+    
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolError(f"No database connection free after {self.timeout}s")
+        try:
+            # Each discarded connection frees its place, so this ends with a fresh connect
+            for _ in range(self.maxconn + 1):
+                conn = super().getconn(key)
+                if self._is_healthy(conn):
+                    return conn
+                logger.warning("Discarding broken database connection")
+                super().putconn(conn, key, close=True)
+            raise PoolError("Could not get a healthy database connection")
+        except BaseException:
+            self._slots.release()
+            raise
+    
+    def putconn(self, conn, key=None, close=False):
+        try:
+            conn.idle_since = time.monotonic()
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+
+class PreparedStatement:
+    """A pyformat query as a server-side prepared statement
+    
+    %(name)s placeholders become $1..$n; the statement name is derived from
+    the query text, so the same query maps to the same name on every connection.
+    """
+    
+    _PLACEHOLDER = re.compile(r'%\((\w+)\)s')
+    
+    def __init__(self, query: str):
+        self.query = query
+        self.name = 'etl_' + hashlib.md5(query.encode('utf-8')).hexdigest()[:16]
+        self.params: List[str] = []
+        
+        def _positional(match):
+            if match.group(1) not in self.params:
+                self.params.append(match.group(1))
+            return f'${self.params.index(match.group(1)) + 1}'
+        
+        body = self._PLACEHOLDER.sub(_positional, query).replace('%%', '%')
+        self.prepare_sql = f'PREPARE {self.name} AS {body}'
+        self.execute_sql = f'EXECUTE {self.name}'
+        if self.params:
+            self.execute_sql += f" ({', '.join(['%s'] * len(self.params))})"
+    
+    def args(self, params: Dict[str, Any]) -> List[Any]:
+        """Positional EXECUTE arguments from a params dict"""
+        return [params[name] for name in self.params]
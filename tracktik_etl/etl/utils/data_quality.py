@@ -0,0 +1,173 @@
+"""
+Rule-based data quality checks evaluated column-wise on a batch
+"""
+import json
+import os
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..config import config
+
+logger = logging.getLogger(__name__)
+
+HOURS_COLUMNS = ['scheduled_hours', 'clocked_hours', 'approved_hours', 'billable_hours', 'payable_hours']
+
+# Shift statuses accepted by default: DataTransformer.validate_shift_data's list
+# plus PENDING, which the benchmark and test shift generators produce
+SHIFT_STATUSES = ['SCHEDULED', 'IN_PROGRESS', 'PENDING', 'COMPLETED', 'APPROVED', 'CANCELLED']
+
+# Per table: `key` identifies the record in data_quality_issues.record_id,
+# `required` columns must be present and non-empty, `range` columns must lie
+# within [min, max] when set, `allowed` columns must hold one of the values when set
+DEFAULT_RULES: Dict[str, Dict[str, Any]] = {
+    'fact_shifts': {
+        'key': 'shift_id',
+        'required': ['shift_id', 'billing_period_id', 'employee_id', 'position_id', 'client_id', 'shift_date'],
+        'range': {column: [0, 24] for column in HOURS_COLUMNS},
+        # ETL_DQ_RULES_FILE can replace the list as new statuses show up (see load_rules)
+        'allowed': {'status': SHIFT_STATUSES}
+    },
+    'dim_employees': {
+        'key': 'employee_id',
+        'required': ['employee_id', 'first_name', 'last_name']
+    },
+    'dim_clients': {
+        'key': 'client_id',
+        'required': ['client_id', 'name']
+    },
+    'dim_positions': {
+        'key': 'position_id',
+        'required': ['position_id', 'name', 'client_id']
+    }
+}
+
+ISSUE_COLUMNS = ['record_index', 'record_id', 'issue_type', 'field', 'value', 'details']
+
+
+def load_rules(path: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    DEFAULT_RULES overlaid with a JSON rules file, if one is configured
+
+    The file maps table names to rule sets; each rule kind given for a table
+    (key, required, range, allowed) replaces the default for that table, e.g.
+    {"fact_shifts": {"allowed": {"status": ["APPROVED", "COMPLETED"]}}}
+    """
+    path = path or config.DQ_RULES_FILE
+    rules = {table: dict(table_rules) for table, table_rules in DEFAULT_RULES.items()}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            overrides = json.load(f)
+        for table, table_rules in overrides.items():
+            rules[table] = {**rules.get(table, {}), **table_rules}
+        logger.info(f"Loaded data quality rules for {len(overrides)} tables from {path}")
+    return rules
+
+
+class DataQualityValidator:
+    """Evaluate per-table rules on a whole batch with vectorised masks
+
+    Each rule is one boolean mask over a column, so the cost grows with the
+    number of rules rather than rows x fields; Python only runs for the rows
+    that fail (to describe them):
+
+        issues = validator.validate('fact_shifts', frame)
+    """
+
+    def __init__(self, rules: Dict[str, Dict[str, Any]] = None):
+        self.rules = rules if rules is not None else load_rules()
+
+    def validate(self, table: str, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Check a batch against the table's rules
+
+        Args:
+            table: Table the batch is loaded into (tables without rules pass)
+            frame: The batch, one row per record
+
+        Returns:
+            DataFrame with one row per failed check (ISSUE_COLUMNS); record_index
+            is the row's index label in `frame`
+        """
+        rules = self.rules.get(table)
+        if not rules or frame.empty:
+            return pd.DataFrame(columns=ISSUE_COLUMNS)
+
+        key = rules.get('key')
+        found = []
+
+        for field in rules.get('required', []):
+            if field not in frame:
+                mask = np.ones(len(frame), dtype=bool)
+            else:
+                values = frame[field]
+                mask = values.isna().to_numpy(dtype=bool, copy=True)
+                if isinstance(values.dtype, pd.StringDtype):
+                    mask |= values.str.strip().eq('').fillna(False).to_numpy(dtype=bool)
+                elif values.dtype == object:
+                    mask |= values.map(lambda value: isinstance(value, str) and not value.strip()).to_numpy(dtype=bool)
+            found.append(self._issues(frame, key, mask, field, 'missing_required_field',
+                                      f"Required field '{field}' is missing or null"))
+
+        for field, (minimum, maximum) in rules.get('range', {}).items():
+            if field not in frame:
+                continue
+            values = pd.to_numeric(frame[field], errors='coerce')
+            mask = ((values < minimum) | (values > maximum)).to_numpy(dtype=bool)
+            found.append(self._issues(frame, key, mask, field, 'out_of_range',
+                                      f"Invalid {field} (must be {minimum}-{maximum}): "))
+
+        for field, allowed in rules.get('allowed', {}).items():
+            if field not in frame:
+                continue
+            values = frame[field]
+            mask = (values.notna() & ~values.isin(allowed)).to_numpy(dtype=bool)
+            found.append(self._issues(frame, key, mask, field, 'invalid_value',
+                                      f"Invalid {field}: "))
+
+        found = [issues for issues in found if issues is not None]
+        if not found:
+            return pd.DataFrame(columns=ISSUE_COLUMNS)
+        return pd.concat(found, ignore_index=True)
+
+    @staticmethod
+    def _record_ids(values: pd.Series) -> np.ndarray:
+        """Key values as strings or None (integral floats from records with gaps lose their '.0')"""
+        if pd.api.types.is_float_dtype(values):
+            try:
+                values = values.astype('Int64')
+            except (TypeError, ValueError):
+                pass
+        values = values.astype('string')
+        return values.astype(object).where(values.notna(), None).to_numpy()
+
+    @staticmethod
+    def _issues(frame: pd.DataFrame, key: Optional[str], mask: np.ndarray, field: str,
+                issue_type: str, details: str) -> Optional[pd.DataFrame]:
+        """Issue rows for the rows flagged by `mask`; details get the offending value appended unless it is a full sentence"""
+        positions = np.flatnonzero(mask)
+        if not len(positions):
+            return None
+
+        values = frame[field].iloc[positions] if field in frame else pd.Series(None, index=positions, dtype=object)
+        values = values.astype(object).where(values.notna(), None)
+        if details.endswith(': '):
+            details = details + values.astype(str)
+        return pd.DataFrame({
+            'record_index': frame.index[positions],
+            'record_id': DataQualityValidator._record_ids(frame[key].iloc[positions]) if key in frame else None,
+            'issue_type': issue_type,
+            'field': field,
+            'value': values.to_numpy(),
+            'details': details.to_numpy() if isinstance(details, pd.Series) else details
+        })
+
+    @staticmethod
+    def issue_data(issues: pd.DataFrame) -> List[str]:
+        """JSON for data_quality_issues.issue_data: field, offending value and row of each issue"""
+        return [
+            json.dumps({'field': field, 'value': value, 'record_index': index}, default=str)
+            for field, value, index in zip(issues['field'], issues['value'].tolist(), issues['record_index'].tolist())
+        ]
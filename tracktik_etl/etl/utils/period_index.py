@@ -0,0 +1,116 @@
+"""
+In-memory interval index over billing_periods
+"""
+import bisect
+import threading
+import time
+import logging
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DateLike = Union[date, datetime, str]
+
+
+class BillingPeriodIndex:
+    """Date -> billing period lookups without a database round-trip
+
+    Periods are loaded lazily on first use (and again after `invalidate` or
+    once `max_age_seconds` pass) through `loader`, which returns rows with
+    period_id, start_date and end_date. Lookups bisect the sorted start dates;
+    `lookup_many` does the same for whole arrays with numpy.searchsorted.
+    Safe to share between threads.
+    """
+
+    def __init__(self, loader: Callable[[], List[Dict[str, Any]]], max_age_seconds: float = 3600):
+        self._loader = loader
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._loaded_at = 0.0
+
+    def invalidate(self):
+        """Drop the loaded periods; the next lookup reloads them"""
+        with self._lock:
+            self._snapshot = None
+
+    def _get_snapshot(self) -> Tuple[List[date], List[date], List[str], Dict[str, Tuple[date, date]]]:
+        """Current (starts, ends, period_ids, dates_by_id), loading it if needed"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._loaded_at < self.max_age_seconds:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is None or time.monotonic() - self._loaded_at >= self.max_age_seconds:
+                rows = sorted(self._loader(), key=lambda row: row['start_date'])
+                starts = [row['start_date'] for row in rows]
+                ends = [row['end_date'] for row in rows]
+                period_ids = [row['period_id'] for row in rows]
+                dates_by_id = {row['period_id']: (row['start_date'], row['end_date']) for row in rows}
+                self._snapshot = (starts, ends, period_ids, dates_by_id)
+                self._loaded_at = time.monotonic()
+                logger.debug(f"Loaded {len(rows)} billing periods into the period index")
+            return self._snapshot
+
+    @staticmethod
+    def _to_date(value: DateLike) -> date:
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        return date.fromisoformat(str(value)[:10])
+
+    def lookup(self, value: DateLike) -> Optional[str]:
+        """Billing period ID containing a date, or None if no period covers it"""
+        starts, ends, period_ids, _ = self._get_snapshot()
+        day = self._to_date(value)
+
+        i = bisect.bisect_right(starts, day) - 1
+        if i >= 0 and day <= ends[i]:
+            return period_ids[i]
+        return None
+
+    def lookup_many(self, values: Iterable[DateLike]) -> np.ndarray:
+        """
+        Vectorized lookup for an array of dates
+
+        Accepts a numpy datetime64 array, a pandas Series/Index or any iterable
+        of dates, datetimes or ISO strings.
+
+        Returns:
+            Object array of period IDs, None where no period covers the date
+        """
+        starts, ends, period_ids, _ = self._get_snapshot()
+
+        if hasattr(values, 'dt') and getattr(values.dt, 'tz', None) is not None:
+            # Timezone-aware pandas values: periods follow the local (wall-clock) date
+            values = values.dt.tz_localize(None)
+
+        if isinstance(values, np.ndarray) and np.issubdtype(values.dtype, np.datetime64):
+            days = values.astype('datetime64[D]')
+        elif hasattr(values, 'to_numpy') and np.issubdtype(getattr(values, 'dtype', object), np.datetime64):
+            days = values.to_numpy().astype('datetime64[D]')
+        else:
+            days = np.array([self._to_date(value) for value in values], dtype='datetime64[D]')
+
+        result = np.full(days.shape, None, dtype=object)
+        if not period_ids or days.size == 0:
+            return result
+
+        start_array = np.array(starts, dtype='datetime64[D]')
+        end_array = np.array(ends, dtype='datetime64[D]')
+
+        positions = np.searchsorted(start_array, days, side='right') - 1
+        clipped = np.clip(positions, 0, None)
+        found = (positions >= 0) & (days <= end_array[clipped])
+
+        result[found] = np.array(period_ids, dtype=object)[clipped[found]]
+        return result
+
+    def get_dates(self, period_id: str) -> Optional[Tuple[date, date]]:
+        """(start_date, end_date) of a billing period, or None if unknown"""
+        _, _, _, dates_by_id = self._get_snapshot()
+        return dates_by_id.get(period_id)
@@ -0,0 +1,60 @@
+"""
+Background prefetching for page iterators
+"""
+import queue
+import threading
+import logging
+from typing import Iterable, Iterator, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+_DONE = object()
+
+
+def prefetch(iterable: Iterable[T], depth: int = 1) -> Iterator[T]:
+    """
+    Drive an iterator from a background thread, staying up to `depth` items ahead
+
+    Lets the caller work on one page while the next request is in flight.
+    Exceptions raised by the producer are re-raised in the consumer, and
+    closing the returned generator early stops the producer thread.
+    """
+    buffer = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def _put(item) -> bool:
+        # Poll so a consumer that stops early never leaves us blocked forever
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            for item in iterable:
+                if not _put((item, None)):
+                    return
+        except Exception as e:
+            _put((_DONE, e))
+            return
+        _put((_DONE, None))
+
+    producer = threading.Thread(target=_produce, name='prefetch', daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        producer.join(timeout=1)
@@ -2,45 +2,317 @@
 """
 Rate limiting and checkpoint management for API calls
 """
+import asyncio
 import time
 import json
 import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime
 from typing import Dict, Any, Optional
 import logging
 
+from ..config import config
+
 logger = logging.getLogger(__name__)
 
 
 class RateLimiter:
-    """Preemptive rate limiter with adaptive backoff"""
+    """Preemptive rate limiter with adaptive backoff
+    
+    Safe to share between threads: each caller reserves the next free call
+    slot under a lock and sleeps outside of it, so one instance can act as a
+    single API budget for several workers.
+    """
     
     def __init__(self, calls_per_minute: int = 60):
         self.calls_per_minute = calls_per_minute
         self.min_interval = 60.0 / calls_per_minute
         self.last_call_time = None
         self.consecutive_errors = 0
+        self._lock = threading.Lock()
         
     def wait_if_needed(self):
         """Wait if necessary to maintain rate limit"""
-        if self.last_call_time:
-            elapsed = time.time() - self.last_call_time
-            if elapsed < self.min_interval:
-                sleep_time = self.min_interval - elapsed
-                # Add extra time if we've had errors
-                if self.consecutive_errors > 0:
-                    sleep_time *= (1.5 ** self.consecutive_errors)
-                time.sleep(sleep_time)
+        with self._lock:
+            now = time.time()
+            interval = self.min_interval
+            # Add extra time if we've had errors
+            if self.consecutive_errors > 0:
+                interval *= (1.5 ** self.consecutive_errors)
+            
+            next_slot = now
+            if self.last_call_time:
+                next_slot = max(now, self.last_call_time + interval)
+            self.last_call_time = next_slot
         
-        self.last_call_time = time.time()
+        sleep_time = next_slot - now
+        if sleep_time > 0:
+            time.sleep(sleep_time)
     
     def record_success(self):
         """Reset error counter on successful call"""
-        self.consecutive_errors = 0
+        with self._lock:
+            self.consecutive_errors = 0
     
-    def record_error(self):
+    def record_error(self, retry_after: Optional[float] = None):
         """Increment error counter for adaptive backoff"""
-        self.consecutive_errors = min(self.consecutive_errors + 1, 5)  # Cap at 5
+        with self._lock:
+            self.consecutive_errors = min(self.consecutive_errors + 1, 5)  # Cap at 5
+    
+    def update_from_headers(self, headers):
+        """Fixed-rate limiter ignores server headers (see TokenBucketRateLimiter)"""
+        pass
+    
+    @contextmanager
+    def in_flight(self):
+        """Fixed-rate limiter doesn't cap concurrent requests (see TokenBucketRateLimiter)"""
+        yield
+
+
+class TokenBucketRateLimiter:
+    """Token bucket that learns TrackTik's real budget from rate-limit headers
+    
+    Drop-in for RateLimiter (wait_if_needed / record_success / record_error),
+    plus acquire_async() for asyncio tasks and update_from_headers() to feed
+    it X-RateLimit-Limit / -Remaining / -Reset from each response.
+    
+    Callers reserve a token under a lock and sleep outside it, so one instance
+    can be shared by threads and tasks. Pass `state_path` to keep the bucket in
+    a small locked JSON file instead, which shares one budget between processes.
+    
+    With `max_in_flight`, callers also hold one of that many request slots
+    for the duration of each call (in_flight / in_flight_async). With a
+    state file the slots are lock files next to it, so the cap holds across
+    processes; a slot held by a process that dies is released with it.
+    """
+    
+    SLOT_POLL_INTERVAL = 0.05  # seconds between attempts to take a request slot
+    
+    def __init__(self, calls_per_minute: int = 60, burst: int = 10, state_path: Optional[str] = None,
+                 max_in_flight: Optional[int] = None):
+        self.state_path = state_path
+        self.max_in_flight = max_in_flight
+        self._slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight and not state_path else None
+        self._lock = threading.Lock()
+        self._initial_state = {
+            'tokens': float(burst),
+            'capacity': float(burst),
+            'rate': calls_per_minute / 60.0,  # tokens per second
+            'updated_at': time.time(),
+            'blocked_until': 0.0,
+            'consecutive_errors': 0
+        }
+        self._local_state = dict(self._initial_state)
+    
+    @contextmanager
+    def _state(self):
+        """Yield the bucket state with exclusive access (thread- and, with a file, process-wide)"""
+        with self._lock:
+            if not self.state_path:
+                yield self._local_state
+                return
+            
+            with _file_lock(f"{self.state_path}.lock"):
+                state = None
+                if os.path.exists(self.state_path):
+                    try:
+                        with open(self.state_path, 'r') as f:
+                            state = json.load(f)
+                    except (OSError, ValueError):
+                        state = None
+                if state is None:
+                    state = dict(self._initial_state)
+                
+                yield state
+                
+                with open(self.state_path, 'w') as f:
+                    json.dump(state, f)
+    
+    @staticmethod
+    def _refill(state: Dict[str, Any], now: float):
+        """Add the tokens earned since the last update"""
+        elapsed = max(0.0, now - state['updated_at'])
+        state['tokens'] = min(state['capacity'], state['tokens'] + elapsed * state['rate'])
+        state['updated_at'] = now
+    
+    def _reserve(self) -> float:
+        """Take one token (possibly on credit) and return how long to wait before using it"""
+        with self._state() as state:
+            now = time.time()
+            self._refill(state, now)
+            state['tokens'] -= 1
+            
+            wait = max(0.0, state['blocked_until'] - now)
+            if state['tokens'] < 0:
+                wait = max(wait, -state['tokens'] / state['rate'])
+            return wait
+    
+    def wait_if_needed(self):
+        """Block until a call may be made"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+    
+    async def acquire_async(self):
+        """Wait until a call may be made without blocking the event loop"""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+    
+    def _try_slot(self):
+        """Take a free request slot without waiting; returns a handle for _release_slot, or None"""
+        if self._slots is not None:
+            return self._slots if self._slots.acquire(blocking=False) else None
+        
+        for index in range(self.max_in_flight):
+            slot = _try_file_lock(f"{self.state_path}.slot{index}")
+            if slot is not None:
+                return slot
+        return None
+    
+    def _release_slot(self, slot):
+        if slot is self._slots:
+            self._slots.release()
+        else:
+            _release_file_lock(slot)
+    
+    @contextmanager
+    def in_flight(self):
+        """Hold a request slot while the block runs (no-op without max_in_flight)"""
+        if not self.max_in_flight:
+            yield
+            return
+        
+        slot = self._try_slot()
+        while slot is None:
+            time.sleep(self.SLOT_POLL_INTERVAL)
+            slot = self._try_slot()
+        try:
+            yield
+        finally:
+            self._release_slot(slot)
+    
+    @asynccontextmanager
+    async def in_flight_async(self):
+        """in_flight for asyncio tasks, waiting without blocking the event loop"""
+        if not self.max_in_flight:
+            yield
+            return
+        
+        slot = self._try_slot()
+        while slot is None:
+            await asyncio.sleep(self.SLOT_POLL_INTERVAL)
+            slot = self._try_slot()
+        try:
+            yield
+        finally:
+            self._release_slot(slot)
+    
+    def update_from_headers(self, headers):
+        """Learn the server's budget from X-RateLimit-* response headers"""
+        limit = _header_number(headers, 'X-RateLimit-Limit')
+        remaining = _header_number(headers, 'X-RateLimit-Remaining')
+        reset = _header_number(headers, 'X-RateLimit-Reset')
+        
+        if limit is None and remaining is None:
+            return
+        
+        with self._state() as state:
+            now = time.time()
+            self._refill(state, now)
+            
+            if limit:
+                state['capacity'] = limit
+                state['rate'] = limit / config.RATE_LIMIT_WINDOW
+            
+            if remaining is not None:
+                # The server also counts other clients, so never hold more than it reports
+                state['tokens'] = min(state['tokens'], remaining - config.RATE_LIMIT_RESERVE)
+                
+                if remaining <= config.RATE_LIMIT_RESERVE and reset:
+                    # Reset is either an epoch timestamp or seconds until the window resets
+                    reset_at = reset if reset > 1e9 else now + reset
+                    state['blocked_until'] = max(state['blocked_until'], reset_at)
+                    logger.warning(f"Rate limit nearly exhausted ({remaining:.0f} remaining), "
+                                   f"pausing until window resets in {reset_at - now:.0f}s")
+    
+    def record_success(self):
+        """Reset error counter on successful call"""
+        with self._state() as state:
+            state['consecutive_errors'] = 0
+    
+    def record_error(self, retry_after: Optional[float] = None):
+        """Back off after a throttled call (honours Retry-After when given)"""
+        with self._state() as state:
+            state['consecutive_errors'] = min(state['consecutive_errors'] + 1, 5)  # Cap at 5
+            delay = retry_after if retry_after is not None else config.RETRY_DELAY * (2 ** (state['consecutive_errors'] - 1))
+            state['blocked_until'] = max(state['blocked_until'], time.time() + delay)
+            state['tokens'] = min(state['tokens'], 0.0)
+
+
+def _header_number(headers, name: str) -> Optional[float]:
+    """Read a numeric header, returning None if missing or malformed"""
+    value = headers.get(name) if headers is not None else None
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@contextmanager
+def _file_lock(lock_path: str):
+    """Exclusive inter-process lock on a small lock file"""
+    with open(lock_path, 'a+') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _try_file_lock(lock_path: str):
+    """Exclusive inter-process lock on a lock file without waiting; the open file, or None if it is held"""
+    f = open(lock_path, 'a+')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def _release_file_lock(f):
+    """Release a lock taken by _try_file_lock"""
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    finally:
+        f.close()
 
 
 class CheckpointManager:
@@ -63,11 +335,36 @@ class CheckpointManager:
         checkpoint_path = self.get_checkpoint_path(billing_period, region)
         data['last_updated'] = datetime.now().isoformat()
         
-        with open(checkpoint_path, 'w') as f:
+        # Write-then-rename so a crash mid-write never leaves a truncated checkpoint
+        tmp_path = f"{checkpoint_path}.tmp"
+        with open(tmp_path, 'w') as f:
             json.dump(data, f, indent=2)
+        os.replace(tmp_path, checkpoint_path)
         
         logger.debug(f"Checkpoint saved for {region}: {checkpoint_path}")
     
+    def save_page_checkpoint(self, billing_period: str, region: str, data: Dict[str, Any],
+                             next_offset: int, shift_ids) -> Dict[str, Any]:
+        """
+        Record that the page ending at `next_offset` has been committed
+        
+        Args:
+            billing_period: Billing period ID
+            region: Region name
+            data: Checkpoint data for this region (updated in place)
+            next_offset: Offset of the first page not yet loaded
+            shift_ids: IDs of the shifts from the page that were written
+            
+        Returns:
+            The updated checkpoint data
+        """
+        loaded = set(data.get('loaded_shift_ids', []))
+        loaded.update(shift_ids)
+        data['loaded_shift_ids'] = sorted(loaded)
+        data['next_offset'] = next_offset
+        self.save_checkpoint(billing_period, region, data)
+        return data
+    
     def load_checkpoint(self, billing_period: str, region: str) -> Optional[Dict[str, Any]]:
         """Load checkpoint if exists"""
         checkpoint_path = self.get_checkpoint_path(billing_period, region)
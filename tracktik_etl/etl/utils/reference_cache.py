@@ -0,0 +1,203 @@
+"""
+Reference data cache for slowly changing TrackTik endpoints (clients, positions, regions)
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from ..config import config
+from .watermark import after_filter_value, filter_ignored, latest_modified, to_utc
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceDataCache:
+    """Two-tier (memory + disk) cache keyed by endpoint and query parameters
+
+    Entries are served from memory until `ttl_seconds` pass. After that, if
+    the records carry a modification timestamp, only records modified since
+    the newest one we hold (in UTC, minus INCREMENTAL_OVERLAP_MINUTES) are
+    fetched and merged in; otherwise (or once `full_refresh_seconds` pass)
+    the entry is downloaded again in full. A delta that shows the API ignored
+    the `:after` filter replaces the entry like a full download.
+    Entries are mirrored to JSON files so a new process starts warm.
+
+    Cached records are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, cache_dir: str = None, ttl_seconds: int = None,
+                 full_refresh_seconds: int = None):
+        self.cache_dir = cache_dir or config.REFERENCE_CACHE_DIR
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else config.REFERENCE_CACHE_TTL
+        self.full_refresh_seconds = (
+            full_refresh_seconds if full_refresh_seconds is not None
+            else config.REFERENCE_CACHE_FULL_REFRESH
+        )
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    @staticmethod
+    def make_key(endpoint: str, params: Dict[str, Any] = None) -> str:
+        """Build a stable cache key from endpoint and parameters"""
+        return f"{endpoint}?{json.dumps(params or {}, sort_keys=True, default=str)}"
+
+    def _get_path(self, key: str) -> str:
+        """Disk location for a cache key"""
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"reference_{digest}.json")
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        """One lock per key so concurrent workers share a single download"""
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def get(self, endpoint: str, params: Dict[str, Any],
+            fetch: Callable[[Dict[str, Any]], List[Dict]],
+            modified_field: Optional[str] = None) -> List[Dict]:
+        """
+        Return cached records, refreshing them through `fetch` when stale
+
+        Args:
+            endpoint: API endpoint the records come from
+            params: Query parameters (part of the cache key)
+            fetch: Called with query parameters to download records
+            modified_field: Record field holding the last-modified timestamp;
+                enables `<field>:after` incremental refreshes
+
+        Returns:
+            List of records
+        """
+        key = self.make_key(endpoint, params)
+
+        with self._key_lock(key):
+            self.evict_expired()
+
+            now = time.time()
+            entry = self._entries.get(key) or self._load_entry(key)
+
+            if entry and now - entry['fetched_at'] < self.ttl_seconds:
+                return list(entry['records'].values())
+
+            can_refresh_incrementally = (
+                entry is not None
+                and modified_field
+                and to_utc(entry.get('watermark')) is not None
+                and now - entry['full_fetched_at'] < self.full_refresh_seconds
+            )
+
+            if can_refresh_incrementally:
+                since = to_utc(entry['watermark']) - timedelta(minutes=config.INCREMENTAL_OVERLAP_MINUTES)
+                delta_params = dict(params or {})
+                delta_params[f'{modified_field}:after'] = after_filter_value(since)
+                changed = fetch(delta_params)
+                logger.info(f"Reference cache: {len(changed)} changed records for {endpoint}")
+
+                records = entry['records']
+                if filter_ignored(changed, modified_field, since, f"Reference cache refresh of {endpoint}"):
+                    # What came back is the full set, so it replaces the entry
+                    records = {str(record.get('id')): record for record in changed}
+                    entry['full_fetched_at'] = now
+                else:
+                    if len(changed) >= len(records) > 1:
+                        logger.warning(f"Reference cache: delta refresh of {endpoint} returned {len(changed)} records, "
+                                       f"as many as the whole entry holds - the '{modified_field}:after' filter "
+                                       f"may be ignored (check TRACKTIK_MODIFIED_FIELD)")
+                    for record in changed:
+                        records[str(record.get('id'))] = record
+                entry['records'] = records
+                newest = latest_modified(changed, modified_field)
+                if newest and newest > to_utc(entry['watermark']):
+                    entry['watermark'] = newest.isoformat()
+                entry['fetched_at'] = now
+            else:
+                fetched = fetch(dict(params or {}))
+                logger.info(f"Reference cache: loaded {len(fetched)} records for {endpoint}")
+                entry = {
+                    'key': key,
+                    'records': {str(record.get('id')): record for record in fetched},
+                    'watermark': self._watermark(fetched, modified_field),
+                    'fetched_at': now,
+                    'full_fetched_at': now
+                }
+
+            self._entries[key] = entry
+            self._save_entry(key, entry)
+            return list(entry['records'].values())
+
+    @staticmethod
+    def _watermark(records: List[Dict], modified_field: Optional[str]) -> Optional[str]:
+        """Newest modification time among the records, as UTC ISO text (None = no incremental refresh)"""
+        newest = latest_modified(records, modified_field) if modified_field else None
+        return newest.isoformat() if newest else None
+
+    def _load_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """Load an entry from the disk tier, ignoring anything too old to refresh"""
+        path = self._get_path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable reference cache file {path}: {e}")
+            return None
+
+        if entry.get('key') != key or time.time() - entry['full_fetched_at'] >= self.full_refresh_seconds:
+            return None
+
+        self._entries[key] = entry
+        return entry
+
+    def _save_entry(self, key: str, entry: Dict[str, Any]):
+        """Write an entry to the disk tier atomically"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._get_path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write reference cache for {key}: {e}")
+
+    def evict_expired(self):
+        """Drop in-memory entries that are past their full refresh window"""
+        cutoff = time.time() - self.full_refresh_seconds
+        with self._lock:
+            expired = [k for k, e in self._entries.items() if e['full_fetched_at'] < cutoff]
+            for key in expired:
+                del self._entries[key]
+
+    def invalidate(self, endpoint: str = None):
+        """Forget cached entries (all of them, or those for one endpoint)"""
+        with self._lock:
+            keys = [k for k in self._entries if endpoint is None or k.startswith(f"{endpoint}?")]
+            for key in keys:
+                del self._entries[key]
+
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if not name.startswith('reference_'):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                if endpoint is not None:
+                    try:
+                        with open(path, 'r') as f:
+                            if not json.load(f).get('key', '').startswith(f"{endpoint}?"):
+                                continue
+                    except (OSError, ValueError):
+                        pass
+                os.remove(path)
+
+
+# Shared cache for every TrackTik client in the ETL
+reference_cache = ReferenceDataCache()
@@ -0,0 +1,163 @@
+"""
+Stage-level timing spans for ETL runs
+"""
+import os
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+RUN = 'run'      # Region label for run-level stages (not tied to one region)
+TOTAL = 'total'  # Pseudo-region summing every region
+
+
+class Span:
+    """Counters filled in by the code inside a StageTimer.span block"""
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+
+    def add(self, rows: int = 0, bytes: int = 0):
+        self.rows += rows
+        self.bytes += bytes
+
+
+class StageTimer:
+    """Accumulate calls, rows, bytes and wall time per (region, stage)
+
+    Spans from concurrent region workers are recorded under a lock, so one
+    timer can be shared by a whole run:
+
+        with timer.span('load_facts', region) as span:
+            result = db.copy_fact_shifts(rows)
+            span.add(rows=len(rows))
+    """
+
+    METRICS = ('calls', 'rows', 'bytes', 'seconds')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+    def record(self, stage: str, region: Optional[str] = None, seconds: float = 0.0,
+               calls: int = 1, rows: int = 0, bytes: int = 0):
+        """Add one measurement to a stage"""
+        region = region or RUN
+        with self._lock:
+            stage_stats = self._stats.setdefault(region, {}).setdefault(
+                stage, {metric: 0 for metric in self.METRICS}
+            )
+            stage_stats['calls'] += calls
+            stage_stats['rows'] += rows
+            stage_stats['bytes'] += bytes
+            stage_stats['seconds'] += seconds
+
+    @contextmanager
+    def span(self, stage: str, region: Optional[str] = None) -> Iterator[Span]:
+        """Time a block as one call of `stage`; the block fills in rows/bytes on the Span"""
+        span = Span()
+        started = time.perf_counter()
+        try:
+            yield span
+        finally:
+            self.record(stage, region, time.perf_counter() - started, rows=span.rows, bytes=span.bytes)
+
+    def timed_iter(self, stage: str, iterable: Iterable[T], region: Optional[str] = None) -> Iterator[T]:
+        """
+        Yield from `iterable`, charging the time spent waiting for each item to `stage`
+
+        Time the consumer spends between items is not counted. Calls, rows and
+        bytes are left for the caller to record (e.g. HTTP requests and bytes
+        from the client).
+        """
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.record(stage, region, time.perf_counter() - started, calls=0)
+                return
+            self.record(stage, region, time.perf_counter() - started, calls=0)
+            yield item
+
+    def region_summary(self, region: str) -> Dict[str, Dict[str, float]]:
+        """{stage: {calls, rows, bytes, seconds}} for one region"""
+        with self._lock:
+            return {stage: dict(stats) for stage, stats in self._stats.get(region, {}).items()}
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """{region: {stage: stats}} including a 'total' region summed over all regions"""
+        with self._lock:
+            result = {region: {stage: dict(stats) for stage, stats in stages.items()}
+                      for region, stages in self._stats.items()}
+
+        totals = {}
+        for stages in result.values():
+            for stage, stats in stages.items():
+                total = totals.setdefault(stage, {metric: 0 for metric in self.METRICS})
+                for metric in self.METRICS:
+                    total[metric] += stats[metric]
+
+        for stages in list(result.values()) + [totals]:
+            for stats in stages.values():
+                stats['seconds'] = round(stats['seconds'], 3)
+        result[TOTAL] = totals
+        return result
+
+    @staticmethod
+    def _label_value(value: Any) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def write_prometheus(self, path: str, labels: Dict[str, Any] = None) -> str:
+        """
+        Write the per-region stage metrics as a Prometheus textfile
+
+        Intended for node_exporter's textfile collector: the file is written
+        under a temporary name and renamed, so a scrape never sees half of it.
+        `labels` (e.g. period_id) are added to every sample.
+
+        Returns:
+            The path written
+        """
+        labels = labels or {}
+        summary = self.summary()
+        summary.pop(TOTAL)
+
+        lines = []
+        for metric, help_text in (
+            ('seconds', 'Wall time spent in the stage during the last run'),
+            ('calls', 'Operations (requests, queries, batches) made by the stage'),
+            ('rows', 'Rows handled by the stage'),
+            ('bytes', 'Bytes handled by the stage'),
+        ):
+            name = f'tracktik_etl_stage_{metric}'
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            for region, stages in sorted(summary.items()):
+                for stage, stats in sorted(stages.items()):
+                    sample_labels = {**labels, 'region': region, 'stage': stage}
+                    label_text = ','.join(f'{key}="{self._label_value(value)}"' for key, value in sample_labels.items())
+                    lines.append(f'{name}{{{label_text}}} {stats[metric]}')
+
+        lines.append('# HELP tracktik_etl_last_run_timestamp_seconds When these metrics were written')
+        lines.append('# TYPE tracktik_etl_last_run_timestamp_seconds gauge')
+        label_text = ','.join(f'{key}="{self._label_value(value)}"' for key, value in labels.items())
+        lines.append(f'tracktik_etl_last_run_timestamp_seconds{{{label_text}}} {time.time():.0f}')
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
+
+        logger.info(f"Wrote stage metrics to {path}")
+        return path
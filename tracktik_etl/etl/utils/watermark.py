@@ -0,0 +1,80 @@
+"""
+Modification watermarks for TrackTik `<field>:after` filters
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def to_utc(value) -> Optional[datetime]:
+    """
+    A timestamp as an aware UTC datetime
+
+    Accepts datetimes and ISO 8601 strings (with 'Z' or an offset). Naive
+    values are taken to be local time, which is how older watermarks were
+    written. Returns None for missing or unparseable values.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.astimezone()
+    return value.astimezone(timezone.utc)
+
+
+def after_filter_value(since: datetime) -> str:
+    """`<field>:after` filter value for a point in time (UTC, ISO 8601 with offset)"""
+    return to_utc(since).isoformat(timespec='seconds')
+
+
+def latest_modified(records: Iterable[Dict], modified_field: str) -> Optional[datetime]:
+    """Newest modification time among the records (compared in UTC), or None if none carry one"""
+    values = [to_utc(record.get(modified_field)) for record in records if isinstance(record, dict)]
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def filter_ignored(records: Iterable[Dict], modified_field: str, since: datetime, what: str) -> bool:
+    """
+    Warn if a response filtered with `<modified_field>:after` shows the filter had no effect
+
+    TrackTik ignores filters on fields it doesn't know, which would quietly turn
+    an incremental read into a full one. That shows in the data: the records
+    either carry no such field, or include ones modified before `since`.
+
+    Args:
+        records: Records returned for the filtered request (e.g. its first page)
+        modified_field: Field the filter was on
+        since: Cut-off the filter asked for
+        what: Description of the request for the log message
+
+    Returns:
+        True if the filter was evidently ignored
+    """
+    records = [record for record in records if isinstance(record, dict)]
+    if not records:
+        return False
+
+    cutoff = to_utc(since)
+    values = [to_utc(record.get(modified_field)) for record in records]
+    if all(value is None for value in values):
+        logger.warning(f"{what}: records carry no '{modified_field}' field, so the "
+                       f"'{modified_field}:after' filter is probably ignored and this is a full read "
+                       f"(check TRACKTIK_MODIFIED_FIELD)")
+        return True
+
+    older = sum(1 for value in values if value is not None and value < cutoff)
+    if older:
+        logger.warning(f"{what}: {older} of {len(records)} records were modified before "
+                       f"{cutoff:%Y-%m-%d %H:%M} UTC, so the '{modified_field}:after' filter was ignored "
+                       f"and this is a full read (check TRACKTIK_MODIFIED_FIELD)")
+        return True
+    return False
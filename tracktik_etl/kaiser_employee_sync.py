@@ -7,7 +7,7 @@ import os
 import sys
 from datetime import datetime
 import logging
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set, Tuple
 from dotenv import load_dotenv
 
 # Add the parent directory to path for imports
@@ -53,6 +53,9 @@ class KaiserEmployeeSync:
         "Northwest"
     ]
     
+    # Fields tracked for SCD Type 2 changes in dim_employees
+    EMPLOYEE_SCD_FIELDS = ['custom_id', 'first_name', 'last_name', 'email', 'phone', 'status', 'region_id']
+    
     def __init__(self):
         self.client = TrackTikClient()
         self.kaiser_region_mapping = {}
@@ -149,45 +152,114 @@ class KaiserEmployeeSync:
             logger.error(f"Error transforming employee {employee.get('id', 'unknown')}: {e}")
             raise
     
-    def update_employee_record(self, employee_data: Dict) -> str:
-        """Update or insert employee record using SCD Type 2. Returns 'updated' or 'inserted'"""
-        employee_id = employee_data['employee_id']
+    def get_current_employees(self, cursor, region_id: int, employee_ids: List[int]) -> Dict[int, Dict]:
+        """
+        Snapshot current dim_employees rows for a region in one query
         
-        try:
-            # Prepare data for SCD Type 2 upsert
-            scd_data = {
-                'employee_id': employee_data['employee_id'],
-                'custom_id': employee_data['custom_id'],
-                'first_name': employee_data['first_name'],
-                'last_name': employee_data['last_name'],
-                'email': employee_data['email'],
-                'phone': employee_data['phone'],
-                'status': employee_data['status'],
-                'region_id': employee_data['region_id'],
-                'valid_from': datetime.now(),
-                'is_current': True,
-                'etl_batch_id': getattr(self, 'batch_id', None)
-            }
-            
-            # Use the existing SCD Type 2 logic from your models
-            result = db.upsert_dimension(
-                table='dim_employees',
-                records=[scd_data],
-                id_field='employee_id',
-                scd_fields=['custom_id', 'first_name', 'last_name', 'email', 'phone', 'status', 'region_id']
+        Includes rows currently assigned to the region plus any of
+        `employee_ids` (employees moving in from another region). The rows
+        are locked until the caller's transaction ends.
+        """
+        db.execute_prepared(cursor, f"""
+            SELECT employee_id, {', '.join(self.EMPLOYEE_SCD_FIELDS)}
+            FROM {config.POSTGRES_SCHEMA}.dim_employees
+            WHERE is_current = TRUE
+            AND (region_id = %(region_id)s OR employee_id = ANY(%(employee_ids)s))
+            FOR UPDATE
+        """, {'region_id': region_id, 'employee_ids': employee_ids})
+        return {row['employee_id']: row for row in cursor.fetchall()}
+    
+    @classmethod
+    def _scd_key(cls, record: Dict) -> Tuple[Optional[str], ...]:
+        """SCD field values compared as trimmed text, as db.upsert_dimension does"""
+        return tuple(
+            None if record.get(field) is None else str(record.get(field)).strip()
+            for field in cls.EMPLOYEE_SCD_FIELDS
+        )
+    
+    def diff_employees(self, employees_data: List[Dict],
+                       current: Dict[int, Dict]) -> Tuple[List[Dict], List[int], List[int]]:
+        """
+        Classify transformed employees against the current snapshot
+        
+        Returns:
+            (records to insert - new employees and new versions of changed ones,
+             IDs whose current version must be closed, IDs that are unchanged)
+        """
+        # Last record wins if the API returned an employee twice
+        latest = {employee['employee_id']: employee for employee in employees_data}
+        
+        inserts = []
+        closed_ids = []
+        unchanged_ids = []
+        for employee_id, employee in latest.items():
+            existing = current.get(employee_id)
+            if existing is None:
+                inserts.append(employee)
+            elif self._scd_key(existing) != self._scd_key(employee):
+                closed_ids.append(employee_id)
+                inserts.append(employee)
+            else:
+                unchanged_ids.append(employee_id)
+        
+        return inserts, closed_ids, unchanged_ids
+    
+    def bulk_sync_employees(self, region_id: int, employees_data: List[Dict]) -> Dict[str, int]:
+        """
+        SCD Type 2 sync of a region's employees in a single transaction
+        
+        The region's current rows are snapshotted in one query and diffed in
+        memory; changed versions are closed with one UPDATE, unchanged rows
+        pick up the batch id with another, and new versions are COPYed in.
+        Closed and new versions share one timestamp, so they never overlap.
+        
+        Returns:
+            Dict with counts of inserted, updated, and unchanged employees
+        """
+        if not employees_data:
+            return {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        
+        target = f"{config.POSTGRES_SCHEMA}.dim_employees"
+        batch_id = getattr(self, 'batch_id', None)
+        
+        with db.get_cursor() as cursor:
+            current = self.get_current_employees(
+                cursor, region_id, list({employee['employee_id'] for employee in employees_data})
             )
+            inserts, closed_ids, unchanged_ids = self.diff_employees(employees_data, current)
             
-            # Determine what happened
-            if result['inserted'] > 0:
-                return 'inserted'
-            elif result['updated'] > 0:
-                return 'updated'
-            else:
-                return 'unchanged'
-                
-        except Exception as e:
-            logger.error(f"Error updating employee {employee_id}: {e}")
-            raise
+            cursor.execute("SELECT CURRENT_TIMESTAMP AS now")
+            now = cursor.fetchone()['now']
+            
+            if closed_ids:
+                cursor.execute(f"""
+                    UPDATE {target}
+                    SET valid_to = %(now)s, is_current = FALSE, updated_at = %(now)s
+                    WHERE employee_id = ANY(%(employee_ids)s) AND is_current = TRUE
+                """, {'now': now, 'employee_ids': closed_ids})
+            
+            if unchanged_ids and batch_id:
+                cursor.execute(f"""
+                    UPDATE {target}
+                    SET etl_batch_id = %(batch_id)s, updated_at = %(now)s
+                    WHERE employee_id = ANY(%(employee_ids)s) AND is_current = TRUE
+                """, {'now': now, 'batch_id': batch_id, 'employee_ids': unchanged_ids})
+            
+            if inserts:
+                columns = ['employee_id'] + self.EMPLOYEE_SCD_FIELDS + ['valid_from', 'is_current', 'etl_batch_id']
+                db.copy_rows(
+                    cursor, target, columns,
+                    ([employee.get(field) for field in ['employee_id'] + self.EMPLOYEE_SCD_FIELDS]
+                     + [now, True, batch_id] for employee in inserts)
+                )
+        
+        result = {
+            'inserted': len(inserts) - len(closed_ids),
+            'updated': len(closed_ids),
+            'unchanged': len(unchanged_ids)
+        }
+        logger.info(f"Dimension dim_employees: {result}")
+        return result
     
     def sync_region_employees(self, region_name: str) -> Dict:
         """Sync all employees for a specific region"""
@@ -213,37 +285,24 @@ class KaiserEmployeeSync:
                 logger.warning(f"No employees found for region {region_name}")
                 return region_stats
             
-            # Process each employee
+            # Transform each employee
+            employees_data = []
             for employee in employees:
                 try:
-                    # Transform data
-                    employee_data = self.transform_employee_data(employee, region_name)
-                    
-                    # Update/insert record
-                    operation = self.update_employee_record(employee_data)
-                    
-                    if operation == 'updated':
-                        region_stats['employees_updated'] += 1
-                    elif operation == 'inserted':
-                        region_stats['employees_inserted'] += 1
-                    else:  # unchanged
-                        region_stats['employees_unchanged'] += 1
-                        
-                    self.sync_stats['total_employees_processed'] += 1
-                    
-                    # Log progress every 100 employees
-                    total_processed = (region_stats['employees_updated'] + 
-                                     region_stats['employees_inserted'] + 
-                                     region_stats['employees_unchanged'])
-                    if total_processed % 100 == 0:
-                        logger.info(f"  Processed {total_processed} employees...")
-                    
+                    employees_data.append(self.transform_employee_data(employee, region_name))
                 except Exception as e:
                     error_msg = f"Error processing employee {employee.get('id', 'unknown')} in {region_name}: {e}"
                     logger.error(error_msg)
                     region_stats['errors'] += 1
                     self.sync_stats['errors'].append(error_msg)
             
+            # Diff against the current rows and apply all changes in one transaction
+            result = self.bulk_sync_employees(self.kaiser_region_mapping[region_name], employees_data)
+            region_stats['employees_inserted'] = result['inserted']
+            region_stats['employees_updated'] = result['updated']
+            region_stats['employees_unchanged'] = result['unchanged']
+            self.sync_stats['total_employees_processed'] += sum(result.values())
+            
             # Log region completion
             logger.info(f"✅ {region_name} completed:")
             logger.info(f"  Retrieved: {region_stats['employees_retrieved']}")
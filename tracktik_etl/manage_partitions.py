@@ -0,0 +1,67 @@
+# manage_partitions.py
+"""
+Maintain fact_shifts partitions: pre-create upcoming billing periods and
+archive expired ones to Parquet
+"""
+import os
+import sys
+from datetime import datetime
+import logging
+from dotenv import load_dotenv
+
+# Add the parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Ensure logs directory exists
+os.makedirs('logs', exist_ok=True)
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(
+            f'logs/manage_partitions_{datetime.now():%Y%m%d_%H%M%S}.log',
+            encoding='utf-8'
+        ),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+load_dotenv()
+
+from tracktik_etl.etl.config import config
+from tracktik_etl.etl.partition_manager import PartitionManager
+
+
+def main():
+    """Run partition maintenance (schedule daily or before each period starts)"""
+
+    PERIODS_AHEAD = config.PARTITION_PERIODS_AHEAD    # Current period plus this many upcoming ones
+    RETENTION_DAYS = config.PARTITION_RETENTION_DAYS  # Archive partitions whose period ended before this
+    ARCHIVE_DIR = config.PARTITION_ARCHIVE_DIR
+    DROP_AFTER_EXPORT = False  # True drops detached partitions once exported
+    DRY_RUN = False            # True only reports what would be archived
+
+    manager = PartitionManager()
+
+    try:
+        result = manager.run(
+            periods_ahead=PERIODS_AHEAD,
+            retention_days=RETENTION_DAYS,
+            archive_dir=ARCHIVE_DIR,
+            drop=DROP_AFTER_EXPORT,
+            dry_run=DRY_RUN
+        )
+
+        print(f"\n✅ Partitions ready: {', '.join(result['prepared']) or 'none'}")
+        print(f"📦 {'Would archive' if DRY_RUN else 'Archived'}: {', '.join(result['archived']) or 'none'}")
+
+    except Exception as e:
+        print(f"\n❌ Partition maintenance failed: {e}")
+        logging.exception("Fatal error in partition maintenance")
+        raise
+
+
+if __name__ == "__main__":
+    main()
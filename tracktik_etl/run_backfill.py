@@ -0,0 +1,74 @@
+# run_backfill.py
+"""
+Backfill a range of KAISER billing periods in parallel processes
+"""
+import os
+import sys
+from datetime import datetime
+import logging
+from dotenv import load_dotenv
+
+# Add the parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Ensure logs directory exists
+os.makedirs('logs', exist_ok=True)
+
+# Setup logging (worker processes re-run this and log to their own file)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(
+            f'logs/backfill_{datetime.now():%Y%m%d_%H%M%S}_{os.getpid()}.log',
+            encoding='utf-8'
+        ),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+load_dotenv()
+
+from tracktik_etl.etl.config import config
+from tracktik_etl.etl.backfill import BackfillOrchestrator
+
+
+def main():
+    """Backfill KAISER billing periods"""
+
+    FIRST_PERIOD_ID = "2025_01"
+    LAST_PERIOD_ID = "2025_13"
+    PROCESSES = config.BACKFILL_PROCESSES          # Periods loaded at once
+    API_IN_FLIGHT = config.BACKFILL_API_IN_FLIGHT  # TrackTik requests in flight across all processes
+    INCREMENTAL = False  # True = only shifts changed since each period's last run
+
+    print(f"""
+╔══════════════════════════════════════════════════════════╗
+║           KAISER Billing Period Backfill                 ║
+║                                                          ║
+║  Periods: {FIRST_PERIOD_ID} to {LAST_PERIOD_ID}                             ║
+║  Processes: {PROCESSES:<3}  API requests in flight: {API_IN_FLIGHT:<4}        ║
+╚══════════════════════════════════════════════════════════╝
+    """)
+
+    orchestrator = BackfillOrchestrator(processes=PROCESSES, api_in_flight=API_IN_FLIGHT)
+
+    try:
+        result = orchestrator.run(FIRST_PERIOD_ID, LAST_PERIOD_ID, incremental=INCREMENTAL)
+
+        print(f"\n✅ Backfill finished (batch {result['batch_id']}): {result['total_shifts']:,} shifts")
+        for period in result['periods']:
+            print(f"  {period['period_id']}: {period['status']:<9} {period.get('total_shifts', 0):>8,} shifts")
+
+        if result['failed'] or result['skipped']:
+            print(f"\n⚠️  Failed: {', '.join(result['failed']) or 'none'}; "
+                  f"skipped (locked): {', '.join(result['skipped']) or 'none'}")
+
+    except Exception as e:
+        print(f"\n❌ Backfill failed: {e}")
+        logging.exception("Fatal error in backfill")
+        raise
+
+
+if __name__ == "__main__":
+    main()
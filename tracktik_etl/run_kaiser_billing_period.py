@@ -29,7 +29,9 @@ logging.basicConfig(
 
 load_dotenv()
 
+from tracktik_etl.etl.database import db
 from tracktik_etl.etl.etl_pipeline import ETLPipeline
+from tracktik_etl.etl.models import BillingPeriod
 
 
 def main():
@@ -39,6 +41,8 @@ def main():
     PERIOD_ID = "2025_08"  # This is what your pipeline expects
     START_DATE = "2025-04-04"
     END_DATE = "2025-04-17"
+    MAX_WORKERS = 1  # Set > 1 to process regions concurrently
+    INCREMENTAL = False  # True = only shifts changed since the last run (hourly refresh); False for period close
     
     print(f"""
 ╔══════════════════════════════════════════════════════════╗
@@ -50,27 +54,36 @@ def main():
 ╚══════════════════════════════════════════════════════════╝
     """)
     
-    pipeline = ETLPipeline()
-    
-    try:
-        # Process the billing period
-        stats = pipeline.process_kaiser_billing_period(PERIOD_ID)
-        
-        # Display results (the pipeline already prints a nice summary)
-        print("\n✅ Processing completed successfully!")
+    # Same per-period lock as the pipeline and backfill workers: a run that
+    # overlaps another load of this period (e.g. a slow hourly refresh) exits
+    with db.advisory_lock(BillingPeriod.lock_name(PERIOD_ID)) as acquired:
+        if not acquired:
+            print(f"\n⏭️  Period {PERIOD_ID} is already being loaded by another run - skipping")
+            return
         
-        # Additional summary if needed
-        if stats.get('errors'):
-            print(f"\n⚠️  Errors encountered: {len(stats['errors'])}")
-            for error in stats['errors']:
-                print(f"  - {error}")
-        else:
-            print("\n🎉 No errors - all regions processed successfully!")
+        pipeline = ETLPipeline()
         
-    except Exception as e:
-        print(f"\n❌ Processing failed: {e}")
-        logging.exception("Fatal error in processing")
-        raise
+        try:
+            # Process the billing period
+            stats = pipeline.process_kaiser_billing_period(
+                PERIOD_ID, max_workers=MAX_WORKERS, incremental=INCREMENTAL
+            )
+            
+            # Display results (the pipeline already prints a nice summary)
+            print("\n✅ Processing completed successfully!")
+            
+            # Additional summary if needed
+            if stats.get('errors'):
+                print(f"\n⚠️  Errors encountered: {len(stats['errors'])}")
+                for error in stats['errors']:
+                    print(f"  - {error}")
+            else:
+                print("\n🎉 No errors - all regions processed successfully!")
+            
+        except Exception as e:
+            print(f"\n❌ Processing failed: {e}")
+            logging.exception("Fatal error in processing")
+            raise
 
 
 if __name__ == "__main__":
@@ -0,0 +1,88 @@
+# run_replay_server.py
+"""
+Record TrackTik fixtures, or serve them from a local stand-in API
+
+Serve mode needs no credentials; point the ETL at it with
+TRACKTIK_BASE_URL=http://127.0.0.1:<PORT> (any client id/secret works).
+"""
+import os
+import sys
+from datetime import datetime
+import logging
+from dotenv import load_dotenv
+
+# Add the parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Ensure logs directory exists
+os.makedirs('logs', exist_ok=True)
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(
+            f'logs/replay_server_{datetime.now():%Y%m%d_%H%M%S}.log',
+            encoding='utf-8'
+        ),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+load_dotenv()
+
+from tracktik_etl.etl.config import config
+from tracktik_etl.etl.replay_server import TrackTikReplayServer, record_fixtures
+
+
+def main():
+    """Record fixtures from the live tenant, or replay them"""
+
+    RECORD = False  # True = fetch fixtures from the live API (needs credentials); False = serve them
+    FIXTURE_DIR = config.REPLAY_FIXTURE_DIR
+    START_DATE = "2025-05-30"  # Shifts recorded (at most 31 days)
+    END_DATE = "2025-06-12"
+
+    PORT = 8765
+    LATENCY = 0.15          # Seconds per response, roughly the live API
+    LATENCY_JITTER = 0.05   # Extra random seconds per response
+    RATE_LIMIT = 300        # Requests per window (None = unlimited)
+    RATE_LIMIT_WINDOW = 60  # Seconds
+    SCALE = 1               # Serve every recorded shift SCALE times
+
+    if RECORD:
+        from tracktik_etl.etl.tracktik_client import TrackTikClient
+
+        counts = record_fixtures(TrackTikClient(), FIXTURE_DIR, START_DATE, END_DATE)
+        print(f"\n✅ Recorded fixtures to {FIXTURE_DIR}:")
+        for resource, count in counts.items():
+            print(f"  {resource:<10}: {count:,}")
+        return
+
+    server = TrackTikReplayServer(
+        FIXTURE_DIR, port=PORT, latency=LATENCY, latency_jitter=LATENCY_JITTER,
+        rate_limit=RATE_LIMIT, rate_limit_window=RATE_LIMIT_WINDOW, scale=SCALE
+    )
+
+    print(f"""
+╔══════════════════════════════════════════════════════════╗
+║           TrackTik Replay Server                         ║
+║                                                          ║
+║  export TRACKTIK_BASE_URL={server.base_url:<31}║
+║  Latency: {LATENCY * 1000:.0f}ms  Rate limit: {RATE_LIMIT}/{RATE_LIMIT_WINDOW}s  Scale: x{SCALE:<10}║
+╚══════════════════════════════════════════════════════════╝
+    """)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        stats = server.get_stats()
+        print(f"\nServed {stats['total_requests']:,} requests "
+              f"({stats['throttled_requests']:,} throttled): {stats['requests']}")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# tests/conftest.py
+"""
+Shared fixtures for the TrackTik ETL unit tests
+
+Most tests need neither the TrackTik API nor PostgreSQL; they import the
+etl package the same way the scripts in tracktik_etl/ do. Tests using the
+`warehouse` fixture run against a scratch database created on the configured
+server (PGHOST/PGPORT/PGUSER) and are skipped when there is none.
+"""
+import os
+import sys
+
+import pytest
+
+# Add the repository root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# The pool opens its connections lazily, so the etl modules import without a server
+os.environ.setdefault('ETL_DB_POOL_SIZE', '0')
+
+# Schema applied to the scratch database (e.g. a copy without the contrib extensions)
+SCHEMA_FILE = os.getenv(
+    'ETL_TEST_SCHEMA_FILE',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'create_schema.sql')
+)
+
+
+@pytest.fixture(scope='session')
+def warehouse():
+    """The shared DatabaseManager, pointed at a scratch database with the schema applied"""
+    import psycopg2
+
+    from tracktik_etl.benchmark_load import create_database, drop_database
+    from tracktik_etl.etl.config import config
+    from tracktik_etl.etl.database import db
+    from tracktik_etl.etl.utils.connection_pool import HealthCheckedPool
+
+    database = f'tracktik_etl_test_{os.getpid()}'
+    try:
+        create_database(database, SCHEMA_FILE)
+    except psycopg2.Error as e:
+        drop_database_quietly(drop_database, database)
+        pytest.skip(f"Could not create a scratch database: {str(e).strip()}")
+
+    saved = (config.POSTGRES_DB, config.POSTGRES_SCHEMA, db.pool)
+    config.POSTGRES_DB = database
+    config.POSTGRES_SCHEMA = 'tracktik'
+    db.pool = HealthCheckedPool(
+        1, config.DB_POOL_MAX,
+        host=config.POSTGRES_HOST, port=config.POSTGRES_PORT, database=database,
+        user=config.POSTGRES_USER, password=config.POSTGRES_PASSWORD
+    )
+    db._known_partitions.clear()
+    db.period_index.invalidate()
+    try:
+        yield db
+    finally:
+        db.pool.closeall()
+        config.POSTGRES_DB, config.POSTGRES_SCHEMA, db.pool = saved
+        db._known_partitions.clear()
+        db.period_index.invalidate()
+        drop_database(database)
+
+
+def drop_database_quietly(drop_database, database: str):
+    """Drop a half-created scratch database, if the server is there at all"""
+    try:
+        drop_database(database)
+    except Exception:
+        pass
+
+
+@pytest.fixture
+def batch_id(warehouse):
+    """A fresh etl_batches row for the test's writes"""
+    from tracktik_etl.etl.models import ETLBatch
+    return ETLBatch.create_batch('TEST')
+
+
+@pytest.fixture
+def period(warehouse):
+    """The first billing period in the schema, with its fact_shifts partition"""
+    row = warehouse.execute_query(
+        "SELECT period_id, start_date, end_date FROM tracktik.billing_periods ORDER BY start_date LIMIT 1"
+    )[0]
+    warehouse.ensure_shift_partitions([row['period_id']])
+    return row
+
+
+def make_shifts(count: int, start_id: int = 1000):
+    """Minimal shift records on 2025-06-01, in the shape the replay server filters on"""
+    return [
+        {
+            'id': start_id + i,
+            'startDateTime': '2025-06-01T08:00:00-07:00',
+            'endDateTime': '2025-06-01T16:00:00-07:00',
+            'status': 'APPROVED'
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def replay_server(tmp_path, monkeypatch):
+    """A TrackTikReplayServer serving 250 shifts in pages of 50, as config.TRACKTIK_BASE_URL"""
+    import json
+
+    from tracktik_etl.etl.config import config
+    from tracktik_etl.etl.replay_server import TrackTikReplayServer
+
+    with open(tmp_path / 'shifts.json', 'w', encoding='utf-8') as f:
+        json.dump({'resource': 'shifts', 'data': make_shifts(250)}, f)
+
+    monkeypatch.setattr(config, 'API_PAGE_SIZE', 50)
+    with TrackTikReplayServer(str(tmp_path)) as server:
+        monkeypatch.setattr(config, 'TRACKTIK_BASE_URL', server.base_url)
+        yield server
@@ -0,0 +1,51 @@
+# tests/test_async_tracktik_client.py
+"""
+asyncio TrackTik client and its blocking AsyncExtractor front end, against the replay server
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from tracktik_etl.etl.async_tracktik_client import AsyncExtractor, AsyncTrackTikClient
+from tracktik_etl.etl.config import config
+
+
+def test_get_shifts_reads_every_page(replay_server):
+    async def fetch():
+        async with AsyncTrackTikClient() as client:
+            return await client.get_shifts('2025-06-01', '2025-06-12')
+
+    shifts = asyncio.run(fetch())
+
+    assert [s['id'] for s in shifts] == list(range(1000, 1250))
+    assert replay_server.get_stats()['requests'] == {'oauth': 1, 'shifts': 5}
+
+
+def test_extractor_yields_pages_in_offset_order(replay_server, monkeypatch):
+    monkeypatch.setattr(config, 'ASYNC_PAGE_FAN_OUT', 3)
+    usage = {'calls': 0, 'bytes': 0}
+    extractor = AsyncExtractor()
+    try:
+        pages = list(extractor.iter_shift_pages('2025-06-01', '2025-06-12', usage=usage))
+    finally:
+        extractor.close()
+
+    assert [offset for offset, _ in pages] == [0, 50, 100, 150, 200]
+    assert [s['id'] for _, page in pages for s in page] == list(range(1000, 1250))
+    assert usage['calls'] == 5 and usage['bytes'] > 0
+
+
+def test_extractor_resumes_and_stops_early(replay_server):
+    extractor = AsyncExtractor()
+    try:
+        pages = extractor.iter_shift_pages('2025-06-01', '2025-06-12', start_offset=100)
+        offset, shifts = next(pages)
+        pages.close()  # Cancels the pages already in flight
+    finally:
+        extractor.close()
+
+    assert offset == 100
+    assert shifts[0]['id'] == 1100
+    assert not extractor._thread.is_alive()
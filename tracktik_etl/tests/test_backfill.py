@@ -0,0 +1,114 @@
+# tests/test_backfill.py
+"""
+Backfill sizing, period ranges and the per-period advisory lock
+"""
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from tracktik_etl.etl.backfill import BackfillOrchestrator, _backfill_period
+from tracktik_etl.etl.config import config
+from tracktik_etl.etl.models import BillingPeriod
+
+
+@pytest.fixture
+def sizing(monkeypatch):
+    monkeypatch.setattr(config, 'MAX_REGION_WORKERS', 4)
+    monkeypatch.setattr(config, 'API_PAGE_FAN_OUT', 4)
+
+
+@pytest.mark.parametrize('api_in_flight, processes, expected', [
+    (16, 4, 1),   # 4 slots per process: one region paging 4 wide
+    (32, 2, 4),   # 16 slots per process, capped at MAX_REGION_WORKERS
+    (16, 1, 4),
+    (6, 4, 1),    # Less than one region's fan-out per process: still one region
+])
+def test_region_workers_fill_each_process_share(sizing, api_in_flight, processes, expected):
+    orchestrator = BackfillOrchestrator(processes=processes, api_in_flight=api_in_flight)
+    assert orchestrator.region_workers_per_process(processes) == expected
+
+
+def test_period_range_is_inclusive_and_ordered(warehouse):
+    periods = [row['period_id'] for row in warehouse.execute_query(
+        "SELECT period_id FROM tracktik.billing_periods ORDER BY start_date LIMIT 5"
+    )]
+
+    assert BillingPeriod.get_period_range(periods[1], periods[3]) == periods[1:4]
+    assert BillingPeriod.get_period_range(periods[2], periods[2]) == [periods[2]]
+    assert BillingPeriod.get_period_range(periods[3], periods[1]) == []
+    with pytest.raises(ValueError):
+        BillingPeriod.get_period_range('1999_01', periods[0])
+
+
+@contextmanager
+def held_elsewhere(warehouse, name):
+    """Hold an advisory lock from another thread (so on another session) while the block runs"""
+    acquired, release = threading.Event(), threading.Event()
+
+    def hold():
+        with warehouse.advisory_lock(name) as ok:
+            assert ok
+            acquired.set()
+            release.wait(timeout=10)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    assert acquired.wait(timeout=10)
+    try:
+        yield
+    finally:
+        release.set()
+        thread.join()
+
+
+def available_elsewhere(warehouse, name):
+    """Whether another thread (so another session) could take the lock right now"""
+    result = {}
+
+    def try_lock():
+        with warehouse.advisory_lock(name) as ok:
+            result['ok'] = ok
+
+    thread = threading.Thread(target=try_lock)
+    thread.start()
+    thread.join()
+    return result['ok']
+
+
+def test_advisory_lock_is_reentrant_within_a_thread(warehouse):
+    with warehouse.advisory_lock('test_lock') as outer:
+        with warehouse.advisory_lock('test_lock') as inner:
+            assert outer and inner
+        # Leaving the inner block doesn't release the outer one
+        assert not available_elsewhere(warehouse, 'test_lock')
+    assert available_elsewhere(warehouse, 'test_lock')
+
+
+def test_pipeline_refuses_a_period_locked_elsewhere(warehouse, period):
+    from tracktik_etl.etl.etl_pipeline import ETLPipeline
+
+    with held_elsewhere(warehouse, BillingPeriod.lock_name(period['period_id'])):
+        with pytest.raises(RuntimeError, match='already being loaded'):
+            ETLPipeline().process_kaiser_billing_period(period['period_id'])
+
+
+def test_backfill_worker_skips_a_locked_period(warehouse, period, monkeypatch, tmp_path):
+    from tracktik_etl.etl.models import ETLBatch
+
+    monkeypatch.setattr(config, 'RATE_LIMIT_STATE_FILE', None)
+    monkeypatch.setattr(config, 'API_MAX_IN_FLIGHT', 0)
+    batch_id = ETLBatch.create_batch('KAISER_BACKFILL', {'periods': {}})
+    options = {'region_workers': 1, 'incremental': False,
+               'rate_limit_state': str(tmp_path / 'bucket.json'), 'api_in_flight': 8}
+
+    with held_elsewhere(warehouse, BillingPeriod.lock_name(period['period_id'])):
+        result = _backfill_period(period['period_id'], batch_id, options)
+
+    assert result['status'] == 'skipped'
+    metadata = warehouse.execute_query(
+        "SELECT metadata FROM tracktik.etl_batches WHERE batch_id = %(b)s", {'b': batch_id}
+    )[0]['metadata']
+    assert metadata['periods'][period['period_id']]['status'] == 'skipped'
+    # Workers share the backfill's request slots
+    assert config.API_MAX_IN_FLIGHT == 8
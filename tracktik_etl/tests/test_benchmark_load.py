@@ -0,0 +1,98 @@
+# tests/test_benchmark_load.py
+"""
+benchmark_load's synthetic data generators and its baseline regression check
+"""
+import json
+import random
+from datetime import date
+
+import pytest
+
+from tracktik_etl.benchmark_load import (
+    check_baseline, iter_shift_batches, load_baseline, make_clients, make_employees, make_positions
+)
+
+
+@pytest.fixture
+def dimensions():
+    random.seed(1)
+    clients = make_clients(5)
+    positions = make_positions(12, clients)
+    employees = make_employees(30)
+    return clients, positions, employees
+
+
+def test_positions_reference_the_generated_clients(dimensions):
+    clients, positions, employees = dimensions
+
+    client_ids = {c['id'] for c in clients}
+    assert len({p['id'] for p in positions}) == 12
+    assert {p['account']['id'] for p in positions} == client_ids
+    assert len({e['id'] for e in employees}) == 30
+
+
+def test_rename_changes_only_last_names():
+    random.seed(2)
+    original = make_employees(200)
+    random.seed(3)
+    renamed = make_employees(200, rename=0.5)
+
+    changed = [a for a, b in zip(original, renamed) if a != b]
+    assert 0 < len(changed) < 200
+    assert all(b['lastName'] == a['lastName'] + '-Changed'
+               for a, b in zip(original, renamed) if a['lastName'] != b['lastName'])
+    assert all({**b, 'lastName': a['lastName']} == a for a, b in zip(original, renamed))
+
+
+def test_shift_batches_are_sized_and_repeatable(dimensions):
+    _, positions, employees = dimensions
+
+    def shifts(seed):
+        return list(iter_shift_batches(25, '2025_01', date(2025, 1, 5), employees, positions,
+                                       'batch', batch_size=10, seed=seed))
+
+    batches = shifts(seed=7)
+
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    rows = [row for batch in batches for row in batch]
+    assert len({row['shift_id'] for row in rows}) == 25
+    assert all(date(2025, 1, 5) <= row['shift_date'] < date(2025, 1, 19) for row in rows)
+    assert all(json.loads(row['raw_data'])['id'] == row['shift_id'] for row in rows)
+    assert shifts(seed=7) == batches
+    assert shifts(seed=8) != batches
+
+
+def result(case, size, rows_per_sec):
+    return {'case': case, 'size': size, 'rows_per_sec': rows_per_sec, 'round_trips': 1, 'wal_bytes': 0}
+
+
+def test_first_run_becomes_the_baseline(tmp_path):
+    baseline_file = str(tmp_path / 'baseline.json')
+
+    regressions = check_baseline([result('load', 100, 500)], {}, baseline_file, tolerance=0.25, update=False)
+
+    assert regressions == []
+    assert load_baseline(baseline_file)['load@100']['rows_per_sec'] == 500
+
+
+def test_only_drops_beyond_the_tolerance_are_regressions(tmp_path):
+    baseline_file = str(tmp_path / 'baseline.json')
+    baseline = {'fast@100': {'rows_per_sec': 1000}, 'slow@100': {'rows_per_sec': 1000}}
+    results = [result('fast', 100, 760), result('slow', 100, 740), result('new', 100, 1)]
+
+    regressions = check_baseline(results, baseline, baseline_file, tolerance=0.25, update=False)
+
+    assert regressions == ['slow@100']
+    # An existing baseline is only rewritten when asked
+    assert load_baseline(baseline_file) == {}
+
+
+def test_update_keeps_cases_that_did_not_run(tmp_path):
+    baseline_file = str(tmp_path / 'baseline.json')
+    baseline = {'other@100': {'rows_per_sec': 10}, 'load@100': {'rows_per_sec': 1000}}
+
+    check_baseline([result('load', 100, 10)], baseline, baseline_file, tolerance=0.25, update=True)
+
+    stored = load_baseline(baseline_file)
+    assert stored['other@100'] == {'rows_per_sec': 10}
+    assert stored['load@100']['rows_per_sec'] == 10
@@ -0,0 +1,57 @@
+# tests/test_checkpoint_manager.py
+"""
+CheckpointManager page checkpoints and resume
+"""
+import os
+
+from tracktik_etl.etl.utils.rate_limiter import CheckpointManager
+
+
+def test_no_checkpoint_before_first_page(tmp_path):
+    manager = CheckpointManager(str(tmp_path))
+
+    assert manager.load_checkpoint('2026-01', 'North Region') is None
+
+
+def test_resume_from_page_checkpoint(tmp_path):
+    manager = CheckpointManager(str(tmp_path))
+    checkpoint = {}
+
+    manager.save_page_checkpoint('2026-01', 'North Region', checkpoint, next_offset=100, shift_ids=[3, 1])
+    manager.save_page_checkpoint('2026-01', 'North Region', checkpoint, next_offset=200, shift_ids=[2, 3])
+
+    # A new run (new manager) picks up where the last committed page ended
+    resumed = CheckpointManager(str(tmp_path)).load_checkpoint('2026-01', 'North Region')
+    assert resumed['next_offset'] == 200
+    assert resumed['loaded_shift_ids'] == [1, 2, 3]
+    assert 'last_updated' in resumed
+
+
+def test_failed_page_keeps_previous_checkpoint(tmp_path):
+    manager = CheckpointManager(str(tmp_path))
+    checkpoint = manager.save_page_checkpoint('2026-01', 'North', {}, next_offset=100, shift_ids=[1])
+
+    # Only part of the next page was written: its offset advances but unwritten IDs are not recorded
+    manager.save_page_checkpoint('2026-01', 'North', checkpoint, next_offset=200, shift_ids=[])
+
+    resumed = manager.load_checkpoint('2026-01', 'North')
+    assert resumed['loaded_shift_ids'] == [1]
+
+
+def test_checkpoints_are_per_region(tmp_path):
+    manager = CheckpointManager(str(tmp_path))
+    manager.save_page_checkpoint('2026-01', 'North/East', {}, next_offset=100, shift_ids=[1])
+
+    assert manager.load_checkpoint('2026-01', 'South') is None
+    assert os.path.basename(manager.get_checkpoint_path('2026-01', 'North/East')) == \
+        'checkpoint_2026-01_North_East.json'
+
+
+def test_clear_checkpoint(tmp_path):
+    manager = CheckpointManager(str(tmp_path))
+    manager.save_page_checkpoint('2026-01', 'North', {}, next_offset=100, shift_ids=[1])
+
+    manager.clear_checkpoint('2026-01', 'North')
+
+    assert manager.load_checkpoint('2026-01', 'North') is None
+    assert not any(name.endswith('.tmp') for name in os.listdir(tmp_path))
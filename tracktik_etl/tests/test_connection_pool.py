@@ -0,0 +1,42 @@
+# tests/test_connection_pool.py
+"""
+PreparedStatement placeholder conversion
+"""
+from tracktik_etl.etl.utils.connection_pool import PreparedStatement
+
+
+def test_named_placeholders_become_positional():
+    statement = PreparedStatement(
+        "SELECT period_id FROM billing_periods WHERE start_date <= %(day)s AND end_date >= %(day)s "
+        "AND region_id = %(region_id)s"
+    )
+
+    assert statement.params == ['day', 'region_id']
+    assert statement.prepare_sql == (
+        f"PREPARE {statement.name} AS SELECT period_id FROM billing_periods "
+        "WHERE start_date <= $1 AND end_date >= $1 AND region_id = $2"
+    )
+    assert statement.execute_sql == f"EXECUTE {statement.name} (%s, %s)"
+    assert statement.args({'region_id': 7, 'day': '2026-01-05', 'unused': 1}) == ['2026-01-05', 7]
+
+
+def test_escaped_percent_is_unescaped_in_prepared_body():
+    statement = PreparedStatement("SELECT 1 FROM dim_client WHERE client_name LIKE 'Kaiser%%' AND tracktik_id = %(id)s")
+
+    assert statement.prepare_sql.endswith("WHERE client_name LIKE 'Kaiser%' AND tracktik_id = $1")
+
+
+def test_statement_without_parameters():
+    statement = PreparedStatement("SELECT count(*) FROM dim_region")
+
+    assert statement.params == []
+    assert statement.execute_sql == f"EXECUTE {statement.name}"
+    assert statement.args({}) == []
+
+
+def test_name_is_stable_per_query():
+    query = "SELECT * FROM dim_employee WHERE tracktik_id = %(id)s"
+
+    assert PreparedStatement(query).name == PreparedStatement(query).name
+    assert PreparedStatement(query).name != PreparedStatement(query + " AND is_current").name
+    assert PreparedStatement(query).name.startswith('etl_')
@@ -0,0 +1,119 @@
+# tests/test_data_quality.py
+"""
+DataQualityValidator rules and load_rules overrides
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from tracktik_etl.etl.utils.data_quality import (
+    DEFAULT_RULES, ISSUE_COLUMNS, DataQualityValidator, load_rules
+)
+
+
+def shift(**overrides):
+    record = {
+        'shift_id': 101, 'billing_period_id': '2026-01', 'employee_id': 5, 'position_id': 7,
+        'client_id': 3, 'shift_date': '2026-01-05', 'scheduled_hours': 8.0, 'clocked_hours': 7.5,
+        'approved_hours': 7.5, 'billable_hours': 7.5, 'payable_hours': 7.5, 'status': 'APPROVED'
+    }
+    record.update(overrides)
+    return record
+
+
+def issues_by_type(issues):
+    return sorted(zip(issues['record_id'], issues['issue_type'], issues['field']))
+
+
+def test_clean_batch_has_no_issues():
+    issues = DataQualityValidator(DEFAULT_RULES).validate('fact_shifts', pd.DataFrame([shift(), shift(shift_id=102)]))
+
+    assert list(issues.columns) == ISSUE_COLUMNS
+    assert issues.empty
+
+
+def test_missing_required_fields():
+    frame = pd.DataFrame([shift(), shift(shift_id=102, employee_id=None), shift(shift_id=103, shift_date='  ')])
+
+    issues = DataQualityValidator(DEFAULT_RULES).validate('fact_shifts', frame)
+
+    assert issues_by_type(issues) == [
+        ('102', 'missing_required_field', 'employee_id'),
+        ('103', 'missing_required_field', 'shift_date'),
+    ]
+    # employee_id went to float64 because of the gap; the record ID must not become '102.0'
+    assert list(issues['record_index']) == [1, 2]
+
+
+def test_required_column_absent_flags_every_row():
+    frame = pd.DataFrame([shift(), shift(shift_id=102)]).drop(columns='client_id')
+
+    issues = DataQualityValidator(DEFAULT_RULES).validate('fact_shifts', frame)
+
+    assert issues_by_type(issues) == [
+        ('101', 'missing_required_field', 'client_id'),
+        ('102', 'missing_required_field', 'client_id'),
+    ]
+    assert issues['value'].isna().all()
+
+
+def test_hours_out_of_range():
+    frame = pd.DataFrame([shift(clocked_hours=25), shift(shift_id=102, payable_hours=-1), shift(shift_id=103)])
+
+    issues = DataQualityValidator(DEFAULT_RULES).validate('fact_shifts', frame)
+
+    assert issues_by_type(issues) == [
+        ('101', 'out_of_range', 'clocked_hours'),
+        ('102', 'out_of_range', 'payable_hours'),
+    ]
+    assert issues.loc[issues['field'] == 'clocked_hours', 'details'].item() == \
+        'Invalid clocked_hours (must be 0-24): 25.0'
+
+
+def test_unknown_status_is_flagged_by_default():
+    frame = pd.DataFrame([shift(), shift(shift_id=102, status='PENDING'), shift(shift_id=103, status='SOMETHING_NEW'),
+                          shift(shift_id=104, status=None)])
+
+    issues = DataQualityValidator(DEFAULT_RULES).validate('fact_shifts', frame)
+
+    assert issues_by_type(issues) == [('103', 'invalid_value', 'status')]
+    assert issues['details'].item() == 'Invalid status: SOMETHING_NEW'
+
+
+def test_rules_file_replaces_status_allow_list(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps({'fact_shifts': {'allowed': {'status': ['APPROVED', 'DRAFT']}}}))
+    rules = load_rules(str(path))
+
+    frame = pd.DataFrame([shift(), shift(shift_id=102, status='DRAFT'), shift(shift_id=103, status='COMPLETED')])
+    issues = DataQualityValidator(rules).validate('fact_shifts', frame)
+
+    assert issues_by_type(issues) == [('103', 'invalid_value', 'status')]
+    assert issues['details'].item() == 'Invalid status: COMPLETED'
+    # Rule kinds not in the file keep their defaults
+    assert rules['fact_shifts']['required'] == DEFAULT_RULES['fact_shifts']['required']
+
+
+def test_tables_without_rules_and_empty_batches_pass():
+    validator = DataQualityValidator(DEFAULT_RULES)
+
+    assert validator.validate('agg_period_region', pd.DataFrame([{'x': None}])).empty
+    assert validator.validate('fact_shifts', pd.DataFrame()).empty
+
+
+def test_record_index_follows_frame_index():
+    frame = pd.DataFrame([shift(), shift(shift_id=102, clocked_hours=30)], index=[40, 41])
+
+    issues = DataQualityValidator(DEFAULT_RULES).validate('fact_shifts', frame)
+
+    assert list(issues['record_index']) == [41]
+
+
+def test_issue_data():
+    frame = pd.DataFrame([shift(clocked_hours=np.float64(30))])
+    issues = DataQualityValidator(DEFAULT_RULES).validate('fact_shifts', frame)
+
+    assert [json.loads(data) for data in DataQualityValidator.issue_data(issues)] == [
+        {'field': 'clocked_hours', 'value': 30.0, 'record_index': 0}
+    ]
@@ -0,0 +1,259 @@
+# tests/test_fact_shifts.py
+"""
+fact_shifts loaders and what hangs off them: COPY load, partition provisioning,
+raw payload side tables and period aggregates (need PostgreSQL)
+"""
+import json
+from datetime import date
+
+import pytest
+
+from tracktik_etl.benchmark_load import iter_shift_batches, make_clients, make_employees, make_positions
+
+
+@pytest.fixture
+def shifts(warehouse, batch_id):
+    """Empty fact tables; returns a function building `count` transformed shifts for a period"""
+    with warehouse.get_cursor() as cursor:
+        cursor.execute("TRUNCATE tracktik.fact_shifts, tracktik.fact_shift_raw, tracktik.raw_shift_payloads")
+
+    employees = make_employees(20)
+    positions = make_positions(10, make_clients(3))
+
+    def build(count, period_id='2025_01', period_start=date(2024, 12, 27), seed=1):
+        return next(iter_shift_batches(count, period_id, period_start, employees, positions,
+                                       batch_id, batch_size=count, seed=seed))
+
+    return build
+
+
+def fact_count(warehouse, period_id):
+    return warehouse.execute_query(
+        "SELECT COUNT(*) AS n FROM tracktik.fact_shifts WHERE billing_period_id = %(p)s", {'p': period_id}
+    )[0]['n']
+
+
+def test_copy_load_inserts_then_skips_unchanged(warehouse, shifts):
+    records = shifts(50)
+
+    assert warehouse.copy_fact_shifts(records) == {'inserted': 50, 'updated': 0, 'unchanged': 0}
+    assert warehouse.copy_fact_shifts(records) == {'inserted': 0, 'updated': 0, 'unchanged': 50}
+    assert fact_count(warehouse, '2025_01') == 50
+
+
+def test_copy_load_updates_changed_shifts(warehouse, shifts):
+    records = shifts(10)
+    warehouse.copy_fact_shifts(records)
+
+    records[0] = {**records[0], 'approved_hours': 1.5}
+    records[1] = {**records[1], 'status': 'DISPUTED'}
+
+    assert warehouse.copy_fact_shifts(records) == {'inserted': 0, 'updated': 2, 'unchanged': 8}
+    row = warehouse.execute_query(
+        "SELECT approved_hours FROM tracktik.fact_shifts WHERE shift_id = %(id)s", {'id': records[0]['shift_id']}
+    )[0]
+    assert float(row['approved_hours']) == 1.5
+
+
+def test_last_duplicate_in_batch_wins(warehouse, shifts):
+    first, = shifts(1)
+    later = {**first, 'status': 'DISPUTED'}
+
+    assert warehouse.copy_fact_shifts([first, later]) == {'inserted': 1, 'updated': 0, 'unchanged': 0}
+    assert warehouse.execute_query("SELECT status FROM tracktik.fact_shifts")[0]['status'] == 'DISPUTED'
+
+
+def test_copy_load_provisions_missing_partitions(warehouse, shifts):
+    period = warehouse.execute_query(
+        "SELECT period_id, start_date FROM tracktik.billing_periods WHERE period_id = '2025_20'"
+    )[0]
+    with warehouse.get_cursor() as cursor:
+        cursor.execute("DROP TABLE tracktik.fact_shifts_2025_20")
+    warehouse._known_partitions.discard('2025_20')
+
+    records = shifts(5, period['period_id'], period['start_date'])
+
+    assert warehouse.copy_fact_shifts(records)['inserted'] == 5
+    assert fact_count(warehouse, '2025_20') == 5
+    assert warehouse.execute_query("SELECT to_regclass('tracktik.fact_shifts_2025_20') AS t")[0]['t'] is not None
+
+
+def stored_rows(warehouse):
+    return {row['shift_id']: (row['row_hash'], row['updated_at']) for row in warehouse.execute_query(
+        "SELECT shift_id, row_hash, updated_at FROM tracktik.fact_shifts"
+    )}
+
+
+def test_partitioned_insert_stores_the_copy_row_hash(warehouse, shifts):
+    records = shifts(20)
+    facts = [{k: v for k, v in record.items() if k != 'raw_data'} for record in records]
+
+    warehouse.insert_fact_batch_partitioned('fact_shifts', facts, 'billing_period_id')
+    hashes = {shift_id: row_hash for shift_id, (row_hash, _) in stored_rows(warehouse).items()}
+
+    assert all(hashes.values())
+    # Same data through the COPY path: every hash matches, so nothing is rewritten
+    assert warehouse.copy_fact_shifts(facts) == {'inserted': 0, 'updated': 0, 'unchanged': 20}
+
+
+def test_partitioned_insert_skips_unchanged_and_rehashes_changed(warehouse, shifts):
+    facts = [{k: v for k, v in record.items() if k != 'raw_data'} for record in shifts(5)]
+    warehouse.copy_fact_shifts(facts)
+    before = stored_rows(warehouse)
+
+    facts[0] = {**facts[0], 'clocked_hours': 2.0, 'status': 'DISPUTED'}
+    warehouse.insert_fact_batch_partitioned('fact_shifts', facts, 'billing_period_id')
+    after = stored_rows(warehouse)
+
+    changed = facts[0]['shift_id']
+    assert after[changed][0] != before[changed][0]
+    assert {k: v for k, v in after.items() if k != changed} == {k: v for k, v in before.items() if k != changed}
+    # The stored hash is current: the COPY path sees nothing to do
+    assert warehouse.copy_fact_shifts(facts)['unchanged'] == 5
+    row = warehouse.execute_query(
+        "SELECT clocked_hours, status FROM tracktik.fact_shifts WHERE shift_id = %(id)s", {'id': changed}
+    )[0]
+    assert (float(row['clocked_hours']), row['status']) == (2.0, 'DISPUTED')
+
+
+def payload_counts(warehouse):
+    return warehouse.execute_query("""
+        SELECT (SELECT COUNT(*) FROM tracktik.raw_shift_payloads) AS payloads,
+               (SELECT COUNT(*) FROM tracktik.fact_shift_raw) AS links
+    """)[0]
+
+
+def test_raw_payloads_live_in_the_side_tables(warehouse, shifts):
+    records = shifts(5)
+    warehouse.copy_fact_shifts(records)
+
+    columns = {row['column_name'] for row in warehouse.execute_query(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = 'tracktik' AND table_name = 'fact_shifts'"
+    )}
+    assert 'raw_data' not in columns
+
+    row = warehouse.execute_query(
+        "SELECT raw_data FROM tracktik.v_fact_shifts_raw WHERE shift_id = %(id)s", {'id': records[0]['shift_id']}
+    )[0]
+    assert row['raw_data'] == json.loads(records[0]['raw_data'])
+
+
+def test_identical_payloads_are_stored_once(warehouse, shifts):
+    first, second = shifts(2)
+    second = {**second, 'raw_data': first['raw_data']}
+
+    warehouse.copy_fact_shifts([first, second])
+
+    assert payload_counts(warehouse) == {'payloads': 1, 'links': 2}
+
+
+def test_changed_payload_relinks_and_orphan_is_cleaned_up(warehouse, shifts):
+    record, = shifts(1)
+    warehouse.copy_fact_shifts([record])
+
+    changed = {**record, 'raw_data': json.dumps({**json.loads(record['raw_data']), 'status': 'DISPUTED'})}
+    warehouse.copy_fact_shifts([changed])
+
+    assert payload_counts(warehouse) == {'payloads': 2, 'links': 1}
+    assert warehouse.cleanup_orphan_payloads() == 1
+    assert payload_counts(warehouse) == {'payloads': 1, 'links': 1}
+
+
+def test_partitioned_insert_routes_raw_data_to_the_side_tables(warehouse, shifts):
+    records = shifts(3)
+
+    warehouse.insert_fact_batch_partitioned('fact_shifts', records, 'billing_period_id')
+
+    assert fact_count(warehouse, '2025_01') == 3
+    assert payload_counts(warehouse) == {'payloads': 3, 'links': 3}
+
+
+def client_totals(warehouse, period_id):
+    return {row['client_id']: (row['shift_count'], row['bill_total']) for row in warehouse.execute_query(
+        "SELECT client_id, shift_count, bill_total FROM tracktik.agg_period_client "
+        "WHERE billing_period_id = %(p)s", {'p': period_id}
+    )}
+
+
+def test_refresh_aggregates_matches_the_fact_rows(warehouse, shifts):
+    warehouse.copy_fact_shifts(shifts(40))
+
+    warehouse.refresh_period_aggregates(['2025_01'])
+
+    expected = {row['client_id']: (row['n'], row['total']) for row in warehouse.execute_query(
+        "SELECT client_id, COUNT(*) AS n, SUM(bill_total) AS total FROM tracktik.fact_shifts "
+        "WHERE billing_period_id = '2025_01' GROUP BY client_id"
+    )}
+    assert client_totals(warehouse, '2025_01') == expected
+    for table in ('agg_period_region', 'agg_period_position', 'agg_period_employee'):
+        total = warehouse.execute_query(
+            f"SELECT SUM(shift_count) AS n FROM tracktik.{table} WHERE billing_period_id = '2025_01'"
+        )[0]['n']
+        assert total == 40, table
+
+
+def test_refresh_aggregates_rebuilds_only_the_given_period(warehouse, shifts):
+    other = warehouse.execute_query(
+        "SELECT period_id, start_date FROM tracktik.billing_periods WHERE period_id = '2025_02'"
+    )[0]
+    warehouse.copy_fact_shifts(shifts(10) + shifts(10, other['period_id'], other['start_date'], seed=2))
+    warehouse.refresh_period_aggregates(['2025_01', '2025_02'])
+    before = client_totals(warehouse, '2025_02')
+
+    with warehouse.get_cursor() as cursor:
+        cursor.execute("DELETE FROM tracktik.fact_shifts")
+    warehouse.refresh_period_aggregates(['2025_01'])
+
+    assert client_totals(warehouse, '2025_01') == {}
+    assert client_totals(warehouse, '2025_02') == before
+
+
+def test_batch_frame_loads_like_transformed_dicts(warehouse, shifts):
+    from tracktik_etl.etl.transformers import DataTransformer
+
+    api_shifts = [{
+        'id': 500 + i, 'employee': 10 + i, 'position': 20,
+        'startDateTime': '2024-12-28T08:00:00-08:00', 'endDateTime': '2024-12-28T16:30:00-08:00',
+        'plannedDurationHours': 8.5, 'clockedHours': '8.25', 'status': 'APPROVED'
+    } for i in range(5)]
+    frame = DataTransformer.transform_shifts_batch(api_shifts, '2025_01', {20: 7})
+    records = []
+    for shift in api_shifts:
+        record = DataTransformer.transform_shift(shift, '2025_01')
+        record['client_id'] = 7
+        records.append(record)
+
+    assert warehouse.copy_fact_shifts(frame) == {'inserted': 5, 'updated': 0, 'unchanged': 0}
+    # Same row hashes and payloads either way
+    assert warehouse.copy_fact_shifts(records) == {'inserted': 0, 'updated': 0, 'unchanged': 5}
+    assert payload_counts(warehouse) == {'payloads': 5, 'links': 5}
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_pipeline_page_load_filters_the_same_either_way(warehouse, shifts, batch_id, monkeypatch, columnar):
+    from tracktik_etl.etl.config import config
+    from tracktik_etl.etl.etl_pipeline import ETLPipeline
+
+    monkeypatch.setattr(config, 'COLUMNAR_SHIFT_TRANSFORM', columnar)
+    pipeline = ETLPipeline()
+    pipeline.batch_id = batch_id
+    api_shifts = [{
+        'id': 700 + i, 'employee': 10 + i % 3, 'position': 20 + i % 2,
+        'startDateTime': '2024-12-28T08:00:00-08:00', 'endDateTime': '2024-12-28T16:00:00-08:00',
+        'plannedDurationHours': 8, 'status': 'APPROVED'
+    } for i in range(6)]
+    api_shifts.append({**api_shifts[0], 'id': 799, 'startDateTime': 'not a time'})
+    # Employee 12 isn't in dim_employees, position 21 has no client
+    lookups = {'seen_employee_ids': {10, 11, 12}, 'existing_employee_ids': {10, 11},
+               'new_employee_count': 0, 'position_client_map': {20: 7, 21: None}}
+    stats = {'data_quality_issues': 0, 'shifts_new': 0, 'shifts_updated': 0,
+             'shifts_unchanged': 0, 'shifts_inserted': 0}
+
+    loaded = pipeline._load_shift_page(api_shifts, '2025_01', 1, 'Test', lookups, stats)
+
+    # Only even shifts have position 20; of those, 704 belongs to employee 11 and 702 to 12
+    assert sorted(loaded) == [700, 704]
+    assert stats['shifts_new'] == 2
+    assert stats['data_quality_issues'] == 5  # 4 filtered, 1 unparseable
+    assert fact_count(warehouse, '2025_01') == 2
@@ -0,0 +1,67 @@
+# tests/test_kaiser_employee_sync.py
+"""
+SCD Type 2 diff and bulk sync of KAISER employees
+"""
+import pytest
+
+
+@pytest.fixture(scope='module')
+def sync_module(tmp_path_factory):
+    """kaiser_employee_sync, imported from a scratch directory (it opens a log file under ./logs)"""
+    import importlib
+    import os
+
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('employee_sync'))
+    try:
+        return importlib.import_module('tracktik_etl.kaiser_employee_sync')
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def sync(sync_module):
+    return sync_module.KaiserEmployeeSync()
+
+
+def employee(employee_id, **fields):
+    return {'employee_id': employee_id, 'custom_id': f'E{employee_id}', 'first_name': 'Ann',
+            'last_name': 'Lee', 'email': None, 'phone': None, 'status': 'ACTIVE', 'region_id': 5, **fields}
+
+
+def test_diff_classifies_new_changed_and_unchanged(sync):
+    current = {1: employee(1), 2: employee(2), 3: employee(3)}
+    incoming = [employee(1), employee(2, status='INACTIVE'), employee(4)]
+
+    inserts, closed_ids, unchanged_ids = sync.diff_employees(incoming, current)
+
+    assert [e['employee_id'] for e in inserts] == [2, 4]
+    assert closed_ids == [2]
+    assert unchanged_ids == [1]
+
+
+def test_diff_compares_trimmed_text_and_keeps_the_last_duplicate(sync):
+    current = {1: employee(1, custom_id='E1', region_id=5)}
+    incoming = [employee(1, first_name='Bob'), employee(1, custom_id=' E1 ', region_id='5')]
+
+    assert sync.diff_employees(incoming, current) == ([], [], [1])
+
+
+def test_bulk_sync_closes_changed_versions(warehouse, sync, batch_id):
+    with warehouse.get_cursor() as cursor:
+        cursor.execute("TRUNCATE tracktik.dim_employees")
+    sync.batch_id = batch_id
+
+    assert sync.bulk_sync_employees(5, [employee(1), employee(2)]) == {'inserted': 2, 'updated': 0, 'unchanged': 0}
+    assert sync.bulk_sync_employees(5, [employee(1), employee(2, email='ann@example.com')]) == \
+        {'inserted': 0, 'updated': 1, 'unchanged': 1}
+
+    rows = warehouse.execute_query(
+        "SELECT employee_id, email, is_current, valid_from, valid_to FROM tracktik.dim_employees "
+        "ORDER BY employee_id, valid_from"
+    )
+    assert [(r['employee_id'], r['email'], r['is_current']) for r in rows] == [
+        (1, None, True), (2, None, False), (2, 'ann@example.com', True)
+    ]
+    # The closed version ends exactly where the new one starts
+    assert rows[1]['valid_to'] == rows[2]['valid_from']
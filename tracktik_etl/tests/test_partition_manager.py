@@ -0,0 +1,172 @@
+# tests/test_partition_manager.py
+"""
+PartitionManager decisions (which partitions to prepare, export and detach),
+with the database replaced by a stub
+"""
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from tracktik_etl.etl.config import config
+from tracktik_etl.etl.partition_manager import PartitionManager
+
+
+@pytest.fixture(autouse=True)
+def schema(monkeypatch):
+    monkeypatch.setattr(config, 'POSTGRES_SCHEMA', 'tracktik')
+
+
+class FakeDatabase:
+    """Just enough of DatabaseManager for PartitionManager; records the SQL it is sent"""
+
+    def __init__(self, partitions=None, periods=None, batches=None):
+        self.partitions = partitions or []
+        self.periods = periods or []
+        self.batches = batches or []
+        self.generated_years = []
+        self.statements = []
+        self.orphan_cleanups = 0
+        self._known_partitions = set()
+
+    def execute_query(self, query, params=None):
+        if 'pg_inherits' in query:
+            return self.partitions
+        if 'MAX(fiscal_year)' in query:
+            return [{'fiscal_year': max((p['fiscal_year'] for p in self.periods), default=None)}]
+        if 'information_schema.columns' in query:
+            return [
+                {'column_name': 'shift_id', 'data_type': 'bigint', 'numeric_precision': None, 'numeric_scale': None},
+                {'column_name': 'billing_period_id', 'data_type': 'character varying',
+                 'numeric_precision': None, 'numeric_scale': None},
+            ]
+        if 'billing_periods' in query:
+            return [p for p in self.periods if p['end_date'] >= date.today()][:params['limit']]
+        raise AssertionError(f"Unexpected query: {query}")
+
+    def generate_billing_periods(self, fiscal_year):
+        self.generated_years.append(fiscal_year)
+        start = date.today() + timedelta(days=14 * len(self.periods))
+        for i in range(26):
+            self.periods.append({
+                'period_id': f'{fiscal_year}_{i + 1:02d}', 'fiscal_year': fiscal_year,
+                'start_date': start + timedelta(days=14 * i), 'end_date': start + timedelta(days=14 * i + 13)
+            })
+
+    def ensure_shift_partitions(self, period_ids):
+        return [period_id for period_id in period_ids if period_id not in self._known_partitions]
+
+    @contextmanager
+    def get_cursor(self):
+        yield self
+
+    def execute(self, statement, params=None):
+        self.statements.append(' '.join(statement.split()))
+
+    def stream_arrow(self, query, batch_size=None, schema=None):
+        for batch in self.batches:
+            yield pa.RecordBatch.from_pylist(batch, schema=schema)
+
+    def cleanup_orphan_payloads(self):
+        self.orphan_cleanups += 1
+        return 0
+
+
+def partition(period_id, days_ago):
+    end_date = date.today() - timedelta(days=days_ago)
+    return {'partition_name': f'fact_shifts_{period_id}', 'period_id': period_id,
+            'start_date': end_date - timedelta(days=13), 'end_date': end_date}
+
+
+@pytest.fixture
+def expiring():
+    """Partitions ending 800, 731, 729 and 10 days ago, plus one without a billing period"""
+    return FakeDatabase(partitions=[
+        partition('2023_01', 800),
+        partition('2023_20', 731),
+        partition('2023_21', 729),
+        partition('2025_13', 10),
+        {'partition_name': 'fact_shifts_default', 'period_id': 'default', 'start_date': None, 'end_date': None},
+    ])
+
+
+def test_only_partitions_past_the_retention_window_expire(expiring):
+    expired = PartitionManager(expiring).get_expired_partitions(retention_days=730)
+    assert [p['period_id'] for p in expired] == ['2023_01', '2023_20']
+
+
+def test_dry_run_archives_nothing(expiring):
+    manager = PartitionManager(expiring)
+
+    assert manager.run(retention_days=730, dry_run=True) == {'prepared': [], 'archived': ['2023_01', '2023_20']}
+    assert expiring.statements == []
+
+
+def test_each_partition_is_exported_before_it_is_detached(expiring, monkeypatch, tmp_path):
+    manager = PartitionManager(expiring)
+    calls = []
+    monkeypatch.setattr(manager, 'export_partition', lambda period_id, archive_dir: calls.append(('export', period_id)))
+    monkeypatch.setattr(manager, 'detach_partition', lambda period_id, drop: calls.append(('detach', period_id)))
+
+    assert manager.archive_expired_partitions(retention_days=730, archive_dir=str(tmp_path)) == ['2023_01', '2023_20']
+    assert calls == [('export', '2023_01'), ('detach', '2023_01'), ('export', '2023_20'), ('detach', '2023_20')]
+
+
+def test_failed_export_keeps_the_partition_attached(expiring, monkeypatch):
+    manager = PartitionManager(expiring)
+
+    def export(period_id, archive_dir):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(manager, 'export_partition', export)
+
+    with pytest.raises(OSError):
+        manager.archive_expired_partitions(retention_days=730)
+    assert expiring.statements == []
+
+
+@pytest.mark.parametrize('drop', [False, True])
+def test_detach_removes_the_period_side_table_rows(drop):
+    database = FakeDatabase()
+    database._known_partitions.add('2023_01')
+
+    PartitionManager(database).detach_partition('2023_01', drop=drop)
+
+    assert database.statements[0].endswith('DETACH PARTITION tracktik.fact_shifts_2023_01')
+    deleted = [s.split()[2] for s in database.statements if s.startswith('DELETE')]
+    assert deleted == ['tracktik.fact_shift_raw'] + [f'tracktik.{t}' for t in PartitionManager.PERIOD_AGGREGATE_TABLES]
+    assert (database.statements[-1] == 'DROP TABLE tracktik.fact_shifts_2023_01') == drop
+    assert '2023_01' not in database._known_partitions
+    assert database.orphan_cleanups == 1
+
+
+def test_export_writes_parquet_with_the_raw_payload(tmp_path):
+    database = FakeDatabase(batches=[
+        [{'shift_id': 1, 'billing_period_id': '2023_01', 'raw_data': '{"id": 1}'}],
+        [{'shift_id': 2, 'billing_period_id': '2023_01', 'raw_data': None}],
+    ])
+
+    path = PartitionManager(database).export_partition('2023_01', str(tmp_path))
+
+    table = pq.read_table(path)
+    assert table.column_names == ['shift_id', 'billing_period_id', 'raw_data']
+    assert table.column('shift_id').to_pylist() == [1, 2]
+    assert not (tmp_path / 'fact_shifts_2023_01.parquet.tmp').exists()
+
+
+def test_empty_partition_is_not_exported(tmp_path):
+    assert PartitionManager(FakeDatabase()).export_partition('2023_01', str(tmp_path)) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_missing_fiscal_years_are_generated_before_precreating():
+    database = FakeDatabase()
+
+    prepared = PartitionManager(database).precreate_partitions(periods_ahead=3)
+
+    assert database.generated_years == [date.today().year]
+    assert len(prepared) == 4
+    created_indexes = [s for s in database.statements if s.startswith('CREATE INDEX')]
+    assert len(created_indexes) == 4 * len(PartitionManager.PARTITION_INDEXES)
@@ -0,0 +1,99 @@
+# tests/test_period_index.py
+"""
+BillingPeriodIndex single and vectorized lookups
+"""
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tracktik_etl.etl.utils.period_index import BillingPeriodIndex
+
+# Out of order, with a gap (2026-01-29..31) between the last two periods
+PERIODS = [
+    {'period_id': '2026-02', 'start_date': date(2026, 2, 1), 'end_date': date(2026, 2, 28)},
+    {'period_id': '2025-12', 'start_date': date(2025, 12, 1), 'end_date': date(2025, 12, 31)},
+    {'period_id': '2026-01', 'start_date': date(2026, 1, 1), 'end_date': date(2026, 1, 28)},
+]
+
+
+class Loader:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.rows
+
+
+@pytest.fixture
+def index():
+    return BillingPeriodIndex(Loader(PERIODS))
+
+
+@pytest.mark.parametrize('value, expected', [
+    (date(2025, 12, 1), '2025-12'),            # first day
+    (date(2025, 12, 31), '2025-12'),           # last day
+    (datetime(2026, 1, 15, 23, 30), '2026-01'),
+    ('2026-02-14T08:00:00-08:00', '2026-02'),  # wall-clock date of an ISO timestamp
+    (date(2026, 1, 30), None),                 # in the gap between periods
+    (date(2025, 11, 30), None),                # before the first period
+    (date(2026, 3, 1), None),                  # after the last period
+])
+def test_lookup(index, value, expected):
+    assert index.lookup(value) == expected
+
+
+def test_lookup_many_matches_lookup(index):
+    values = [date(2025, 11, 30), date(2025, 12, 1), date(2026, 1, 28), date(2026, 1, 30),
+              date(2026, 2, 28), date(2026, 3, 1)]
+
+    expected = [index.lookup(value) for value in values]
+
+    assert list(index.lookup_many(values)) == expected
+    assert list(index.lookup_many(np.array(values, dtype='datetime64[D]'))) == expected
+    assert list(index.lookup_many(pd.Series(pd.to_datetime(values)))) == expected
+
+
+def test_lookup_many_uses_local_date_of_aware_timestamps(index):
+    # 2026-02-01 03:00 UTC is still January 31st in Los Angeles, which falls in the gap
+    values = pd.Series(pd.to_datetime(['2026-01-31T19:00:00-08:00', '2026-01-15T23:00:00-08:00'], utc=True)
+                       .tz_convert('America/Los_Angeles'))
+
+    assert list(index.lookup_many(values)) == [None, '2026-01']
+
+
+def test_lookup_many_empty(index):
+    assert index.lookup_many([]).size == 0
+    assert list(BillingPeriodIndex(Loader([])).lookup_many([date(2026, 1, 1)])) == [None]
+
+
+def test_get_dates(index):
+    assert index.get_dates('2026-01') == (date(2026, 1, 1), date(2026, 1, 28))
+    assert index.get_dates('1999-01') is None
+
+
+def test_loads_lazily_once_and_reloads_after_invalidate():
+    loader = Loader(PERIODS)
+    index = BillingPeriodIndex(loader)
+    assert loader.calls == 0
+
+    index.lookup(date(2026, 1, 1))
+    index.lookup(date(2026, 2, 1))
+    assert loader.calls == 1
+
+    index.invalidate()
+    index.lookup(date(2026, 1, 1))
+    assert loader.calls == 2
+
+
+def test_reloads_once_max_age_passes():
+    loader = Loader(PERIODS)
+    index = BillingPeriodIndex(loader, max_age_seconds=0)
+
+    index.lookup(date(2026, 1, 1))
+    index.lookup(date(2026, 1, 1))
+
+    assert loader.calls == 2
@@ -0,0 +1,59 @@
+# tests/test_prefetch.py
+"""
+Background page prefetching
+"""
+import threading
+
+import pytest
+
+from tracktik_etl.etl.utils.prefetch import prefetch
+
+
+def test_items_arrive_in_order():
+    assert list(prefetch(iter(range(5)), depth=2)) == [0, 1, 2, 3, 4]
+
+
+def test_producer_runs_ahead_of_the_consumer():
+    produced = []
+    second_ready = threading.Event()
+
+    def pages():
+        for i in range(3):
+            produced.append(i)
+            if i == 1:
+                second_ready.set()
+            yield i
+
+    items = prefetch(pages(), depth=1)
+    assert next(items) == 0
+    # While the caller works on page 0, page 1 is fetched in the background
+    assert second_ready.wait(timeout=5)
+    assert list(items) == [1, 2]
+
+
+def test_producer_errors_are_raised_in_the_consumer():
+    def pages():
+        yield 1
+        raise ValueError('page 2 failed')
+
+    items = prefetch(pages())
+    assert next(items) == 1
+    with pytest.raises(ValueError, match='page 2 failed'):
+        next(items)
+
+
+def test_closing_early_stops_the_producer():
+    produced = []
+
+    def pages():
+        for i in range(1000):
+            produced.append(i)
+            yield i
+
+    items = prefetch(pages(), depth=1)
+    next(items)
+    items.close()
+    count = len(produced)
+
+    assert count < 1000
+    assert len(produced) == count
@@ -0,0 +1,169 @@
+# tests/test_rate_limiter.py
+"""
+TokenBucketRateLimiter pacing, header learning and back-off
+"""
+import pytest
+
+from tracktik_etl.etl.config import config
+from tracktik_etl.etl.utils import rate_limiter as rate_limiter_module
+from tracktik_etl.etl.utils.rate_limiter import TokenBucketRateLimiter
+
+
+class Clock:
+    """Stands in for time.time so the bucket can be driven without sleeping"""
+
+    def __init__(self, now=1_790_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter_module.time, 'time', clock)
+    return clock
+
+
+def test_burst_is_free_then_calls_are_paced(clock):
+    limiter = TokenBucketRateLimiter(calls_per_minute=60, burst=3)
+
+    assert [limiter._reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter._reserve() == pytest.approx(1.0)
+    assert limiter._reserve() == pytest.approx(2.0)
+
+
+def test_tokens_refill_over_time(clock):
+    limiter = TokenBucketRateLimiter(calls_per_minute=60, burst=2)
+    limiter._reserve()
+    limiter._reserve()
+
+    clock.now += 1.5
+
+    assert limiter._reserve() == 0.0
+    assert limiter._reserve() == pytest.approx(0.5)
+
+
+def test_headers_set_the_budget(clock):
+    limiter = TokenBucketRateLimiter(calls_per_minute=60, burst=10)
+
+    limiter.update_from_headers({'X-RateLimit-Limit': '600', 'X-RateLimit-Remaining': '500'})
+
+    state = limiter._local_state
+    assert state['capacity'] == 600
+    assert state['rate'] == pytest.approx(600 / config.RATE_LIMIT_WINDOW)
+    # Never more than we started with, nor more than the server reports
+    assert state['tokens'] == 10
+
+
+def test_remaining_caps_tokens_and_exhaustion_blocks_until_reset(clock):
+    limiter = TokenBucketRateLimiter(calls_per_minute=60, burst=50)
+
+    limiter.update_from_headers({'X-RateLimit-Remaining': str(config.RATE_LIMIT_RESERVE),
+                                 'X-RateLimit-Reset': '30'})
+
+    assert limiter._local_state['tokens'] == 0
+    assert limiter._reserve() == pytest.approx(30.0)
+
+
+def test_epoch_reset_header(clock):
+    limiter = TokenBucketRateLimiter(calls_per_minute=60, burst=50)
+
+    limiter.update_from_headers({'X-RateLimit-Remaining': '0',
+                                 'X-RateLimit-Reset': str(clock.now + 12)})
+
+    assert limiter._local_state['blocked_until'] == pytest.approx(clock.now + 12)
+
+
+def test_missing_or_malformed_headers_are_ignored(clock):
+    limiter = TokenBucketRateLimiter(calls_per_minute=60, burst=5)
+    before = dict(limiter._local_state)
+
+    limiter.update_from_headers({})
+    limiter.update_from_headers({'X-RateLimit-Limit': 'n/a'})
+    limiter.update_from_headers(None)
+
+    assert limiter._local_state == before
+
+
+def test_record_error_honours_retry_after(clock):
+    limiter = TokenBucketRateLimiter(calls_per_minute=60, burst=5)
+
+    limiter.record_error(retry_after=20)
+
+    assert limiter._reserve() == pytest.approx(20.0)
+
+
+def test_record_error_backs_off_exponentially(clock):
+    limiter = TokenBucketRateLimiter(calls_per_minute=60, burst=5)
+
+    limiter.record_error()
+    limiter.record_error()
+
+    assert limiter._local_state['consecutive_errors'] == 2
+    assert limiter._local_state['blocked_until'] == pytest.approx(clock.now + config.RETRY_DELAY * 2)
+
+    limiter.record_success()
+    assert limiter._local_state['consecutive_errors'] == 0
+
+
+def test_state_file_shares_one_budget(clock, tmp_path):
+    state_path = str(tmp_path / 'rate_limit.json')
+    first = TokenBucketRateLimiter(calls_per_minute=60, burst=2, state_path=state_path)
+    second = TokenBucketRateLimiter(calls_per_minute=60, burst=2, state_path=state_path)
+
+    assert first._reserve() == 0.0
+    assert second._reserve() == 0.0
+    assert first._reserve() == pytest.approx(1.0)
+
+
+def peak_concurrency(limiter, workers=8, hold=0.02):
+    """Most calls inside limiter.in_flight() at once, over `workers` threads"""
+    import threading
+    import time
+
+    lock = threading.Lock()
+    state = {'now': 0, 'peak': 0}
+
+    def call():
+        with limiter.in_flight():
+            with lock:
+                state['now'] += 1
+                state['peak'] = max(state['peak'], state['now'])
+            time.sleep(hold)
+            with lock:
+                state['now'] -= 1
+
+    threads = [threading.Thread(target=call) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return state['peak']
+
+
+def test_in_flight_caps_concurrent_calls():
+    assert peak_concurrency(TokenBucketRateLimiter(max_in_flight=2)) == 2
+
+
+@pytest.mark.skipif(rate_limiter_module.os.name == 'nt', reason='slot files use flock')
+def test_in_flight_slots_are_shared_through_the_state_file(tmp_path):
+    state = str(tmp_path / 'bucket.json')
+    # Two limiters stand in for two processes: together they stay within the cap
+    first = TokenBucketRateLimiter(state_path=state, max_in_flight=3)
+    second = TokenBucketRateLimiter(state_path=state, max_in_flight=3)
+    held = [first._try_slot(), second._try_slot(), first._try_slot()]
+
+    assert all(held)
+    assert second._try_slot() is None
+
+    first._release_slot(held[0])
+    slot = second._try_slot()
+    assert slot is not None
+    for handle in [slot] + held[1:]:
+        second._release_slot(handle)
+
+
+def test_no_cap_without_max_in_flight():
+    assert peak_concurrency(TokenBucketRateLimiter(), workers=4, hold=0.05) == 4
@@ -0,0 +1,108 @@
+# tests/test_reference_cache.py
+"""
+ReferenceDataCache memory/disk tiers and incremental refresh
+"""
+import logging
+
+from tracktik_etl.etl.config import config
+from tracktik_etl.etl.utils.reference_cache import ReferenceDataCache
+
+
+class Fetcher:
+    """Records the parameters of every download and serves canned pages"""
+
+    def __init__(self, *pages):
+        self.pages = list(pages)
+        self.calls = []
+
+    def __call__(self, params):
+        self.calls.append(params)
+        return self.pages.pop(0)
+
+
+CLIENTS = [
+    {'id': 1, 'name': 'Kaiser North', 'updatedOn': '2026-01-01T00:00:00+00:00'},
+    {'id': 2, 'name': 'Kaiser South', 'updatedOn': '2026-02-01T00:00:00+00:00'},
+]
+
+
+def test_fresh_entries_are_served_from_memory(tmp_path):
+    cache = ReferenceDataCache(str(tmp_path), ttl_seconds=3600, full_refresh_seconds=86400)
+    fetch = Fetcher(CLIENTS)
+
+    first = cache.get('/rest/v1/clients', {'limit': 100}, fetch)
+    second = cache.get('/rest/v1/clients', {'limit': 100}, fetch)
+
+    assert sorted(r['id'] for r in first) == [1, 2]
+    assert second == first
+    assert len(fetch.calls) == 1
+
+
+def test_new_process_starts_warm_from_disk(tmp_path):
+    ReferenceDataCache(str(tmp_path), 3600, 86400).get('/rest/v1/clients', {}, Fetcher(CLIENTS))
+
+    fetch = Fetcher()
+    records = ReferenceDataCache(str(tmp_path), 3600, 86400).get('/rest/v1/clients', {}, fetch)
+
+    assert sorted(r['id'] for r in records) == [1, 2]
+    assert fetch.calls == []
+
+
+def test_stale_entries_refresh_incrementally(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'INCREMENTAL_OVERLAP_MINUTES', 60)
+    cache = ReferenceDataCache(str(tmp_path), ttl_seconds=0, full_refresh_seconds=86400)
+    changed = [{'id': 2, 'name': 'Kaiser South (renamed)', 'updatedOn': '2026-03-01T00:00:00+00:00'},
+               {'id': 3, 'name': 'Kaiser East', 'updatedOn': '2026-03-01T18:30:00-08:00'}]
+    fetch = Fetcher(CLIENTS + [{'id': 4, 'name': 'Kaiser West', 'updatedOn': '2026-01-15T00:00:00+00:00'}],
+                    changed, [])
+
+    cache.get('/rest/v1/clients', {'limit': 100}, fetch, modified_field='updatedOn')
+    records = cache.get('/rest/v1/clients', {'limit': 100}, fetch, modified_field='updatedOn')
+    cache.get('/rest/v1/clients', {'limit': 100}, fetch, modified_field='updatedOn')
+
+    # Deltas start an overlap before the newest record held, in UTC
+    assert fetch.calls[0] == {'limit': 100}
+    assert fetch.calls[1] == {'limit': 100, 'updatedOn:after': '2026-01-31T23:00:00+00:00'}
+    assert fetch.calls[2]['updatedOn:after'] == '2026-03-02T01:30:00+00:00'
+    assert {r['id']: r['name'] for r in records} == {
+        1: 'Kaiser North', 2: 'Kaiser South (renamed)', 3: 'Kaiser East', 4: 'Kaiser West'
+    }
+
+
+def test_delta_ignoring_the_filter_replaces_the_entry(tmp_path, caplog):
+    cache = ReferenceDataCache(str(tmp_path), ttl_seconds=0, full_refresh_seconds=86400)
+    # The API ignored updatedOn:after and sent everything it has (client 2 was deleted)
+    fetch = Fetcher(CLIENTS, CLIENTS[:1])
+
+    cache.get('/rest/v1/clients', {}, fetch, modified_field='updatedOn')
+    with caplog.at_level(logging.WARNING):
+        records = cache.get('/rest/v1/clients', {}, fetch, modified_field='updatedOn')
+
+    assert [r['id'] for r in records] == [1]
+    assert "filter was ignored" in caplog.text
+
+
+def test_without_modified_field_stale_entries_reload_in_full(tmp_path):
+    cache = ReferenceDataCache(str(tmp_path), ttl_seconds=0, full_refresh_seconds=86400)
+    fetch = Fetcher(CLIENTS, CLIENTS[:1])
+
+    cache.get('/rest/v1/regions', {}, fetch)
+    records = cache.get('/rest/v1/regions', {}, fetch)
+
+    assert fetch.calls == [{}, {}]
+    assert [r['id'] for r in records] == [1]
+
+
+def test_invalidate_one_endpoint(tmp_path):
+    cache = ReferenceDataCache(str(tmp_path), 3600, 86400)
+    clients = Fetcher(CLIENTS, CLIENTS)
+    regions = Fetcher(CLIENTS)
+    cache.get('/rest/v1/clients', {}, clients)
+    cache.get('/rest/v1/regions', {}, regions)
+
+    cache.invalidate('/rest/v1/clients')
+    cache.get('/rest/v1/clients', {}, clients)
+    cache.get('/rest/v1/regions', {}, regions)
+
+    assert len(clients.calls) == 2
+    assert len(regions.calls) == 1
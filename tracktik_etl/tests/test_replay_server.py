@@ -0,0 +1,41 @@
+# tests/test_replay_server.py
+"""
+TrackTikClient extraction against the replay server: records served and requests made
+"""
+import json
+
+from tracktik_etl.etl.config import config
+from tracktik_etl.etl.replay_server import TrackTikReplayServer
+from tracktik_etl.etl.tracktik_client import TrackTikClient
+from tracktik_etl.tests.conftest import make_shifts
+
+
+def test_extraction_reads_every_page_once(replay_server):
+    shifts = TrackTikClient().get_shifts('2025-06-01', '2025-06-12')
+
+    assert [s['id'] for s in shifts] == list(range(1000, 1250))
+    stats = replay_server.get_stats()
+    assert stats['requests'] == {'oauth': 1, 'shifts': 5}
+    assert stats['total_requests'] == 6
+    assert stats['throttled_requests'] == 0
+
+
+def test_extraction_outside_the_date_range_is_one_empty_page(replay_server):
+    assert TrackTikClient().get_shifts('2025-07-01', '2025-07-12') == []
+    assert replay_server.get_stats()['requests'] == {'oauth': 1, 'shifts': 1}
+
+
+def test_scaled_fixture_serves_distinct_copies(tmp_path, monkeypatch):
+    with open(tmp_path / 'shifts.json', 'w', encoding='utf-8') as f:
+        json.dump(make_shifts(40), f)
+    monkeypatch.setattr(config, 'API_PAGE_SIZE', 50)
+
+    with TrackTikReplayServer(str(tmp_path), scale=3) as server:
+        monkeypatch.setattr(config, 'TRACKTIK_BASE_URL', server.base_url)
+        pages = list(TrackTikClient().iter_shift_pages('2025-06-01', '2025-06-12'))
+        stats = server.get_stats()
+
+    ids = [s['id'] for _, page in pages for s in page]
+    assert [offset for offset, _ in pages] == [0, 50, 100]
+    assert len(ids) == len(set(ids)) == 120
+    assert stats['requests'] == {'oauth': 1, 'shifts': 3}
@@ -0,0 +1,133 @@
+# tests/test_stage_timer.py
+"""
+Stage timing spans, their Prometheus textfile and persistence with the batch
+"""
+import re
+
+import pytest
+
+from tracktik_etl.etl.utils import stage_timer as stage_timer_module
+from tracktik_etl.etl.utils.stage_timer import StageTimer
+
+
+class Clock:
+    """Stands in for time.perf_counter; each reading advances it by `step` seconds"""
+
+    def __init__(self, step=0.5):
+        self.now = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+@pytest.fixture
+def timer(monkeypatch):
+    monkeypatch.setattr(stage_timer_module.time, 'perf_counter', Clock())
+    return StageTimer()
+
+
+def test_spans_accumulate_per_region_and_stage(timer):
+    with timer.span('load_facts', 'Hawaii') as span:
+        span.add(rows=100, bytes=2048)
+    with timer.span('load_facts', 'Hawaii') as span:
+        span.add(rows=50)
+    with timer.span('load_facts', 'Georgia') as span:
+        span.add(rows=10)
+    with timer.span('refresh_aggregates'):
+        pass
+
+    summary = timer.summary()
+
+    assert summary['Hawaii']['load_facts'] == {'calls': 2, 'rows': 150, 'bytes': 2048, 'seconds': 1.0}
+    assert summary['run']['refresh_aggregates']['calls'] == 1
+    assert summary['total']['load_facts'] == {'calls': 3, 'rows': 160, 'bytes': 2048, 'seconds': 1.5}
+
+
+def test_span_is_recorded_when_the_block_fails(timer):
+    with pytest.raises(ValueError):
+        with timer.span('transform', 'Hawaii'):
+            raise ValueError('bad shift')
+
+    assert timer.region_summary('Hawaii')['transform']['calls'] == 1
+
+
+def test_timed_iter_charges_only_the_wait_for_items(timer):
+    items = list(timer.timed_iter('api_shifts', iter([1, 2, 3]), 'Hawaii'))
+
+    assert items == [1, 2, 3]
+    stats = timer.region_summary('Hawaii')['api_shifts']
+    # Three items plus the final StopIteration, half a second each; calls are left to the caller
+    assert stats['seconds'] == pytest.approx(2.0)
+    assert stats['calls'] == 0
+
+
+def parse_textfile(text):
+    """{(metric, frozenset(labels)): value} from a Prometheus textfile"""
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith('#'):
+            continue
+        match = re.fullmatch(r'(\w+)\{(.*)\} (\S+)', line)
+        assert match, line
+        labels = frozenset(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match.group(2)))
+        samples[(match.group(1), labels)] = float(match.group(3))
+    return samples
+
+
+def test_prometheus_textfile_has_a_sample_per_region_stage_and_metric(timer, tmp_path):
+    with timer.span('load_facts', 'N California') as span:
+        span.add(rows=7, bytes=70)
+    with timer.span('transform', 'Hawaii') as span:
+        span.add(rows=3)
+
+    path = timer.write_prometheus(str(tmp_path / 'metrics' / 'etl.prom'), {'period_id': '2025_12', 'mode': 'full'})
+
+    text = open(path).read()
+    samples = parse_textfile(text)
+    labels = frozenset({('period_id', '2025_12'), ('mode', 'full'), ('region', 'N California'), ('stage', 'load_facts')})
+    assert samples[('tracktik_etl_stage_rows', labels)] == 7
+    assert samples[('tracktik_etl_stage_bytes', labels)] == 70
+    assert samples[('tracktik_etl_stage_seconds', labels)] == 0.5
+    # Regions only: the 'total' pseudo-region would double count in sum()
+    assert not any(('region', 'total') in key[1] for key in samples)
+    assert '# TYPE tracktik_etl_stage_seconds gauge' in text
+    assert not (tmp_path / 'metrics' / 'etl.prom.tmp').exists()
+
+
+def test_label_values_are_escaped(timer, tmp_path):
+    with timer.span('load', 'Say "hi"\\'):
+        pass
+
+    text = open(timer.write_prometheus(str(tmp_path / 'etl.prom'))).read()
+
+    assert 'region="Say \\"hi\\"\\\\"' in text
+
+
+def test_timings_are_kept_with_the_batch(warehouse, batch_id, timer):
+    from tracktik_etl.etl.models import ETLBatch
+
+    with timer.span('load_facts', 'Hawaii') as span:
+        span.add(rows=5)
+
+    ETLBatch.complete_batch(batch_id, 5, metadata={'timings': timer.summary()})
+
+    row = warehouse.execute_query(
+        "SELECT status, metadata FROM tracktik.etl_batches WHERE batch_id = %(b)s", {'b': batch_id}
+    )[0]
+    assert row['status'] == 'COMPLETED'
+    assert row['metadata']['timings']['Hawaii']['load_facts']['rows'] == 5
+
+
+def test_complete_batch_merges_into_existing_metadata(warehouse):
+    from tracktik_etl.etl.models import ETLBatch
+
+    batch_id = ETLBatch.create_batch('TEST', {'period_id': '2025_12'})
+    ETLBatch.complete_batch(batch_id, 0, metadata={'timings': {}})
+    ETLBatch.complete_batch(batch_id, 0)
+
+    metadata = warehouse.execute_query(
+        "SELECT metadata FROM tracktik.etl_batches WHERE batch_id = %(b)s", {'b': batch_id}
+    )[0]['metadata']
+    assert metadata == {'period_id': '2025_12', 'timings': {}}
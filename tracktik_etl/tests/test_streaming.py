@@ -0,0 +1,67 @@
+# tests/test_streaming.py
+"""
+Server-side cursor streaming: stream_rows, stream_batches and stream_arrow
+"""
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pyarrow as pa
+
+SERIES = "SELECT n FROM generate_series(1, %(n)s) AS n ORDER BY n"
+
+
+def test_stream_rows_yields_every_row(warehouse):
+    assert list(warehouse.stream_rows(SERIES, {'n': 25}, itersize=10)) == [(n,) for n in range(1, 26)]
+
+
+def test_stream_batches_are_bounded(warehouse):
+    batches = list(warehouse.stream_batches(SERIES, {'n': 25}, batch_size=10))
+
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert [row[0] for batch in batches for row in batch] == list(range(1, 26))
+
+
+def test_empty_result_yields_nothing(warehouse):
+    assert list(warehouse.stream_batches(SERIES, {'n': 0})) == []
+    assert list(warehouse.stream_arrow(SERIES, {'n': 0})) == []
+
+
+def test_closing_a_stream_early_returns_its_connection(warehouse):
+    in_use = len(warehouse.pool._used)
+    rows = warehouse.stream_rows(SERIES, {'n': 1000}, itersize=10)
+
+    assert next(rows) == (1,)
+    assert len(warehouse.pool._used) == in_use + 1
+    rows.close()
+    assert len(warehouse.pool._used) == in_use
+
+
+def test_arrow_schema_follows_the_column_types(warehouse):
+    batches = list(warehouse.stream_arrow("""
+        SELECT n::bigint AS id, n::integer AS small, (n * 1.5)::numeric AS hours, n % 2 = 0 AS even,
+               DATE '2025-06-01' + n AS day, TIMESTAMPTZ '2025-06-01 08:00:00+00' AS started,
+               jsonb_build_object('id', n) AS payload, NULL::text AS note
+        FROM generate_series(1, 3) AS n ORDER BY n
+    """, batch_size=2))
+
+    assert [batch.num_rows for batch in batches] == [2, 1]
+    assert batches[0].schema == batches[1].schema
+    table = pa.Table.from_batches(batches)
+    assert table.schema.types == [pa.int64(), pa.int32(), pa.float64(), pa.bool_(), pa.date32(),
+                                  pa.timestamp('us', tz='UTC'), pa.string(), pa.string()]
+    assert table.column('hours').to_pylist() == [1.5, 3.0, 4.5]
+    assert table.column('day').to_pylist()[0] == date(2025, 6, 2)
+    assert table.column('started').to_pylist()[0] == datetime(2025, 6, 1, 8, tzinfo=timezone.utc)
+    assert table.column('payload').to_pylist()[0] == '{"id": 1}'
+    assert table.column('note').to_pylist() == [None, None, None]
+
+
+def test_given_schema_keeps_numeric_exact(warehouse):
+    schema = pa.schema([pa.field('id', pa.int64()), pa.field('hours', pa.decimal128(10, 2))])
+
+    batches = list(warehouse.stream_arrow(
+        "SELECT n::bigint, (n * 1.25)::numeric(10, 2) FROM generate_series(1, 2) AS n ORDER BY n", schema=schema
+    ))
+
+    assert batches[0].schema == schema
+    assert batches[0].column(1).to_pylist() == [Decimal('1.25'), Decimal('2.50')]
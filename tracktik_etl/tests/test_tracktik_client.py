@@ -0,0 +1,191 @@
+# tests/test_tracktik_client.py
+"""
+TrackTikClient request handling, with the HTTP session replaced by a stub
+"""
+from datetime import datetime
+
+import pytest
+import requests
+
+from tracktik_etl.etl.config import config
+from tracktik_etl.etl.tracktik_client import TrackTikClient
+from tracktik_etl.etl.utils.rate_limiter import TokenBucketRateLimiter
+
+
+class FakeResponse:
+    """Just enough of requests.Response for TrackTikClient._get"""
+
+    def __init__(self, status_code=200, headers=None, payload=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.payload = payload or {}
+        self.content = b''
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error", response=self)
+
+
+class RecordingLimiter(TokenBucketRateLimiter):
+    """Token bucket that never sleeps and remembers what it was told"""
+
+    def __init__(self):
+        super().__init__(calls_per_minute=60_000, burst=1000)
+        self.errors = []
+        self.successes = 0
+
+    def record_error(self, retry_after=None):
+        self.errors.append(retry_after)
+
+    def record_success(self):
+        self.successes += 1
+
+
+def make_client(responses, rate_limiter=None):
+    """Client whose session.get returns `responses` in order"""
+    client = TrackTikClient(rate_limiter=rate_limiter)
+    client.access_token = 'token'
+    client.token_expires_at = datetime.max
+    calls = []
+
+    def get(url, headers=None, params=None):
+        calls.append(params)
+        return responses.pop(0)
+
+    client.session.get = get
+    return client, calls
+
+
+def test_session_leaves_429_to_the_rate_limiter():
+    client = TrackTikClient()
+    retry = client.session.get_adapter('https://example.com').max_retries
+    assert 429 not in retry.status_forcelist
+    assert 503 in retry.status_forcelist
+
+
+def test_429_is_reported_to_the_limiter_and_retried():
+    limiter = RecordingLimiter()
+    client, calls = make_client(
+        [FakeResponse(429, {'Retry-After': '7'}), FakeResponse(200, payload={'data': []})], limiter
+    )
+
+    response = client._get('/rest/v1/shifts')
+
+    assert response.status_code == 200
+    assert limiter.errors == [7.0]
+    assert limiter.successes == 1
+    assert len(calls) == 2
+
+
+def test_429_is_raised_once_retries_are_exhausted():
+    limiter = RecordingLimiter()
+    client, calls = make_client([FakeResponse(429) for _ in range(config.MAX_RETRIES + 1)], limiter)
+
+    with pytest.raises(requests.HTTPError):
+        client._get('/rest/v1/shifts')
+
+    assert len(calls) == config.MAX_RETRIES + 1
+    assert limiter.errors == [None] * (config.MAX_RETRIES + 1)
+
+
+def test_other_errors_do_not_back_off():
+    limiter = RecordingLimiter()
+    client, calls = make_client([FakeResponse(400)], limiter)
+
+    with pytest.raises(requests.HTTPError):
+        client._get('/rest/v1/shifts')
+
+    assert len(calls) == 1
+    assert limiter.errors == []
+
+
+def positions_client(failures):
+    """Client whose position requests fail `failures[first account id]` times before succeeding"""
+    client = TrackTikClient()
+    requested = []
+
+    def get_reference_data(endpoint, params):
+        ids = [int(i) for i in params['account.id:in'].split(',')]
+        requested.append(ids)
+        if failures.get(ids[0], 0) > 0:
+            failures[ids[0]] -= 1
+            raise requests.ConnectionError('connection reset')
+        # Position 99 belongs to two accounts and comes back in both chunks
+        return [{'id': account_id * 10, 'account': account_id} for account_id in ids] + [{'id': 99}]
+
+    client._get_reference_data = get_reference_data
+    return client, requested
+
+
+def test_positions_are_chunked_and_deduplicated():
+    client, requested = positions_client({})
+
+    positions = client.get_positions_for_accounts([3, 1, 2, 3], chunk_size=2, max_workers=2)
+
+    assert sorted(requested) == [[1, 2], [3]]
+    assert sorted(p['id'] for p in positions) == [10, 20, 30, 99]
+
+
+def test_failed_position_chunk_is_retried():
+    client, requested = positions_client({3: 1})
+
+    positions = client.get_positions_for_accounts([1, 2, 3], chunk_size=2, max_workers=2)
+
+    assert requested.count([3]) == 2
+    assert sorted(p['id'] for p in positions) == [10, 20, 30, 99]
+
+
+def test_position_chunk_failing_twice_is_raised():
+    client, _ = positions_client({3: 2})
+
+    with pytest.raises(requests.ConnectionError):
+        client.get_positions_for_accounts([1, 2, 3], chunk_size=2, max_workers=2)
+
+
+def paged_client(total, page_size, monkeypatch):
+    """Client serving `total` shift records in pages, recording each requested offset"""
+    monkeypatch.setattr(config, 'API_PAGE_SIZE', page_size)
+    client = TrackTikClient()
+    offsets = []
+
+    def fetch_page(endpoint, params, offset):
+        offsets.append(offset)
+        records = [{'id': i} for i in range(offset, min(offset + page_size, total))]
+        return records, {'count': total}, {}, 100
+
+    client._fetch_page = fetch_page
+    return client, offsets
+
+
+def test_pages_are_fetched_as_they_are_consumed(monkeypatch):
+    client, offsets = paged_client(total=25, page_size=10, monkeypatch=monkeypatch)
+
+    pages = client.iter_paginated_data('/rest/v1/shifts', {}, fan_out=1)
+
+    assert offsets == []
+    assert [r['id'] for r in next(pages)] == list(range(10))
+    assert offsets == [0]
+    assert [len(page) for page in pages] == [10, 5]
+    assert offsets == [0, 10, 20]
+
+
+def test_get_paginated_data_concatenates_pages(monkeypatch):
+    client, _ = paged_client(total=25, page_size=10, monkeypatch=monkeypatch)
+
+    records = client.get_paginated_data('/rest/v1/shifts', {}, fan_out=1)
+
+    assert [r['id'] for r in records] == list(range(25))
+
+
+def test_resumed_read_reports_offsets_and_usage(monkeypatch):
+    client, offsets = paged_client(total=25, page_size=10, monkeypatch=monkeypatch)
+    usage = {}
+
+    pages = list(client.iter_shift_pages('2026-01-01', '2026-01-28', start_offset=10, usage=usage))
+
+    assert [offset for offset, _ in pages] == [10, 20]
+    assert offsets == [10, 20]
+    assert usage == {'calls': 2, 'bytes': 200}
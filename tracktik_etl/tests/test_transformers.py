@@ -0,0 +1,58 @@
+# tests/test_transformers.py
+"""
+Columnar shift transform, checked against the per-record transform_shift
+"""
+import json
+import random
+
+import pandas as pd
+import pytest
+
+from tracktik_etl.benchmark_transform import make_shifts
+from tracktik_etl.etl.transformers import DataTransformer
+
+COLUMNS = ['shift_id', 'billing_period_id', 'employee_id', 'position_id', 'scheduled_hours',
+           'clocked_hours', 'approved_hours', 'billable_hours', 'payable_hours', 'status']
+
+
+@pytest.fixture
+def shifts():
+    random.seed(7)
+    records = make_shifts(200, positions=20, employees=50)
+    records[0]['startDateTime'] = '2025-06-01T23:30:00.250Z'
+    records[1]['clockedHours'] = 'n/a'
+    records[2]['position'] = {'id': 3}
+    return records
+
+
+def test_batch_matches_transform_shift(shifts):
+    position_client_map = {p: 1000 + p for p in range(20)}
+
+    frame = DataTransformer.transform_shifts_batch(shifts, '2025_12', position_client_map)
+
+    assert len(frame) == len(shifts)
+    for row, shift in zip(frame.to_dict('records'), shifts):
+        expected = DataTransformer.transform_shift(shift, '2025_12')
+        position_id = expected['position_id']
+        if isinstance(position_id, dict):
+            position_id = expected['position_id'] = position_id['id']
+        for column in COLUMNS:
+            value = row[column]
+            assert (None if pd.isna(value) else value) == expected[column], (shift['id'], column)
+        assert row['client_id'] == position_client_map[position_id]
+        assert row['start_datetime'] == pd.Timestamp(expected['start_datetime'])
+        assert row['end_datetime'] == pd.Timestamp(expected['end_datetime'])
+        assert row['shift_date'].date() == expected['shift_date']
+        assert json.loads(row['raw_data']) == shift
+
+
+def test_unparseable_values_become_nulls():
+    frame = DataTransformer.transform_shifts_batch(
+        [{'id': 'x', 'startDateTime': 'yesterday', 'endDateTime': None, 'position': 5}, 'not a shift'],
+        '2025_12', {}
+    )
+
+    assert len(frame) == 1
+    row = frame.iloc[0]
+    assert pd.isna(row['shift_id']) and pd.isna(row['start_datetime']) and pd.isna(row['end_datetime'])
+    assert pd.isna(row['client_id'])
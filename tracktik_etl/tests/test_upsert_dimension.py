@@ -0,0 +1,76 @@
+# tests/test_upsert_dimension.py
+"""
+Set-based SCD Type 2 merge in DatabaseManager.upsert_dimension (needs PostgreSQL)
+"""
+import pytest
+
+SCD_FIELDS = ['name', 'region_id', 'time_zone']
+
+
+@pytest.fixture
+def clients(warehouse):
+    """Empty dim_clients; returns a function upserting (client_id, name) pairs"""
+    with warehouse.get_cursor() as cursor:
+        cursor.execute("TRUNCATE tracktik.dim_clients RESTART IDENTITY")
+
+    def upsert(*pairs):
+        records = [{'client_id': client_id, 'name': name, 'region_id': 100, 'time_zone': 'America/Los_Angeles'}
+                   for client_id, name in pairs]
+        return warehouse.upsert_dimension('dim_clients', records, 'client_id', SCD_FIELDS)
+
+    return upsert
+
+
+def versions(warehouse, client_id):
+    return [(row['name'], row['is_current'], row['valid_to'] is not None) for row in warehouse.execute_query(
+        "SELECT name, is_current, valid_to FROM tracktik.dim_clients WHERE client_id = %(id)s ORDER BY surrogate_key",
+        {'id': client_id}
+    )]
+
+
+def test_first_load_inserts(warehouse, clients):
+    assert clients((1, 'North'), (2, 'South')) == {'inserted': 2, 'updated': 0, 'unchanged': 0}
+    assert versions(warehouse, 1) == [('North', True, False)]
+
+
+def test_reload_without_changes_writes_nothing(warehouse, clients):
+    clients((1, 'North'), (2, 'South'))
+
+    assert clients((1, 'North'), (2, 'South')) == {'inserted': 0, 'updated': 0, 'unchanged': 2}
+    assert versions(warehouse, 1) == [('North', True, False)]
+
+
+def test_changed_rows_are_closed_and_versioned(warehouse, clients):
+    clients((1, 'North'), (2, 'South'))
+
+    assert clients((1, 'North'), (2, 'South (renamed)'), (3, 'East')) == \
+        {'inserted': 1, 'updated': 1, 'unchanged': 1}
+    assert versions(warehouse, 2) == [('South', False, True), ('South (renamed)', True, False)]
+
+
+def test_repeated_keys_count_like_sequential_upserts(warehouse, clients):
+    clients((2, 'A'))
+
+    # Key 1: new, repeat, change; key 2: same, change, repeat
+    result = clients((1, 'A'), (1, 'A'), (1, 'B'), (2, 'A'), (2, 'B'), (2, 'B'))
+
+    assert result == {'inserted': 1, 'updated': 2, 'unchanged': 3}
+    # The last record for each key wins
+    assert versions(warehouse, 1) == [('B', True, False)]
+    assert versions(warehouse, 2) == [('A', False, True), ('B', True, False)]
+
+
+def test_null_fields_compare_equal(warehouse):
+    with warehouse.get_cursor() as cursor:
+        cursor.execute("TRUNCATE tracktik.dim_clients RESTART IDENTITY")
+    record = {'client_id': 9, 'name': 'No region', 'region_id': None, 'time_zone': None}
+
+    warehouse.upsert_dimension('dim_clients', [record], 'client_id', SCD_FIELDS)
+
+    assert warehouse.upsert_dimension('dim_clients', [record], 'client_id', SCD_FIELDS) == \
+        {'inserted': 0, 'updated': 0, 'unchanged': 1}
+
+
+def test_empty_batch(warehouse):
+    assert warehouse.upsert_dimension('dim_clients', [], 'client_id', SCD_FIELDS) == \
+        {'inserted': 0, 'updated': 0, 'unchanged': 0}
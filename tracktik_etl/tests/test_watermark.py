@@ -0,0 +1,59 @@
+# tests/test_watermark.py
+"""
+UTC watermarks and detection of ignored `<field>:after` filters
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+
+from tracktik_etl.etl.utils.watermark import after_filter_value, filter_ignored, latest_modified, to_utc
+
+SINCE = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def test_to_utc():
+    assert to_utc('2026-03-01T04:00:00-08:00') == SINCE
+    assert to_utc('2026-03-01T12:00:00Z') == SINCE
+    assert to_utc(datetime(2026, 3, 1, 13, 0, tzinfo=timezone(timedelta(hours=1)))) == SINCE
+    assert to_utc(datetime(2026, 3, 1, 12, 0)).tzinfo == timezone.utc  # naive = local time
+    assert to_utc(None) is None
+    assert to_utc('not a date') is None
+
+
+def test_after_filter_value_is_utc():
+    local = datetime(2026, 3, 1, 4, 0, tzinfo=timezone(timedelta(hours=-8)))
+
+    assert after_filter_value(local) == '2026-03-01T12:00:00+00:00'
+
+
+def test_latest_modified_compares_instants_not_strings():
+    records = [{'updatedOn': '2026-03-01T13:00:00+02:00'},   # 11:00 UTC
+               {'updatedOn': '2026-03-01T10:30:00-01:00'},   # 11:30 UTC
+               {'updatedOn': None}, {}]
+
+    assert latest_modified(records, 'updatedOn') == datetime(2026, 3, 1, 11, 30, tzinfo=timezone.utc)
+    assert latest_modified([{}], 'updatedOn') is None
+
+
+def test_filtered_response_passes(caplog):
+    records = [{'id': 1, 'updatedOn': '2026-03-01T12:30:00+00:00'}]
+
+    assert not filter_ignored(records, 'updatedOn', SINCE, 'shifts')
+    assert not filter_ignored([], 'updatedOn', SINCE, 'shifts')
+    assert not caplog.records
+
+
+def test_older_records_mean_the_filter_was_ignored(caplog):
+    records = [{'id': 1, 'updatedOn': '2026-03-01T12:30:00+00:00'},
+               {'id': 2, 'updatedOn': '2025-11-02T08:00:00+00:00'}]
+
+    with caplog.at_level(logging.WARNING):
+        assert filter_ignored(records, 'updatedOn', SINCE, 'Incremental shift read for Hawaii')
+
+    assert '1 of 2 records were modified before 2026-03-01 12:00 UTC' in caplog.text
+
+
+def test_missing_field_means_the_filter_was_ignored(caplog):
+    with caplog.at_level(logging.WARNING):
+        assert filter_ignored([{'id': 1}], 'updatedOn', SINCE, 'shifts')
+
+    assert "records carry no 'updatedOn' field" in caplog.text